@@ -1,6 +1,10 @@
-import requests
-import json
 import logging
+from . import http_sessions
+from . import json_codec
+from . import rate_limiter
+from . import lazy_imports
+
+requests = lazy_imports.module('requests')
 
 
 
@@ -40,7 +44,8 @@ class ACTORWS(object):
 
 	def make_request(self, url, payload):
 		try:
-			_response = requests.get(url, params=payload, timeout=15)
+			rate_limiter.acquire(url)
+			_response = http_sessions.get(url, params=payload, timeout=15)
 		except requests.exceptions.Timeout as e:
 			logging.warning("Request to {} timed out.. No data from actorws..".format(url))
 			return None
@@ -56,7 +61,7 @@ class ACTORWS(object):
 			logging.warning("Exception in actorws.py making request to actorws: {}".format(_response))
 			raise Exception("ACTORWS request was not successful.")
 
-		return json.loads(_response.content)
+		return json_codec.loads(_response.content)
 
 
 
@@ -0,0 +1,159 @@
+"""
+Asyncio HTTP layer for CTS backend calls (used by the calculators'
+*_async methods).
+
+Uses aiohttp (optional dependency) with one pooled keep-alive
+ClientSession per backend host and event loop. A loop's sessions are
+closed when it shuts down (asyncio.run's async generator shutdown), or
+with registry.close(). Responses are wrapped
+in AsyncResponse, which has the same status_code/content attributes
+as a requests.Response, so the calculators' validate_response and
+parsing functions work for both the sync and async paths. aiohttp
+errors are re-raised as requests exceptions for the same reason.
+"""
+
+import os
+import asyncio
+import logging
+import weakref
+import threading
+from .http_sessions import registry as sync_registry, transfer_stats, body_size
+from . import lazy_imports
+
+aiohttp = lazy_imports.optional('aiohttp')  # imported on first async request
+requests = lazy_imports.module('requests')
+
+
+
+class AsyncResponse(object):
+	"""
+	Minimal requests.Response-like wrapper for an aiohttp response.
+	"""
+	def __init__(self, status_code, content, headers=None, url=None):
+		self.status_code = status_code
+		self.content = content  # body as bytes
+		self.headers = headers or {}
+		self.url = url
+
+	@property
+	def text(self):
+		return self.content.decode('utf-8', errors='replace')
+
+	def __repr__(self):
+		return "<AsyncResponse [{}]>".format(self.status_code)
+
+
+
+class AsyncSessionRegistry(object):
+	"""
+	Registry of pooled aiohttp sessions, one per backend host and
+	event loop (aiohttp sessions can't be shared between loops).
+	Uses the same pool size and compression settings as http_sessions.
+	"""
+	def __init__(self, pool_maxsize=None, keepalive_timeout=None):
+		self.pool_maxsize = pool_maxsize or int(os.environ.get('CTS_HTTP_POOL_MAXSIZE', 20))
+		self.keepalive_timeout = keepalive_timeout or float(os.environ.get('CTS_HTTP_KEEPALIVE_TIMEOUT', 60))
+		self.sessions = weakref.WeakKeyDictionary()  # loop -> {host key: aiohttp.ClientSession}
+		self.closers = weakref.WeakKeyDictionary()  # loop -> close_on_shutdown generator
+		self.lock = threading.Lock()
+
+	def get_session(self, url):
+		"""
+		Returns the pooled session for url's host on the running loop.
+		"""
+		if aiohttp is None:
+			raise ImportError("aiohttp is required for async calculator requests")
+		loop = asyncio.get_running_loop()
+		host = sync_registry.get_host_key(url)
+		session = self.sessions.get(loop, {}).get(host)
+		if session and not session.closed:
+			return session
+		with self.lock:
+			if loop not in self.sessions:
+				self.sessions[loop] = {}
+				closer = self.closers[loop] = self.close_on_shutdown()
+				try:
+					closer.asend(None).send(None)  # runs it to its yield, so the loop closes it at shutdown
+				except StopIteration:
+					pass
+			session = self.sessions[loop].get(host)
+			if not session or session.closed:
+				logging.info("Creating pooled async http session for {}".format(host))
+				connector = aiohttp.TCPConnector(limit_per_host=self.pool_maxsize, keepalive_timeout=self.keepalive_timeout)
+				session = aiohttp.ClientSession(connector=connector, headers={'Accept-Encoding': sync_registry.accept_encoding})
+				self.sessions[loop][host] = session
+		return session
+
+	async def close_on_shutdown(self):
+		"""
+		Async generator that closes the loop's sessions when it's closed,
+		by close() or by the loop shutting down its async generators
+		(e.g., at the end of asyncio.run).
+		"""
+		try:
+			yield
+		finally:
+			loop = asyncio.get_running_loop()
+			with self.lock:
+				loop_sessions = self.sessions.pop(loop, {})
+				self.closers.pop(loop, None)
+			for session in loop_sessions.values():
+				await session.close()
+
+	async def close(self):
+		"""
+		Closes the running loop's sessions.
+		"""
+		closer = self.closers.get(asyncio.get_running_loop())
+		if closer is not None:
+			await closer.aclose()
+
+
+
+registry = AsyncSessionRegistry()
+
+
+
+def get_wire_bytes(response, content):
+	"""
+	Returns the size of a response's body as received. aiohttp decodes
+	compressed bodies as it reads them, so it's the Content-Length.
+	"""
+	if response.headers.get('Content-Encoding') and response.headers.get('Content-Length'):
+		return int(response.headers['Content-Length'])
+	return len(content)
+
+
+async def request(method, url, data=None, json=None, params=None, headers=None, timeout=None):
+	"""
+	Makes an HTTP request through the shared async session for url's
+	host and returns an AsyncResponse. Raises requests exceptions
+	(ConnectionError, Timeout, RequestException) on errors.
+	"""
+	session = registry.get_session(url)
+	key = sync_registry.get_host_key(url)
+	if isinstance(data, (str, bytes)):
+		sent, headers = sync_registry.compress_body(url, data, headers)
+		transfer_stats.record(key, 'request', body_size(sent), body_size(data))
+		data = sent
+	client_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+	try:
+		async with session.request(method, url, data=data, json=json, params=params, headers=headers, timeout=client_timeout) as response:
+			content = await response.read()
+			async_response = AsyncResponse(response.status, content, dict(response.headers), str(response.url))
+			transfer_stats.record_response(key, async_response, get_wire_bytes(response, content))
+			return async_response
+	except asyncio.TimeoutError as e:
+		raise requests.exceptions.Timeout("Request to {} timed out: {}".format(url, e))
+	except aiohttp.ClientConnectionError as e:
+		raise requests.exceptions.ConnectionError("Connection error for {}: {}".format(url, e))
+	except aiohttp.ClientError as e:
+		raise requests.exceptions.RequestException("Error requesting {}: {}".format(url, e))
+
+
+async def get(url, params=None, **kwargs):
+	return await request('GET', url, params=params, **kwargs)
+
+
+async def post(url, data=None, json=None, **kwargs):
+	return await request('POST', url, data=data, json=json, **kwargs)
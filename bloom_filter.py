@@ -0,0 +1,323 @@
+"""
+Bloom filter membership indexes for mongodb lookups.
+
+find_pchem_document and find_dtxcid_document made a find_one round
+trip even for chemicals that aren't in the db, which is most of a batch
+upload. A MembershipIndex keeps a Bloom filter of each indexed field's
+stored values (e.g., every DTXCID in the dtxcid collection), so a query
+for a value that's definitely not stored skips the db. A Bloom filter
+can say "maybe" for a value that isn't stored (CTS_BLOOM_ERROR_RATE of
+the time), then the db is queried as before, but never "no" for one that is.
+
+Filters are rebuilt from their collection every CTS_BLOOM_REBUILD_INTERVAL
+seconds, in a background thread of whichever worker finds them stale (a
+redis lock keeps it to one), and persisted to redis and, if CTS_BLOOM_DIR
+is set, to disk, so other workers load them instead of scanning the
+collection. Documents stored between builds are added (see add) to this
+process's filters, including one that's mid-build, and to redis sets of
+values stored per CTS_BLOOM_DELTA_BUCKET seconds, which are checked
+before a value is ruled out, so documents other workers store are found
+too. Filters older than the delta sets cover (e.g., rebuilds keep
+failing) aren't trusted, and neither is a miss that can't be checked in
+redis; the db is queried for those.
+
+So a filter miss still costs a pipelined redis round trip (SISMEMBER
+per field and delta bucket), it only saves anything where redis is
+local or much closer than mongodb, otherwise turn the index off.
+Only documents stored through add() are in the deltas, so an index is
+only correct for a collection this package is the only writer of
+between builds; collections filled some other way (e.g., dtxcid from
+DSST_IDs.csv) are off by default. CTS_BLOOM_INDEX=false turns the
+indexes off, CTS_BLOOM_<NAME>_INDEX=true/false turns one on or off.
+"""
+
+import os
+import math
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from . import redis_pool
+from . import json_codec
+
+
+
+class BloomFilter(object):
+	"""
+	Bloom filter of strings, see for_capacity() for sizing one.
+	"""
+	def __init__(self, num_bits, num_hashes, bits=None, count=0):
+		self.num_bits = num_bits
+		self.num_hashes = num_hashes
+		self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+		self.count = count
+
+	@classmethod
+	def for_capacity(cls, capacity, error_rate=0.01):
+		"""
+		Returns an empty filter for capacity items at error_rate false positives.
+		"""
+		capacity = max(int(capacity), 1000)
+		num_bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+		num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+		return cls(num_bits, num_hashes)
+
+	def get_positions(self, item):
+		digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+		h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1  # double hashing
+		return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+	def add(self, item):
+		for position in self.get_positions(item):
+			self.bits[position >> 3] |= 1 << (position & 7)
+		self.count += 1
+
+	def __contains__(self, item):
+		return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.get_positions(item))
+
+	def __len__(self):
+		return self.count
+
+
+
+class MembershipIndex(object):
+	"""
+	Bloom filters of a collection's stored values, one per field.
+	Inputs:
+	  + name - collection name, for persisting the filters.
+	  + fields - document fields to index (queried by equality).
+	  + default_enabled - whether the index is on unless CTS_BLOOM_<NAME>_INDEX
+	    says otherwise, False for collections other code writes to.
+	"""
+	key_prefix = "cts_bloom"
+
+	def __init__(self, name, fields, enabled=None, default_enabled=True, error_rate=None, rebuild_interval=None, reload_interval=None, path=None, redis_conn=None):
+		if enabled is None:
+			default = os.environ.get('CTS_BLOOM_INDEX', 'true') if default_enabled else 'false'
+			enabled = os.environ.get('CTS_BLOOM_{}_INDEX'.format(name.upper()), default).lower() == 'true'
+		self.name = name
+		self.fields = fields
+		self.enabled = enabled
+		self.error_rate = error_rate or float(os.environ.get('CTS_BLOOM_ERROR_RATE', 0.01))
+		self.rebuild_interval = rebuild_interval or int(os.environ.get('CTS_BLOOM_REBUILD_INTERVAL', 6 * 3600))
+		self.reload_interval = reload_interval or int(os.environ.get('CTS_BLOOM_RELOAD_INTERVAL', 300))  # checks for a newer persisted build
+		self.build_lock_ttl = int(os.environ.get('CTS_BLOOM_BUILD_LOCK_TTL', 1800))
+		self.delta_bucket = int(os.environ.get('CTS_BLOOM_DELTA_BUCKET', 3600))  # seconds of stored values per redis set
+		self.delta_margin = 60  # writes in flight when a build starts
+		self.max_age = 2 * self.rebuild_interval  # filters older than this aren't covered by the delta sets
+		bloom_dir = os.environ.get('CTS_BLOOM_DIR')
+		self.path = path or (os.path.join(bloom_dir, "{}.bloom".format(name)) if bloom_dir else None)
+		self.redis_conn = redis_conn
+		self.filters = {}  # field: BloomFilter, empty until built or loaded
+		self.built_at = None
+		self.checked_at = 0
+		self.building = False
+		self.pending = None  # values added while a build runs, for the new filters
+		self.lock = threading.Lock()
+
+	def get_key(self, name=None):
+		return "{}:{}".format(self.key_prefix, self.name) + (":{}".format(name) if name else "")
+
+	def get_delta_key(self, field, bucket):
+		return self.get_key("delta:{}:{}".format(field, bucket))
+
+	def might_contain(self, query_obj, collection=None):
+		"""
+		False if no document can match query_obj (an indexed field's value
+		isn't stored), True if one might. Refreshes the filters from collection.
+		"""
+		if not self.enabled or not isinstance(query_obj, dict):
+			return True
+		if collection is not None:
+			self.refresh(collection)
+		filters, built_at = self.filters, self.built_at
+		if not filters or built_at is None or time.time() - built_at > self.max_age:
+			return True
+		missing = {field: value for field, value in query_obj.items() if field in filters and isinstance(value, str) and value not in filters[field]}
+		if not missing:
+			return True
+		return self.in_delta(missing, built_at)
+
+	def in_delta(self, values, built_at):
+		"""
+		True if every {field: value} in values was stored since the
+		filters were built (or redis can't say it wasn't).
+		"""
+		buckets = range(int((built_at - self.delta_margin) // self.delta_bucket), int(time.time() // self.delta_bucket) + 1)
+		fields = list(values)
+		try:
+			pipe = (self.redis_conn or redis_pool.get_redis()).pipeline(transaction=False)
+			for field in fields:
+				for bucket in buckets:
+					pipe.sismember(self.get_delta_key(field, bucket), values[field])
+			found = pipe.execute()
+		except Exception as e:
+			logging.warning("Unable to check {} bloom filter deltas, querying db: {}".format(self.name, e))
+			return True
+		for i, field in enumerate(fields):
+			if not any(found[i * len(buckets):(i + 1) * len(buckets)]):
+				return False
+		self.add_local(values)  # stored by another worker, found locally from now on
+		return True
+
+	def add(self, document):
+		"""
+		Adds a document stored since the last build to this process's
+		filters and to the current delta sets, for other workers.
+		"""
+		values = {field: document[field] for field in self.fields if isinstance(document.get(field), str)}
+		if not self.enabled or not values:
+			return
+		self.add_local(values)
+		key_ttl = self.max_age + self.delta_bucket + self.delta_margin
+		bucket = int(time.time() // self.delta_bucket)
+		try:
+			pipe = (self.redis_conn or redis_pool.get_redis()).pipeline(transaction=False)
+			for field, value in values.items():
+				pipe.sadd(self.get_delta_key(field, bucket), value)
+				pipe.expire(self.get_delta_key(field, bucket), key_ttl)
+			pipe.execute()
+		except Exception as e:
+			logging.warning("Unable to add to {} bloom filter deltas: {}".format(self.name, e))
+
+	def add_local(self, values):
+		with self.lock:
+			for field, value in values.items():
+				if field in self.filters:
+					self.filters[field].add(value)
+			if self.pending is not None:
+				self.pending.append(values)
+
+	def refresh(self, collection):
+		"""
+		Loads a newer persisted build, and starts a rebuild in the background
+		if the filters are missing or older than rebuild_interval.
+		"""
+		now = time.time()
+		if now - self.checked_at < self.reload_interval:
+			return
+		with self.lock:
+			if now - self.checked_at < self.reload_interval:
+				return
+			self.checked_at = now
+		self.load()
+		if self.built_at is None or now - self.built_at >= self.rebuild_interval:
+			self.start_build(collection)
+
+	def start_build(self, collection):
+		with self.lock:
+			if self.building:
+				return
+			self.building = True
+		threading.Thread(target=self.build_locked, args=(collection,), name="cts-bloom-{}".format(self.name), daemon=True).start()
+
+	def build_locked(self, collection):
+		"""
+		Builds the filters unless another worker is (see build).
+		"""
+		redis_conn = self.redis_conn or redis_pool.get_redis()
+		token = uuid.uuid4().hex
+		try:
+			locked = redis_conn.set(self.get_key('lock'), token, nx=True, ex=self.build_lock_ttl)
+		except Exception as e:
+			logging.warning("Unable to lock {} bloom filter build, building anyway: {}".format(self.name, e))
+			locked = True
+		try:
+			if locked:
+				self.build(collection)
+		except Exception as e:
+			logging.warning("Unable to build {} bloom filters: {}".format(self.name, e))
+		finally:
+			with self.lock:
+				self.building = False
+				self.pending = None
+
+	def build(self, collection, batch_size=10000):
+		"""
+		Builds the filters by streaming the indexed fields of every
+		document in collection, then persists them.
+		"""
+		start = time.time()
+		with self.lock:
+			self.pending = []
+		capacity = int(collection.estimated_document_count() * 1.2) + 10000  # room for documents added before the next build
+		filters = {field: BloomFilter.for_capacity(capacity, self.error_rate) for field in self.fields}
+		projection = {field: True for field in self.fields}
+		projection['_id'] = False
+		for document in collection.find({}, projection).batch_size(batch_size):
+			for field, bloom in filters.items():
+				if isinstance(document.get(field), str):
+					bloom.add(document[field])
+		with self.lock:
+			for values in self.pending or []:  # added during the scan, maybe after the cursor passed them
+				for field, value in values.items():
+					filters[field].add(value)
+			self.filters, self.built_at, self.pending = filters, start, None
+		self.save()
+		logging.info("Built {} bloom filters in {}s ({}).".format(self.name, round(time.time() - start, 3), {field: len(bloom) for field, bloom in filters.items()}))
+
+	def to_bytes(self):
+		"""
+		Serializes the filters: a JSON header line, then each filter's bits.
+		"""
+		header = {
+			'built_at': self.built_at,
+			'fields': [[field, bloom.num_bits, bloom.num_hashes, bloom.count] for field, bloom in self.filters.items()]
+		}
+		return json_codec.dumps(header).encode('utf-8') + b"\n" + b"".join(bytes(bloom.bits) for bloom in self.filters.values())
+
+	def from_bytes(self, data):
+		"""
+		Returns (built_at, filters) from to_bytes data.
+		"""
+		header, data = data.split(b"\n", 1)
+		header = json_codec.loads(header)
+		filters, offset = {}, 0
+		for field, num_bits, num_hashes, count in header['fields']:
+			size = (num_bits + 7) // 8
+			filters[field] = BloomFilter(num_bits, num_hashes, bytearray(data[offset:offset + size]), count)
+			offset += size
+		return header['built_at'], filters
+
+	def save(self):
+		"""
+		Persists the filters to redis and (if path is set) disk.
+		"""
+		data = self.to_bytes()
+		redis_pool.set_many({self.get_key(): data}, redis_conn=self.redis_conn or redis_pool.get_redis())
+		if self.path:
+			try:
+				tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+				with open(tmp_path, 'wb') as f:
+					f.write(data)
+				os.replace(tmp_path, self.path)  # readers never see a partial file
+			except OSError as e:
+				logging.warning("Unable to save {} bloom filters to {}: {}".format(self.name, self.path, e))
+
+	def load(self):
+		"""
+		Loads the newest persisted filters (redis or disk) if they're newer
+		than this process's. Returns True if it loaded any.
+		"""
+		candidates = []
+		data = redis_pool.get_many([self.get_key()], self.redis_conn or redis_pool.get_redis())[0]
+		if data is not None:
+			candidates.append(data)
+		if self.path and os.path.exists(self.path):
+			try:
+				with open(self.path, 'rb') as f:
+					candidates.append(f.read())
+			except OSError as e:
+				logging.warning("Unable to read {} bloom filters from {}: {}".format(self.name, self.path, e))
+		loaded = False
+		for data in candidates:
+			try:
+				built_at, filters = self.from_bytes(data)
+			except (ValueError, KeyError, TypeError) as e:
+				logging.warning("Invalid persisted {} bloom filters: {}".format(self.name, e))
+				continue
+			if self.built_at is None or built_at > self.built_at:
+				self.filters, self.built_at = filters, built_at
+				loaded = True
+		return loaded
@@ -2,28 +2,127 @@ __author__ = 'np'
 
 # from django.template import Template
 # from django.template import Context
-import requests
-import json
 import logging
 import os
-import redis
 import datetime
-import pytz
+import hashlib
+import asyncio
+from contextlib import closing
+from . import deadline
+from . import request_context
+from . import dispatcher
+from .retry_policy import RetryPolicy, RetryError, get_budget
+from .templates import Template
+from . import json_codec
+from . import lazy_imports
+
+pytz = lazy_imports.module('pytz')
+requests = lazy_imports.module('requests')
+
+# backend request handling, imported with a calculator's first request
+# (or first instance, for redis_pool) instead of with the calculators:
+http_sessions = lazy_imports.module('.http_sessions', __package__)
+async_http = lazy_imports.module('.async_http', __package__)
+rate_limiter = lazy_imports.module('.rate_limiter', __package__)
+redis_pool = lazy_imports.module('.redis_pool', __package__)
+hedger = lazy_imports.attribute('.hedged_requests', 'hedger', __package__)
+single_flight = lazy_imports.attribute('.single_flight', 'single_flight', __package__)
+make_key = lazy_imports.attribute('.single_flight', 'make_key', __package__)
+response_cache = lazy_imports.attribute('.response_cache', 'response_cache', __package__)
+negative_cache = lazy_imports.attribute('.negative_cache', 'negative_cache', __package__)
+get_request_key = lazy_imports.attribute('.negative_cache', 'get_request_key', __package__)
+CircuitBreaker = lazy_imports.attribute('.circuit_breaker', 'CircuitBreaker', __package__)
+get_limiter = lazy_imports.attribute('.concurrency_limiter', 'get_limiter', __package__)
 
 
 class Calculator(object):
 	"""
 	Skeleton class for calculators
 	"""
+	propMap = Template({})
+	results = request_context.RequestAttribute('')  # per-request, see request_context
+
+	# cts p-chem properties
+	pchem_props = Template([
+		'boiling_point',
+		'melting_point',
+		'water_sol',
+		'vapor_press',
+		'mol_diss',
+		'ion_con',
+		'henrys_law_con',
+		'kow_no_ph',
+		'kow_wph',
+		'kow_ph',
+		'kow'
+	])
+
+	# cts chemical information dict
+	chemical_information = Template({
+		'chemical': None,  # user-entered chemical (as-entered or drawn)
+		'orig_smiles': None,  # original conversion to SMILES
+		'smiles': None,  # SMILES after filtering, used for calculations
+		'formula': None,
+		'iupac': None,
+		'mass': None,
+		'structureData': None,  # drawn chemical structure format for MarvinSketch
+		'exactMass': None,
+	})
+
+	# cts chemical information request
+	chemical_information_request = Template({
+		'chemical': None,
+		'get_structure_data': False,
+	})
+
+	# cts api data object for p-chem data request
+	data_obj = Template({
+		'calc': None,
+		'prop': None,
+		'data': None,
+		'chemical': None,
+	})
+
+	# cts p-chem request object with default key:vals.
+	# can handle list of props (ws) or single prop (cts api)
+	pchem_request = Template({
+		'service': None,
+		'chemical': None,
+		'prop': None,
+		'sessionid': None,
+		'method': None,
+		'ph': 7.0,
+		'node': None,
+		'calc': None,
+		'run_type': None,
+		'workflow': None,
+		'mass': None,
+		'props': [],
+	})
+
+	# cts p-chem response object with defaults, returns one prop per reponse
+	pchem_response = Template({
+		'chemical': None,
+		'calc': None,
+		'prop': None,
+		'method': None,
+		'run_type': None,
+		'workflow': None,
+		'node': None,
+		'request_post': None,
+		'data': None,
+		'error': False,
+	})
+
 	def __init__(self, calc=None):
 		self.name = ''
-		self.propMap = {}
 		self.baseUrl = None
 		self.urlStruct = ''
 		self.results = ''
 		self.headers = {'Content-Type': 'application/json'}
 		self.request_timeout = 30  # default, set unique ones in calc sub classes
 		self.max_retries = 3
+		self.retry_max_elapsed = float(os.environ['CTS_RETRY_MAX_ELAPSED']) if os.environ.get('CTS_RETRY_MAX_ELAPSED') else None
 
 		self.image_scale = 50
 
@@ -31,7 +130,7 @@ class Calculator(object):
 
 		self.redis_hostname = os.environ.get('REDIS_HOSTNAME')
 		self.redis_port = os.environ.get('REDIS_PORT')
-		self.redis_conn = redis.StrictRedis(host=self.redis_hostname, port=self.redis_port, db=0)
+		self.redis_conn = redis_pool.get_redis()  # shared by all calculators in the process
 
 		self.jchem_server_url = os.environ.get('CTS_JCHEM_SERVER', 'localhost:8080')
 		self.efs_server_url = os.environ.get('CTS_EFS_SERVER', 'localhost:8080')
@@ -45,78 +144,6 @@ class Calculator(object):
 		self.efs_metabolizer_endpoint = '/ctsws/rest/metabolizer'
 		self.efs_standardizer_endpoint = '/ctsws/rest/standardizer'
 
-		# cts p-chem properties
-		self.pchem_props = [
-			'boiling_point',
-			'melting_point',
-			'water_sol',
-			'vapor_press',
-			'mol_diss',
-			'ion_con',
-			'henrys_law_con',
-			'kow_no_ph',
-			'kow_wph',
-			'kow_ph',
-			'kow'
-		]
-
-		# cts chemical information dict
-		self.chemical_information = {
-			'chemical': None,  # user-entered chemical (as-entered or drawn)
-			'orig_smiles': None,  # original conversion to SMILES
-			'smiles': None,  # SMILES after filtering, used for calculations
-			'formula': None,
-			'iupac': None,
-			'mass': None,
-			'structureData': None,  # drawn chemical structure format for MarvinSketch
-			'exactMass': None,
-		}
-
-		# cts chemical information request
-		self.chemical_information_request = {
-			'chemical': None,
-			'get_structure_data': False,
-		}
-
-		# cts api data object for p-chem data request
-		self.data_obj = {
-			'calc': None,
-			'prop': None,
-			'data': None,
-			'chemical': None,
-		}
-
-		# cts p-chem request object with default key:vals.
-		# can handle list of props (ws) or single prop (cts api)
-		self.pchem_request = {
-			'service': None,
-			'chemical': None,
-			'prop': None,
-			'sessionid': None,
-			'method': None,
-			'ph': 7.0,
-			'node': None,
-			'calc': None,
-			'run_type': None,
-			'workflow': None,
-			'mass': None,
-			'props': [],
-		}
-
-		# cts p-chem response object with defaults, returns one prop per reponse
-		self.pchem_response = {
-			'chemical': None,
-			'calc': None,
-			'prop': None,
-			'method': None,
-			'run_type': None,
-			'workflow': None,
-			'node': None,
-			'request_post': None,
-			'data': None,
-			'error': False,
-		}
-
 
 	def getUrl(self, prop):
 		if prop in self.propMap:
@@ -151,6 +178,102 @@ class Calculator(object):
 		TEST if not available in Measured, and finally EPI.
 		Returns MP as float or None
 		"""
+		melting_point_request, mp_request_calcs = self.get_mp_requests(structure, sessionid, calc_obj.name)
+
+		# Attempt at MP workflow as loop..
+		for calc in mp_request_calcs:
+
+			if deadline.expired():
+				logging.warning("Request deadline exceeded, not requesting melting point from {}.".format(calc))
+				break
+
+			melting_point_request['calc'] = calc
+
+			logging.info("Requesting melting point from {}..".format(calc))
+
+			# Calls calculator's data_request_handler which makes request to calc server:
+			response_obj = calc_obj.data_request_handler(melting_point_request)
+
+			melting_point = self.get_mp_from_response(calc, response_obj)
+			if isinstance(melting_point, float):
+				return melting_point
+
+		# if no MP found from all 3 calcs, returns None for MP
+		return None
+
+
+	async def get_melting_point_async(self, structure, sessionid, calc_obj):
+		"""
+		Async version of get_melting_point, which uses the
+		calculator's data_request_handler_async.
+		"""
+		melting_point_request, mp_request_calcs = self.get_mp_requests(structure, sessionid, calc_obj.name)
+
+		for calc in mp_request_calcs:
+
+			if deadline.expired():
+				logging.warning("Request deadline exceeded, not requesting melting point from {}.".format(calc))
+				break
+
+			melting_point_request['calc'] = calc
+
+			logging.info("Requesting melting point from {}..".format(calc))
+
+			response_obj = await calc_obj.data_request_handler_async(melting_point_request)
+
+			melting_point = self.get_mp_from_response(calc, response_obj)
+			if isinstance(melting_point, float):
+				return melting_point
+
+		return None
+
+
+	def requires_melting_point(self, request_dict):
+		"""
+		Returns True if the requested prop is calculated
+		with a melting point (water solubility and vapor pressure).
+		"""
+		return request_dict.get('prop') == 'water_sol' or request_dict.get('prop') == 'vapor_press'
+
+
+	def fill_pchem_request(self, request_dict):
+		"""
+		Fills request keys missing from request_dict
+		with pchem_request's defaults.
+		"""
+		for key, val in self.pchem_request.items():
+			if not key in request_dict.keys():
+				logging.info("request key {} not in request, using default value: {}".format(key, val))
+				request_dict.update({key: val})
+
+
+	def get_response_dict(self, request_dict):
+		"""
+		Response object with any overlapping keys from request.
+		"""
+		_response_dict = {}
+		for key in request_dict.keys():
+			if not key == 'nodes':
+				_response_dict[key] = request_dict.get(key)
+		_response_dict.update({'request_post': request_dict, 'method': None})
+		return _response_dict
+
+
+	def smiles_filter_error(self, response_dict, err, data="Cannot filter SMILES", **fields):
+		"""
+		Returns response_dict with an error message (and any other
+		fields, e.g., valid=False) for a chemical the SMILES filter rejected.
+		"""
+		logging.warning("Error filtering SMILES: {}".format(err))
+		response_dict.update(data=data, **fields)
+		return response_dict
+
+
+	def get_mp_requests(self, structure, sessionid, calc):
+		"""
+		Returns melting point request object and the ordered list of
+		calcs to request MP from.
+		"""
 		melting_point_request = {
 			'calc': "",
 			'prop': 'melting_point',
@@ -158,10 +281,6 @@ class Calculator(object):
 			'sessionid': sessionid
 		}
 
-		melting_point = None
-		calc = calc_obj.name
-
-		# Attempt at MP workflow as loop..
 		mp_request_calcs = ['measured', 'test']  # ordered list of calcs for mp request
 		if calc != 'epi':
 			# Note: EPI also requests MP, but gets it from itself if it can't from Measured or TEST.
@@ -170,38 +289,36 @@ class Calculator(object):
 		if calc == 'test':
 			melting_point_request['method'] = "hc"  # method used for MP value
 
-		for calc in mp_request_calcs:
-
-			melting_point_request['calc'] = calc
+		return melting_point_request, mp_request_calcs
 
-			logging.info("Requesting melting point from {}..".format(calc))
 
-			# Calls calculator's data_request_handler which makes request to calc server:
-			response_obj = calc_obj.data_request_handler(melting_point_request)
+	def get_mp_from_response(self, calc, response_obj):
+		"""
+		Gets MP from a calc's data_request_handler response.
+		Returns MP as float or None
+		"""
+		melting_point = None
 
-			if calc == 'test':
-				melting_point = response_obj['data']
-			elif not response_obj.get('valid'):
-				# epi or measured mp request not valid, sets mp to None
-				melting_point = None
-			else:
-				# Finds mp data from list of data objects for epi or measured:
-				for data_obj in response_obj['data']:
-					if data_obj['prop'] == "melting_point":
-						melting_point = data_obj['data']
+		if calc == 'test':
+			melting_point = response_obj['data']
+		elif not response_obj.get('valid'):
+			# epi or measured mp request not valid, sets mp to None
+			melting_point = None
+		else:
+			# Finds mp data from list of data objects for epi or measured:
+			for data_obj in response_obj['data']:
+				if data_obj['prop'] == "melting_point":
+					melting_point = data_obj['data']
 
-			try:
-				# results_object = json.loads(mp_response.content)
-				melting_point = float(melting_point)
-			except Exception as e:
-				logging.warning("Unable to get melting point from {}\n Exception: {}".format(calc, e))
-				logging.warning("Data returned from Measured that triggered exception: {}".format(response_obj.get('data')))
-			if isinstance(melting_point, float):
-				logging.info("Melting point value found from {} calc, MP = {}".format(calc, melting_point))
-				return melting_point
+		try:
+			melting_point = float(melting_point)
+		except Exception as e:
+			logging.warning("Unable to get melting point from {}\n Exception: {}".format(calc, e))
+			logging.warning("Data returned from Measured that triggered exception: {}".format(response_obj.get('data')))
+			return None
 
-		# if no MP found from all 3 calcs, returns None for MP
-		return None
+		logging.info("Melting point value found from {} calc, MP = {}".format(calc, melting_point))
+		return melting_point
 
 
 
@@ -244,7 +361,7 @@ class Calculator(object):
 		}
 
 		url = self.jchem_server_url + self.detail_endpoint
-		return self.web_call(url, chemDeatsDict)
+		return self.web_call(url, chemDeatsDict, hedge=True)
 
 
 	def smilesToImage(self, request_obj):
@@ -293,7 +410,7 @@ class Calculator(object):
 			request['display']['parameters']['image'].update({'scale': imgScale})
 
 		url = self.jchem_server_url + self.detail_endpoint
-		imgData = self.web_call(url, request)  # get response from jchem ws
+		imgData = self.web_call(url, request, hedge=True)  # get response from jchem ws
 		return imgData  # return dict of image data
 
 
@@ -340,8 +457,24 @@ class Calculator(object):
 		"""
 		get mass of structure from jchem ws
 		"""
+		logging.info("jchem_rest getting mass for {}".format(request_obj.get('chemical')))
+		url = self.jchem_server_url + self.detail_endpoint
+		return self.web_call(url, self.get_mass_post(request_obj), hedge=True)
+
+
+	async def getMass_async(self, request_obj):
+		"""
+		Async version of getMass.
+		"""
+		url = self.jchem_server_url + self.detail_endpoint
+		return await self.web_call_async(url, self.get_mass_post(request_obj), hedge=True)
+
+
+	def get_mass_post(self, request_obj):
+		"""
+		POST data for getting mass of structure from jchem ws
+		"""
 		chemical = request_obj.get('chemical')
-		logging.info("jchem_rest getting mass for {}".format(chemical))
 		post_data = {
 			"structures": [
 				{"structure": chemical}
@@ -358,8 +491,7 @@ class Calculator(object):
 				}
 			}
 		}
-		url = self.jchem_server_url + self.detail_endpoint
-		return self.web_call(url, post_data)
+		return post_data
 
 
 	def get_chemical_type(self, chemical):
@@ -370,8 +502,8 @@ class Calculator(object):
 		request_header = {'Content-Type': "*/*"}
 		response, results = None, None
 		try:
-			response = requests.post(url, data=chemical.encode('utf-8'), headers=request_header, timeout=self.request_timeout)
-			results = json.loads(response.content)
+			response = self.request_with_retries('POST', url, data=chemical.encode('utf-8'), headers=request_header)
+			results = json_codec.loads(response.content)
 		except Exception as e:
 			logging.warning("Exception at get_chemical_type: {}".format(e))
 			return {'type': None}
@@ -465,42 +597,321 @@ class Calculator(object):
 			return "Chemical not recognized"
 
 
-	def web_call(self, url, data, headers=None):
+	def request_with_retries(self, method, url, validate=None, **kwargs):
+		"""
+		Makes a GET or POST request to a backend through the shared
+		retry policy (exponential backoff with jitter, per-backend retry budget)
+		and the backend's circuit breaker, which fails fast with CircuitOpenError
+		while the backend is down. Each attempt waits for a slot under the
+		backend's adaptive concurrency limit, and public services wait for their
+		shared rate limit (see rate_limiter). Timeouts and retries are capped
+		at the request deadline's remaining time (see deadline module).
+		Identical requests already in flight are coalesced (see single_flight).
+		Inputs:
+		  + validate - function that takes the response and returns False if
+		    it should be retried (retries 5xx responses by default).
+		  + coalesce - False for calls that must make their own request (e.g., hedges).
+		Returns the response, or raises RetryError if no valid response came back.
+		"""
+		coalesce = kwargs.pop('coalesce', True)
+		backend = http_sessions.registry.get_host_key(url)
+		policy = RetryPolicy(max_attempts=self.max_retries, max_elapsed=deadline.get_timeout(self.retry_max_elapsed), budget=get_budget(backend))
+		breaker = CircuitBreaker(backend, self.redis_conn)
+		limiter = get_limiter(backend)
+		timeout = kwargs.pop('timeout', self.request_timeout)
+		if method == 'GET':
+			send = lambda: http_sessions.get(url, timeout=deadline.get_timeout(timeout), **kwargs)
+		else:
+			send = lambda: http_sessions.post(url, timeout=deadline.get_timeout(timeout), **kwargs)
+
+		def attempt():
+			deadline.check()
+			rate_limiter.acquire(url)
+			return limiter.call(lambda: breaker.call(send, timeout), url, timeout)
+
+		if not coalesce:
+			return policy.run(attempt, validate, backend)
+		key = make_key(method, url, kwargs.get('data') or kwargs.get('json'), kwargs.get('params'))
+		return single_flight.do(key, lambda: policy.run(attempt, validate, backend))
+
+
+	async def request_with_retries_async(self, method, url, validate=None, **kwargs):
+		"""
+		Async version of request_with_retries, makes the request with
+		async_http (aiohttp) so it doesn't block a thread.
+		"""
+		coalesce = kwargs.pop('coalesce', True)
+		backend = http_sessions.registry.get_host_key(url)
+		policy = RetryPolicy(max_attempts=self.max_retries, max_elapsed=deadline.get_timeout(self.retry_max_elapsed), budget=get_budget(backend))
+		breaker = CircuitBreaker(backend, self.redis_conn)
+		limiter = get_limiter(backend)
+		timeout = kwargs.pop('timeout', self.request_timeout)
+		send = lambda: async_http.request(method, url, timeout=deadline.get_timeout(timeout), **kwargs)
+
+		async def attempt():
+			deadline.check()
+			await rate_limiter.acquire_async(url)
+			return await limiter.call_async(lambda: breaker.call_async(send, timeout), url, timeout)
+
+		if not coalesce:
+			return await policy.run_async(attempt, validate, backend)
+		key = make_key(method, url, kwargs.get('data') or kwargs.get('json'), kwargs.get('params'))
+		return await single_flight.do_async(key, lambda: policy.run_async(attempt, validate, backend))
+
+
+	async def run_sync(self, func, *args):
+		"""
+		Runs a blocking function (e.g., parsing that makes its own jchem
+		requests) in the event loop's thread pool.
+		"""
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(None, deadline.wrap(func), *args)
+
+
+	@request_context.bound
+	@dispatcher.dispatched
+	@deadline.bound
+	async def data_request_handler_async(self, request_dict):
+		"""
+		Async data request entrypoint. Calculators without a native async
+		version run their data_request_handler in the loop's thread pool.
+		"""
+		return await self.run_sync(self.data_request_handler, request_dict)
+
+
+	def web_call(self, url, data, headers=None, hedge=False, cache=True):
 		"""
 		Makes the request to a specified URL
-		and POST data. Returns resonse data as dict
+		and POST data. Returns resonse data as dict.
+		Set hedge for idempotent requests that can be hedged (see hedged_requests).
+		Identical calls in flight (here or, optionally, in other workers) are coalesced.
+		Valid responses are cached (see response_cache), set cache=False to skip it.
 		"""
 		# TODO: Deal with errors more granularly... 403, 500, etc.
 
+		cached_results = self.get_cached_results(url, data, cache)
+		if cached_results is not None:
+			return cached_results  # already validated when cached
+
 		if not headers:
 			headers = self.headers
+
+		if data == None:
+			send = lambda: self.request_with_retries('GET', url, coalesce=False)
+		else:
+			send = lambda: self.request_with_retries('POST', url, data=json_codec.dumps(data), headers=headers, coalesce=False)
+
+		def call():
+			try:
+				response = hedger.run(send, url) if hedge else send()
+			except RetryError as e:
+				if e.response is None:
+					raise e.exception
+				response = e.response  # server error response, checked for errors below
+			results = self.parse_web_call_response(response)
+			self.cache_results(url, data, response, results, cache)
+			return results
+
 		try:
-			if data == None:
-				response = requests.get(url, timeout=self.request_timeout)
-			else:
-				response = requests.post(url, data=json.dumps(data), headers=headers, timeout=self.request_timeout)
+			key = make_key('GET' if data == None else 'POST', url, data)
+			return single_flight.do_distributed(key, call, self.redis_conn)
+
+		except requests.exceptions.RequestException as e:
+			logging.warning("error at web call: {} /error".format(e))
+			raise e
 
-			results = json.loads(response.content)
 
-			valid_object = self.check_response_for_errors(results)
+	async def web_call_async(self, url, data, headers=None, hedge=False, cache=True):
+		"""
+		Async version of web_call.
+		"""
+		cached_results = self.get_cached_results(url, data, cache)
+		if cached_results is not None:
+			return cached_results
 
-			if valid_object.get('valid'):
-				return results
+		if not headers:
+			headers = self.headers
 
-			else:
-				error_response = {
-					'error': valid_object.get('error'),
-					'data': results,
-					'valid': False
-				}
-				return error_response
+		if data == None:
+			send = lambda: self.request_with_retries_async('GET', url, coalesce=False)
+		else:
+			send = lambda: self.request_with_retries_async('POST', url, data=json_codec.dumps(data), headers=headers, coalesce=False)
+
+		async def call():
+			try:
+				response = await (hedger.run_async(send, url) if hedge else send())
+			except RetryError as e:
+				if e.response is None:
+					raise e.exception
+				response = e.response
+			results = self.parse_web_call_response(response)
+			self.cache_results(url, data, response, results, cache)
+			return results
+
+		try:
+			key = make_key('GET' if data == None else 'POST', url, data)
+			return await single_flight.do_async(key, call)
 
-			# return json.loads(response.content)
 		except requests.exceptions.RequestException as e:
-			logging.warning("error at web call: {} /error".format(e))
+			logging.warning("error at async web call: {} /error".format(e))
 			raise e
 
 
+	def web_call_stream(self, url, data, load, headers=None):
+		"""
+		Like web_call, but the response is streamed and decoded by
+		load(response) as it arrives (see json_stream). Results aren't
+		response cached or coalesced, since load may build partial results.
+		"""
+		negative_results = self.get_cached_results(url, data, cache=False)
+		if negative_results is not None:
+			return negative_results
+
+		try:
+			response = self.request_with_retries('POST', url, data=json_codec.dumps(data), headers=headers or self.headers, stream=True, coalesce=False)
+		except RetryError as e:
+			if e.response is None:
+				raise e.exception
+			response = e.response
+
+		with closing(response):
+			if response.status_code == 200:
+				results = self.parse_web_call_response(response, load(response))
+			else:
+				results = self.parse_web_call_response(response)
+		self.cache_results(url, data, response, results, cache=False)
+		return results
+
+
+	def is_valid_results(self, results):
+		"""
+		False for web_call's error response objects.
+		"""
+		return not (isinstance(results, dict) and results.get('valid') is False)
+
+
+	def is_cacheable_response(self, response):
+		"""
+		True for data_request_handler responses that can go in the p-chem cache.
+		"""
+		return isinstance(response, dict) and response.get('valid') is True
+
+
+	def is_pchem_value(self, data):
+		"""
+		True for a p-chem value: a number or numeric string (e.g., "3.14e-15"),
+		not "N/A" or an error message.
+		"""
+		if isinstance(data, bool):
+			return False
+		try:
+			float(data)
+			return True
+		except (TypeError, ValueError):
+			return False
+
+
+	def personalize_cached_response(self, response, request_dict):
+		"""
+		Fills in anything request-specific in a cached data_request_handler
+		response (request keys are already copied over).
+		"""
+		return response
+
+
+	def pchem_document_response(self, db_handler, query, request_dict):
+		"""
+		Returns a p-chem cache entry built from documents in the pchem
+		collection that weren't written by the p-chem cache, or None.
+		"""
+		return None
+
+
+	def get_model_version(self):
+		"""
+		Returns the calculator's declared model version (meta_info modelVersion), or "".
+		"""
+		meta_info = getattr(self, 'meta_info', None) or {}
+		return meta_info.get('metaInfo', {}).get('modelVersion') or ""
+
+
+	def probe_model_version(self, url, timeout):
+		"""
+		Returns the model version the backend reports at url (see model_versions):
+		its JSON 'version' or 'modelVersion', otherwise a digest of the page.
+		"""
+		response = self.request_with_retries('GET', url, coalesce=False, timeout=timeout)
+		try:
+			results = json_codec.loads(response.content)
+		except ValueError:
+			results = None
+		if isinstance(results, dict) and (results.get('version') or results.get('modelVersion')):
+			return str(results.get('version') or results.get('modelVersion'))
+		return hashlib.sha1(response.content).hexdigest()[:12]
+
+
+	def get_cached_results(self, url, data, cache=True):
+		"""
+		Returns web_call results from the negative cache (chemical the
+		backend rejected recently) or the response cache, or None.
+		"""
+		negative_results = negative_cache.get(http_sessions.registry.get_host_key(url), get_request_key(url, data), self.redis_conn)
+		if negative_results is not None:
+			return negative_results
+		if cache:
+			return response_cache.get(url, data, self.redis_conn)
+		return None
+
+
+	def cache_results(self, url, data, response, results, cache=True):
+		"""
+		Caches valid web_call results, and errors that mean the chemical
+		can't be read (see is_chemical_error). Other errors (server errors,
+		throttling, auth, etc.) aren't the chemical's fault.
+		"""
+		if self.is_valid_results(results):
+			if cache:
+				response_cache.set(url, data, results, self.redis_conn)
+			return
+		if self.is_chemical_error(url, results):
+			negative_cache.set(http_sessions.registry.get_host_key(url), get_request_key(url, data), results, self.redis_conn)
+
+
+	def is_chemical_error(self, url, results):
+		"""
+		True for web_call errors that are permanent for the request's
+		chemical: jchem can't read it (errorCode 3) on the detail and
+		export endpoints.
+		"""
+		data = results.get('data') if isinstance(results, dict) else None
+		if not isinstance(data, dict) or data.get('errorCode') != 3:
+			return False
+		return url.split('?')[0].endswith((self.detail_endpoint, self.export_endpoint))
+
+
+	def parse_web_call_response(self, response, results=None):
+		"""
+		Loads web_call response content (unless it's already been
+		decoded into results) and checks it for errors.
+		Returns results as dict, or error response object.
+		"""
+		if results is None:
+			results = json_codec.loads(response.content)
+
+		valid_object = self.check_response_for_errors(results)
+
+		if valid_object.get('valid'):
+			return results
+
+		else:
+			error_response = {
+				'error': valid_object.get('error'),
+				'data': results,
+				'valid': False
+			}
+			return error_response
+
+
 
 
 
@@ -1,11 +1,10 @@
-import requests
-import json
 import time
 import os
 import logging
-from bs4 import BeautifulSoup
 
 from .calculator import Calculator
+from . import http_sessions
+from . import json_codec
 
 
 headers = {"Content-type": "application/json", "Accept": "text/html"}
@@ -45,7 +44,7 @@ class BiotransCalc(Calculator):
 		Returns an ID for looking up response and status.
 		"""
 		try:
-			return requests.post(url, json=post_data, headers=headers, timeout=self.request_timeout)
+			return http_sessions.post(url, json=post_data, headers=headers, timeout=self.request_timeout)
 		except Exception as e:
 			logging.warning("Exception in calculator_biotrans: {}".format(e))
 			return {"error": "Error making request to biotransformer."}
@@ -74,7 +73,7 @@ class BiotransCalc(Calculator):
 		if "error" in response:
 			return {"status": False, "error": response["error"]}
 
-		response_obj = json.loads(response.content.decode("utf-8"))
+		response_obj = json_codec.loads(response.content.decode("utf-8"))
 
 		return {
             "calc": "biotrans",  # todo: change to metabolizer, change in template too
@@ -1,12 +1,14 @@
-import requests
-import json
 import time
 import os
 import logging
-from bs4 import BeautifulSoup
 
 from .calculator import Calculator
 from .chemical_information import SMILESFilter
+from . import http_sessions
+from . import json_codec
+from . import lazy_imports
+
+bs4 = lazy_imports.module('bs4')  # only used for biotrans html responses
 
 
 
@@ -73,7 +75,7 @@ class BiotransCalc(Calculator):
 		"""
 		Creates object from HTML, then gets query id from the 'data-query-id' div attribute.
 		"""
-		soup = BeautifulSoup(api_response.content, features="html.parser")  # creates an object from the html response
+		soup = bs4.BeautifulSoup(api_response.content, features="html.parser")  # creates an object from the html response
 		content = soup.find("div", {"id": "query-status"})  # gets div from response that has query/response id
 		request_id = content.get('data-query-id')  # gets 'data-query-id' attr from div, which is the request's id
 		return request_id
@@ -118,7 +120,7 @@ class BiotransCalc(Calculator):
 		Returns an ID for looking up response and status.
 		"""
 		try:
-			return requests.post(self.query_url, json=api_query, headers=headers, timeout=self.request_timeout)
+			return http_sessions.post(self.query_url, json=api_query, headers=headers, timeout=self.request_timeout)
 		except Exception as e:
 			logging.warning("Exception in calculator_biotrans: {}".format(e))
 			return None
@@ -128,8 +130,8 @@ class BiotransCalc(Calculator):
 		Makes request for predictions.
 		"""
 		try:
-			result = requests.get(self.pred_url.format(query_id))  # /queries/[id].json
-			return json.loads(result.content)
+			result = http_sessions.get(self.pred_url.format(query_id))  # /queries/[id].json
+			return json_codec.loads(result.content)
 		except Exception as e:
 			logging.warning("Exception in calculator_biotrans: {}".format(e))
 			return None
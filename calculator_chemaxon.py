@@ -1,16 +1,44 @@
-import requests
 import json
 import logging
 import os
-import redis
+import asyncio
 from .chemical_information import SMILESFilter
+from . import calculator_pool
 from .calculator import Calculator
+from .templates import Template
 from .jchem_properties import JchemProperty
+from . import deadline
+from . import request_context
+from . import dispatcher
+from . import pchem_cache
 
 
 
 class JchemCalc(Calculator):
 
+    # Chemaxon speciation request object:
+    speciation_request = Template({
+        'run_type': None,
+        'chem_struct': None,
+        'smiles': None,
+        'orig_smiles': None,
+        'iupac': None,
+        'formula': None,
+        'mass': None,
+        'get_pka': None,
+        'get_taut': None,
+        'get_stereo': None,
+        'pKa_decimals': None,
+        'pKa_pH_lower': None,
+        'pKa_pH_upper': None,
+        'pKa_pH_increment': None,
+        'pH_microspecies': None,
+        'isoelectricPoint_pH_increment': None,
+        'tautomer_maxNoOfStructures': None,
+        'tautomer_pH': None,
+        'stereoisomers_maxNoOfStructures': None,
+    })
+
     def __init__(self, prop_name=None):
         
         Calculator.__init__(self)  # inherit Calculator base class
@@ -28,33 +56,35 @@ class JchemCalc(Calculator):
         self.props = ['water_sol', 'ion_con', 'kow_no_ph', 'kow_wph', 'water_sol_ph']  # available pchem props
         self.prop_name = prop_name  # prop name for JchemCalc instance
         self.format_url = '/rest-v0/util/analyze'  # returns chemical's format (e.g., "smiles", "casrn")
-        self.jchem_prop_obj = JchemProperty()
-
-        # Chemaxon speciation request object:
-        self.speciation_request = {
-            'run_type': None,
-            'chem_struct': None,
-            'smiles': None,
-            'orig_smiles': None,
-            'iupac': None,
-            'formula': None,
-            'mass': None,
-            'get_pka': None,
-            'get_taut': None,
-            'get_stereo': None,
-            'pKa_decimals': None,
-            'pKa_pH_lower': None,
-            'pKa_pH_upper': None,
-            'pKa_pH_increment': None,
-            'pH_microspecies': None,
-            'isoelectricPoint_pH_increment': None,
-            'tautomer_maxNoOfStructures': None,
-            'tautomer_pH': None,
-            'stereoisomers_maxNoOfStructures': None,
-        }
 
 
 
+    @property
+    def jchem_prop_obj(self):
+        """
+        Shared JchemProperty for making jchem requests (see calculator_pool).
+        """
+        return calculator_pool.get_instance(JchemProperty)
+
+
+
+    def is_cacheable_response(self, response):
+        """
+        Results are cacheable if a value came back (pKa/pKb values for ion_con).
+        """
+        if not isinstance(response, dict):
+            return False
+        data = response.get('data')
+        if isinstance(data, dict):
+            return any(data.get(key) for key in ('pKa', 'pKb'))
+        return self.is_pchem_value(data)
+
+
+
+    @request_context.bound
+    @pchem_cache.cached
+    @dispatcher.dispatched
+    @deadline.bound
     def data_request_handler(self, request_dict):
         """
         Handles requests to the JCHEM server.
@@ -63,66 +93,119 @@ class JchemCalc(Calculator):
             products moved to MetabolizerCalc).
         """
 
-        for key, val in self.pchem_request.items():
-            if not key in request_dict.keys():
-                request_dict.update({key: val})
+        self.fill_pchem_request(request_dict)
 
         _filtered_smiles = ''
         try:
-            _filtered_smiles = SMILESFilter().parseSmilesByCalculator(request_dict['chemical'], request_dict['calc']) # call smilesfilter
+            _filtered_smiles = calculator_pool.get_instance(SMILESFilter).parseSmilesByCalculator(request_dict['chemical'], request_dict['calc']) # call smilesfilter
         except Exception as err:
-            logging.warning("Error filtering SMILES: {}".format(err))
-            request_dict.update({'data': 'Cannot filter SMILES for ChemAxon data'})
-            return request_dict  # if not WS, just send object (for http/rest)
+            return self.smiles_filter_error(request_dict, err, 'Cannot filter SMILES for ChemAxon data')  # if not WS, just send object (for http/rest)
 
         if request_dict['service'] == 'getSpeciationData':
+            return self.get_speciation_response(request_dict, _filtered_smiles, self.get_speciation_results(request_dict))
+
+        _response_dict = self.get_response_dict(request_dict)
+
+        try:
+            _results = self.jchem_prop_obj.getJchemPropData(_response_dict)
+            return self.get_data_response(_response_dict, request_dict, _results)
+        except Exception as err:
+            return self.request_error_response(_response_dict, err)
+
+
+
+    @request_context.bound
+    @pchem_cache.cached
+    @dispatcher.dispatched
+    @deadline.bound
+    async def data_request_handler_async(self, request_dict):
+        """
+        Async version of data_request_handler. Speciation requests are
+        made concurrently.
+        """
+        self.fill_pchem_request(request_dict)
+
+        try:
+            _filtered_smiles = await calculator_pool.get_instance(SMILESFilter).parseSmilesByCalculator_async(request_dict['chemical'], request_dict['calc'])
+        except Exception as err:
+            return self.smiles_filter_error(request_dict, err, 'Cannot filter SMILES for ChemAxon data')
+
+        if request_dict['service'] == 'getSpeciationData':
+            return self.get_speciation_response(request_dict, _filtered_smiles, await self.get_speciation_results_async(request_dict))
+
+        _response_dict = self.get_response_dict(request_dict)
+
+        try:
+            _results = await self.jchem_prop_obj.getJchemPropData_async(_response_dict)
+            return self.get_data_response(_response_dict, request_dict, _results)
+        except Exception as err:
+            return self.request_error_response(_response_dict, err)
+
 
-            data_obj = {
-                'calc': "chemaxon", 
-                'prop': "speciation_results",
-                'node': request_dict['node'],
-                'chemical': _filtered_smiles,
-                'workflow': 'chemaxon',
-                'run_type': "single",
-                'request_post': request_dict
-            }
 
-            speciation_data = self.get_speciation_results(request_dict)
+    def is_kow_request(self, request_dict):
+        """
+        kow_wph and kow_no_ph are requested with the request's method.
+        """
+        return request_dict.get('prop') == 'kow_wph' or request_dict.get('prop') == 'kow_no_ph'
+
+
+
+    def get_response_dict(self, request_dict):
+        """
+        Response object with any overlapping keys from request,
+        which is also the p-chem request for jchem_properties.
+        """
+        _response_dict = {}
+        for key in request_dict.keys():
+            if not key == 'nodes':
+                _response_dict[key] = request_dict.get(key)  # fill any overlapping keys from request1
+
+        _response_dict.update({'request_post': request_dict})
 
-            data_obj['request_post'] = {'service': "speciation"}
-            data_obj['data'] = speciation_data
+        if self.is_kow_request(request_dict):
+            _response_dict.update({'method': request_dict.get('method')})
 
-            return data_obj
+        return _response_dict
 
-        else:
 
-            _response_dict = {}
-            for key in request_dict.keys():
-                if not key == 'nodes':
-                    _response_dict[key] = request_dict.get(key)  # fill any overlapping keys from request1
 
-            _response_dict.update({'request_post': request_dict})
+    def get_data_response(self, _response_dict, request_dict, _results):
+        """
+        Fills response object with jchem_properties' results.
+        """
+        _method = request_dict.get('method') if self.is_kow_request(request_dict) else None
+        _response_dict.update({'data': _results['data'], 'method': _method})
+        return _response_dict
 
-            try:
 
-                if request_dict['prop'] == 'kow_wph' or request_dict['prop'] == 'kow_no_ph':
-                    _response_dict.update({'method': request_dict['method']})
-                    _results = self.jchem_prop_obj.getJchemPropData(_response_dict)
-                    _response_dict.update({'data': _results['data'], 'method': request_dict['method']})
-                    return _response_dict
 
-                else:
-                    _results = self.jchem_prop_obj.getJchemPropData(_response_dict)
-                    _response_dict.update({'data': _results['data'], 'method': None})
-                    return _response_dict
+    def request_error_response(self, _response_dict, err):
+        """
+        Fills response object with an error message for a failed request.
+        """
+        logging.warning("Exception occurred getting chemaxon data: {}".format(err))
+        _response_dict.update({
+            'data': "Cannot reach ChemAxon calculator"
+        })
+        return _response_dict
+
 
-            except Exception as err:
-                logging.warning("Exception occurred getting chemaxon data: {}".format(err))
 
-                _response_dict.update({
-                    'data': "Cannot reach ChemAxon calculator"
-                })
-                return _response_dict
+    def get_speciation_response(self, request_dict, _filtered_smiles, speciation_data):
+        """
+        Speciation data object for front end.
+        """
+        return {
+            'calc': "chemaxon", 
+            'prop': "speciation_results",
+            'node': request_dict['node'],
+            'chemical': _filtered_smiles,
+            'workflow': 'chemaxon',
+            'run_type': "single",
+            'request_post': {'service': "speciation"},
+            'data': speciation_data
+        }
 
 
 
@@ -130,51 +213,75 @@ class JchemCalc(Calculator):
         """
         Gets speciation results from jchem_properties.
         """
+        jchemPropObjects = self.get_speciation_prop_objects(request)
+
+        for key, (prop_obj, structure) in jchemPropObjects.items():
+            self.jchem_prop_obj.make_data_request(structure, prop_obj)
+
+        return self.jchem_prop_obj.getSpeciationResults({key: val[0] for key, val in jchemPropObjects.items()})
+
+
+
+    async def get_speciation_results_async(self, request):
+        """
+        Async version of get_speciation_results, which makes the
+        speciation requests concurrently. Parsing runs in the loop's
+        thread pool since it makes its own jchem requests.
+        """
+        jchemPropObjects = self.get_speciation_prop_objects(request)
+
+        await asyncio.gather(*[
+            self.jchem_prop_obj.make_data_request_async(structure, prop_obj)
+            for prop_obj, structure in jchemPropObjects.values()
+        ])
+
+        return await self.run_sync(self.jchem_prop_obj.getSpeciationResults, {key: val[0] for key, val in jchemPropObjects.items()})
+
+
+
+    def get_speciation_prop_objects(self, request):
+        """
+        Returns speciation prop objects to request, as
+        {key: (prop object, structure)}.
+        """
         jchemPropObjects = {}
         if 'speciation_inputs' in request:
             request.update(request['speciation_inputs'])
             del request['speciation_inputs']
 
         if request.get('get_pka'):
-            # Makes call for pKa:
+            # pKa request:
             pkaObj = JchemProperty.getPropObject('pKa')
             pkaObj.postData.update({
                 "pHLower": request['pKa_pH_lower'],
                 "pHUpper": request['pKa_pH_upper'],
                 "pHStep": request['pKa_pH_increment'],
             })
-            self.jchem_prop_obj.make_data_request(request['chemical'], pkaObj)
-            jchemPropObjects['pKa'] = pkaObj
+            jchemPropObjects['pKa'] = (pkaObj, request['chemical'])
 
-            # Makes call for majorMS:
+            # majorMS request:
             majorMsObj = JchemProperty.getPropObject('majorMicrospecies')
             majorMsObj.postData.update({'pH': request['pH_microspecies']})
-            self.jchem_prop_obj.make_data_request(request['chemical'], majorMsObj)
-            jchemPropObjects['majorMicrospecies'] = majorMsObj
+            jchemPropObjects['majorMicrospecies'] = (majorMsObj, request['chemical'])
 
-            # Makes call for isoPt:
+            # isoPt request:
             isoPtObj = JchemProperty.getPropObject('isoelectricPoint')
             isoPtObj.postData.update({'pHStep': request['isoelectricPoint_pH_increment']})
-            self.jchem_prop_obj.make_data_request(request['chemical'], isoPtObj)
-            jchemPropObjects['isoelectricPoint'] = isoPtObj
+            jchemPropObjects['isoelectricPoint'] = (isoPtObj, request['chemical'])
 
         if request.get('get_taut'):
-            # Makes tautomer request:
+            # Tautomer request:
             tautObj = JchemProperty.getPropObject('tautomerization')
             tautObj.postData.update({
                 "maxStructureCount": request['tautomer_maxNoOfStructures'],
                 "pH": request['tautomer_pH']
             })
-            self.jchem_prop_obj.make_data_request(request['chemical'], tautObj)
-            jchemPropObjects['tautomerization'] = tautObj
+            jchemPropObjects['tautomerization'] = (tautObj, request['chemical'])
 
         if request.get('get_stereo'):
-            # Makes stereoisomer request:
+            # Stereoisomer request:
             stereoObj = JchemProperty.getPropObject('stereoisomer')
             stereoObj.postData.update({'maxStructureCount': request['stereoisomers_maxNoOfStructures']})
-            self.jchem_prop_obj.make_data_request(request['smiles'], stereoObj)
-            jchemPropObjects['stereoisomers'] = stereoObj
-
-        speciation_results = self.jchem_prop_obj.getSpeciationResults(jchemPropObjects)
+            jchemPropObjects['stereoisomers'] = (stereoObj, request['smiles'])
 
-        return speciation_results
\ No newline at end of file
+        return jchemPropObjects
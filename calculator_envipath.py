@@ -1,15 +1,21 @@
-import requests
-import json
 import logging
 import os
 
 from .calculator import Calculator
+from . import http_sessions
+from . import request_context
+from . import dispatcher
+from . import json_codec
+from . import lazy_imports
+
+requests = lazy_imports.module('requests')
 
 
 class EnvipathCalc(Calculator):
     """
     Handles requests to and from cts-envipath.
     """
+    metID = request_context.RequestAttribute(0)  # node counter while walking the tree
 
     def __init__(self):
         Calculator.__init__(self)
@@ -56,7 +62,7 @@ class EnvipathCalc(Calculator):
             'total_products': self.metID - 1  # subtract out the parent for "total products" value
         })
         self.metID = 0  # resets the metID attribute
-        return json.dumps(reDict)
+        return reDict
 
 
     def traverse(self, root, gen_limit, unranked=False):
@@ -119,6 +125,8 @@ class EnvipathCalc(Calculator):
 
 
 
+    @request_context.bound
+    @dispatcher.dispatched
     def data_request_handler(self, request_dict):
 
         # metabolizer_data = request_dict.get("metabolizer_post")
@@ -134,15 +142,13 @@ class EnvipathCalc(Calculator):
         }
 
         try:
-            response = requests.post(self.envipath_api_url, json=post_data, timeout=self.timeout)
+            response = http_sessions.post(self.envipath_api_url, json=post_data, timeout=self.timeout)
         except requests.exceptions.RequestException as e:
             logging.warning("calculator_envipath exception: {}".format(e))
             _response_obj.update({'error': "Error getting data from Envipath"})
             return _response_obj
 
-        _results = self.recursive(json.loads(response.content), int(request_dict['gen_limit']), True)
-
-        _products_data = json.loads(_results)
+        _products_data = self.recursive(json_codec.loads(response.content), int(request_dict['gen_limit']), True)
 
         _response_obj['node'] = request_dict.get('node')
         _response_obj['data'] = _products_data['tree']
@@ -1,9 +1,14 @@
-import requests
-import json
 import logging
 import os
 from .calculator import Calculator
+from .templates import Template
 from .chemical_information import SMILESFilter
+from . import calculator_pool
+from . import deadline
+from . import request_context
+from . import dispatcher
+from . import pchem_cache
+from . import json_codec
 
 
 
@@ -11,6 +16,42 @@ class EpiCalc(Calculator):
     """
 	EPI Suite Calculator
 	"""
+    melting_point = request_context.RequestAttribute()  # sent with water_sol/vapor_press requests
+
+    propMap = Template({
+        'melting_point': {
+           'result_key': 'melting_point'
+        },
+        'boiling_point': {
+           'result_key': 'boiling_point'
+        },
+        'water_sol': {
+           'result_key': 'water_solubility',
+           'methods': {'WSKOW': "WSKOW", 'WATERNT': "WATERNT"}
+        },
+        'vapor_press': {
+           'result_key': 'vapor_pressure'
+        },
+        'henrys_law_con': {
+            'result_key': 'henrys_law_constant'
+        },
+        'kow_no_ph': {
+            'result_key': 'log_kow'
+        },
+        'koc': {
+            'result_key': 'log_koc',
+            'methods': {'MCI': "MCI", 'Kow': "KOW"}
+        },
+        'log_bcf': {
+            'result_key': 'log_bcf',
+            'methods': {'regression': "REG", 'Arnot-Gobas': "A-G"}
+        },
+        'log_baf': {
+            'result_key': 'log_baf',
+            'methods': {'Arnot-Gobas': "A-G"}
+        }
+    })
+
     def __init__(self):
         Calculator.__init__(self)
         self.method = None
@@ -23,39 +64,6 @@ class EpiCalc(Calculator):
         self.melting_point = None
         self.epi_props = ['melting_point', 'boiling_point', 'water_solubility', 'vapor_pressure', 'henrys_law_constant', 'log_kow', 'log_koc', 'log_bcf', 'log_baf']
         self.props = ['melting_point', 'boiling_point', 'water_sol', 'vapor_press', 'henrys_law_con', 'kow_no_ph', 'koc', 'log_bcf', 'log_baf']
-        self.propMap = {
-            'melting_point': {
-               'result_key': 'melting_point'
-            },
-            'boiling_point': {
-               'result_key': 'boiling_point'
-            },
-            'water_sol': {
-               'result_key': 'water_solubility',
-               'methods': {'WSKOW': "WSKOW", 'WATERNT': "WATERNT"}
-            },
-            'vapor_press': {
-               'result_key': 'vapor_pressure'
-            },
-            'henrys_law_con': {
-                'result_key': 'henrys_law_constant'
-            },
-            'kow_no_ph': {
-                'result_key': 'log_kow'
-            },
-            'koc': {
-                'result_key': 'log_koc',
-                'methods': {'MCI': "MCI", 'Kow': "KOW"}
-            },
-            'log_bcf': {
-                'result_key': 'log_bcf',
-                'methods': {'regression': "REG", 'Arnot-Gobas': "A-G"}
-            },
-            'log_baf': {
-                'result_key': 'log_baf',
-                'methods': {'Arnot-Gobas': "A-G"}
-            }
-        }
 
 
     def getPostData(self, calc, prop, method=None):
@@ -63,36 +71,58 @@ class EpiCalc(Calculator):
 
     
     def makeDataRequest(self, structure, calc):
-        _post = {'structure': structure}
-        if self.melting_point != None:
-            _post['melting_point'] = self.melting_point
-
         # _url = self.baseUrl + self.urlStruct
         _url = self.baseUrl
 
-        return self.request_logic(_url, _post)
+        return self.request_logic(_url, self.get_structure_post(structure))
+
+
+    async def makeDataRequest_async(self, structure, calc):
+        return await self.request_logic_async(self.baseUrl, self.get_structure_post(structure))
+
+
+    def get_structure_post(self, structure):
+        _post = {'structure': structure}
+        if self.melting_point != None:
+            _post['melting_point'] = self.melting_point
+        return _post
 
     
     def request_logic(self, url, post_data):
         """
         Handles retries and validation of responses
         """
-        _valid_result = False  # for retry logic
-        _retries = 0
-        while not _valid_result and _retries < self.max_retries:
-            # retry data request to chemaxon server until max retries or a valid result is returned
-            try:
-                response = requests.post(url, data=json.dumps(post_data), headers=self.headers, timeout=self.request_timeout)
-                _valid_result = self.validate_response(response)
-                if _valid_result:
-                    self.results = json.loads(response.content)
-                    return self.results
-                _retries += 1
-            except Exception as e:
-                logging.warning("Exception in calculator_epi.py: {}".format(e))
-                _retries += 1
-
-            logging.info("Max retries: {}, Retries left: {}".format(self.max_retries, _retries))
+        try:
+            response = self.request_with_retries('POST', url, self.validate_response, data=json_codec.dumps(post_data), headers=self.headers)
+            return self.parse_response(response)
+        except Exception as e:
+            return self.request_failed(e)
+
+
+    async def request_logic_async(self, url, post_data):
+        """
+        Async version of request_logic.
+        """
+        try:
+            response = await self.request_with_retries_async('POST', url, self.validate_response, data=json_codec.dumps(post_data), headers=self.headers)
+            return self.parse_response(response)
+        except Exception as e:
+            return self.request_failed(e)
+
+
+    def parse_response(self, response):
+        """
+        Sets and returns results from EPI server's response.
+        """
+        self.results = json_codec.loads(response.content)
+        return self.results
+
+
+    def request_failed(self, err):
+        """
+        Sets and returns results for a request that failed.
+        """
+        logging.warning("Exception in calculator_epi.py: {}".format(err))
         self.results = "calc server not found"
         return self.results
 
@@ -120,57 +150,96 @@ class EpiCalc(Calculator):
 
 
 
+    @request_context.bound
+    @pchem_cache.cached
+    @dispatcher.dispatched
+    @deadline.bound
     def data_request_handler(self, request_dict):
         """
         Makes requests to the EPI Suite server
         """
         
         _filtered_smiles = ''
-        _response_dict = {}
-
-        # fill any overlapping keys from request:
-        for key in request_dict.keys():
-            if not key == 'nodes':
-                _response_dict[key] = request_dict.get(key)
-        _response_dict.update({'request_post': request_dict, 'method': None})
+        _response_dict = self.get_response_dict(request_dict)
 
         try:
-            _filtered_smiles = SMILESFilter().parseSmilesByCalculator(request_dict['chemical'], request_dict['calc']) # call smilesfilter
+            _filtered_smiles = calculator_pool.get_instance(SMILESFilter).parseSmilesByCalculator(request_dict['chemical'], request_dict['calc']) # call smilesfilter
         except Exception as err:
-            logging.warning("Error filtering SMILES: {}".format(err))
-            _response_dict.update({
-                'data': "Cannot filter SMILES",
-                'valid': False
-            })
-            return _response_dict
+            return self.smiles_filter_error(_response_dict, err, valid=False)
 
         try:
 
-            _get_mp = request_dict.get('prop') == 'water_sol' or request_dict.get('prop') == 'vapor_press'
-            
-            if _get_mp:
+            self.melting_point = None
+            if self.requires_melting_point(request_dict):
                 self.melting_point = self.get_melting_point(_filtered_smiles, 
                                         request_dict.get('sessionid'), self)
-            else:
-                self.melting_point = None
 
             _result_obj = self.makeDataRequest(_filtered_smiles, request_dict['calc']) # make call for data!
 
-            if _get_mp and not self.melting_point:
+            if self.requires_melting_point(request_dict) and not self.melting_point:
                 # MP not found from measured or test, getting from results,
                 # and requesting data again with set MP..
                 self.melting_point = self.get_mp_from_results(_result_obj)
                 _result_obj = self.makeDataRequest(_filtered_smiles, request_dict['calc'])  # Make request using MP
 
-            _response_dict.update(_result_obj)
-            _response_dict['valid'] = True
-        
-            return _response_dict
+            return self.get_data_response(_response_dict, _result_obj)
 
         except Exception as err:
-            logging.warning("Exception occurred getting {} data: {}".format(err, request_dict['calc']))
-            _response_dict.update({
-                'data': "Cannot reach EPI calculator",
-                'valid': False
-            })
-            return _response_dict
\ No newline at end of file
+            return self.request_error_response(_response_dict, request_dict, err)
+
+
+    @request_context.bound
+    @pchem_cache.cached
+    @dispatcher.dispatched
+    @deadline.bound
+    async def data_request_handler_async(self, request_dict):
+        """
+        Async version of data_request_handler.
+        """
+        _response_dict = self.get_response_dict(request_dict)
+
+        try:
+            _filtered_smiles = await calculator_pool.get_instance(SMILESFilter).parseSmilesByCalculator_async(request_dict['chemical'], request_dict['calc'])
+        except Exception as err:
+            return self.smiles_filter_error(_response_dict, err, valid=False)
+
+        try:
+
+            self.melting_point = None
+            if self.requires_melting_point(request_dict):
+                self.melting_point = await self.get_melting_point_async(_filtered_smiles,
+                                        request_dict.get('sessionid'), self)
+
+            _result_obj = await self.makeDataRequest_async(_filtered_smiles, request_dict['calc'])
+
+            if self.requires_melting_point(request_dict) and not self.melting_point:
+                self.melting_point = self.get_mp_from_results(_result_obj)
+                _result_obj = await self.makeDataRequest_async(_filtered_smiles, request_dict['calc'])
+
+            return self.get_data_response(_response_dict, _result_obj)
+
+        except Exception as err:
+            return self.request_error_response(_response_dict, request_dict, err)
+
+
+
+    def get_data_response(self, response_dict, result_obj):
+        """
+        Fills response_dict with EPI's results.
+        """
+        response_dict.update(result_obj)
+        response_dict['valid'] = True
+        return response_dict
+
+
+
+    def request_error_response(self, response_dict, request_dict, err):
+        """
+        Fills response_dict with an error message for a failed request.
+        """
+        logging.warning("Exception occurred getting {} data: {}".format(err, request_dict['calc']))
+        response_dict.update({
+            'data': "Cannot reach EPI calculator",
+            'valid': False
+        })
+        return response_dict
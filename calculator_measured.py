@@ -1,10 +1,16 @@
-import requests
-import json
 import logging
 import os
 
 from .calculator import Calculator
+from .templates import Template
 from .chemical_information import SMILESFilter
+from . import calculator_pool
+from .retry_policy import RetryError
+from . import deadline
+from . import request_context
+from . import dispatcher
+from . import pchem_cache
+from . import json_codec
 
 
 headers = {'Content-Type': 'application/json'}
@@ -19,6 +25,37 @@ class MeasuredCalc(Calculator):
 	log_kow, and henry's law constant
 	"""
 
+	# map workflow parameters to test
+	propMap = Template({
+		'melting_point': {
+		   'result_key': 'melting_point'
+		},
+		'boiling_point': {
+		   'result_key': 'boiling_point'
+		},
+		'water_sol': {
+		   'result_key': 'water_solubility'
+		},
+		'vapor_press': {
+		   'result_key': 'vapor_pressure'
+		},
+		'henrys_law_con': {
+			'result_key': 'henrys_law_constant'
+		},
+		'kow_no_ph': {
+			'result_key': 'log_kow'
+		},
+		'koc': {
+			'result_key': 'log_koc'
+		}
+	})
+
+	result_structure = Template({
+		'structure': '',
+		'propertyname': '',
+		'propertyvalue': None
+	})
+
 	def __init__(self):
 		Calculator.__init__(self)
 
@@ -30,37 +67,6 @@ class MeasuredCalc(Calculator):
 		self.request_timeout = 20
 		self.melting_point = 0.0
 
-		# map workflow parameters to test
-		self.propMap = {
-			'melting_point': {
-			   'result_key': 'melting_point'
-			},
-			'boiling_point': {
-			   'result_key': 'boiling_point'
-			},
-			'water_sol': {
-			   'result_key': 'water_solubility'
-			},
-			'vapor_press': {
-			   'result_key': 'vapor_pressure'
-			},
-			'henrys_law_con': {
-				'result_key': 'henrys_law_constant'
-			},
-			'kow_no_ph': {
-				'result_key': 'log_kow'
-			},
-			'koc': {
-				'result_key': 'log_koc'
-			}
-		}
-
-		self.result_structure = {
-			'structure': '',
-			'propertyname': '',
-			'propertyvalue': None
-		}
-
 	def getPostData(self):
 		return {"structure": ""}
 
@@ -74,16 +80,36 @@ class MeasuredCalc(Calculator):
 		# return self.request_logic(_url, _post)
 
 		try:
-			response = requests.post(_url, data=json.dumps(_post), headers=self.headers, timeout=self.request_timeout)
-		except requests.exceptions.ConnectionError as ce:
-			logging.warning("connection exception: {}".format(ce))
-			raise 
-		except requests.exceptions.Timeout as te:
-			logging.warning("timeout exception: {}".format(te))
-			raise 
-		else:
-			self.results = response
-			return response
+			response = self.request_with_retries('POST', _url, data=json_codec.dumps(_post), headers=self.headers)
+		except RetryError as e:
+			response = self.handle_retry_error(e)
+		self.results = response
+		return response
+
+
+	async def makeDataRequest_async(self, structure):
+		"""
+		Async version of makeDataRequest.
+		"""
+		_post = self.getPostData()
+		_post['structure'] = structure
+		try:
+			response = await self.request_with_retries_async('POST', self.baseUrl, data=json_codec.dumps(_post), headers=self.headers)
+		except RetryError as e:
+			response = self.handle_retry_error(e)
+		self.results = response
+		return response
+
+
+	def handle_retry_error(self, e):
+		"""
+		Returns the last response of a failed request, or
+		raises the request's exception if no response came back.
+		"""
+		if e.response is None:
+			logging.warning("measured request exception: {}".format(e.exception))
+			raise e.exception
+		return e.response
 
 
 	def validate_response(self, response):
@@ -103,47 +129,63 @@ class MeasuredCalc(Calculator):
 		return True
 
 
+	@request_context.bound
+	@pchem_cache.cached
+	@dispatcher.dispatched
+	@deadline.bound
 	def data_request_handler(self, request_dict):
 
 		_filtered_smiles = ''
-		_response_dict = {}
-		_measured_data = {}
+		_response_dict = self.get_response_dict(request_dict)
 
-		# fill any overlapping keys from request:
-		for key in request_dict.keys():
-			if not key == 'nodes':
-				_response_dict[key] = request_dict.get(key)
-		_response_dict.update({'request_post': request_dict, 'method': None})
+		try:
+			_filtered_smiles = calculator_pool.get_instance(SMILESFilter).parseSmilesByCalculator(request_dict['chemical'], request_dict['calc']) # call smilesfilter
+		except Exception as err:
+			return self.smiles_filter_error(_response_dict, err, valid=False)
 
 		try:
-			_filtered_smiles = SMILESFilter().parseSmilesByCalculator(request_dict['chemical'], request_dict['calc']) # call smilesfilter
+			_response = self.makeDataRequest(_filtered_smiles) # make call for data! (retries handled by retry policy)
+			return self.get_data_response(_response_dict, _response)
+		except Exception as e:
+			return self.request_error_response(_response_dict, e)
+
+
+	@request_context.bound
+	@pchem_cache.cached
+	@dispatcher.dispatched
+	@deadline.bound
+	async def data_request_handler_async(self, request_dict):
+		"""
+		Async version of data_request_handler.
+		"""
+		_response_dict = self.get_response_dict(request_dict)
+
+		try:
+			_filtered_smiles = await calculator_pool.get_instance(SMILESFilter).parseSmilesByCalculator_async(request_dict['chemical'], request_dict['calc'])
 		except Exception as err:
-			logging.warning("Error filtering SMILES: {}".format(err))
-			_response_dict.update({
-				'data': "Cannot filter SMILES",
-				'valid': False
-			})
-			return _response_dict
-
-		_retries = 3
-		while _retries > 0:
-
-			try:
-				_response = self.makeDataRequest(_filtered_smiles) # make call for data!
-				_measured_data = json.loads(_response.content)
-				_measured_data['valid'] = True
-			except Exception as e:
-				logging.warning("Exception making request to Measured: {}".format(e))
-				_response_dict.update({'data': "Cannot reach Measured calculator"})
-				# return _response_dict
-
-			try:
-				_response_dict.update(_measured_data)
-				return _response_dict
-			except Exception as err:
-				logging.warning("Exception occurred getting Measured data: {}".format(err))
-				_response_dict.update({'data': "Cannot reach Measured calculator"})
-
-			logging.info("Retrying Measured request..")
-			_retries = _retries - 1
-		return _response_dict
\ No newline at end of file
+			return self.smiles_filter_error(_response_dict, err, valid=False)
+
+		try:
+			_response = await self.makeDataRequest_async(_filtered_smiles)
+			return self.get_data_response(_response_dict, _response)
+		except Exception as e:
+			return self.request_error_response(_response_dict, e)
+
+
+	def get_data_response(self, _response_dict, _response):
+		"""
+		Fills response object with Measured's results.
+		"""
+		_measured_data = json_codec.loads(_response.content)
+		_measured_data['valid'] = True
+		_response_dict.update(_measured_data)
+		return _response_dict
+
+
+	def request_error_response(self, _response_dict, err):
+		"""
+		Fills response object with an error message for a failed request.
+		"""
+		logging.warning("Exception making request to Measured: {}".format(err))
+		_response_dict.update({'data': "Cannot reach Measured calculator"})
+		return _response_dict
@@ -1,9 +1,12 @@
-import requests
-import json
 import logging
 import os
-import redis
 from .calculator import Calculator
+from .templates import Template
+from . import deadline
+from . import request_context
+from . import dispatcher
+from . import json_codec
+from . import json_stream
 
 
 
@@ -16,6 +19,18 @@ class MetabolizerCalc(Calculator):
 
     Also put the spacetree stuff here, like image size, keys, etc.
     """
+    metID = request_context.RequestAttribute(0)  # node counter while walking the tree
+    unique_products = request_context.RequestAttribute([])
+
+    # CTSWS Transformation Products Request
+    transformation_request = Template({
+        'structure': None,
+        'generationLimit': 1,  # make sure to get this from front end
+        'populationLimit': 0,
+        'likelyLimit': 0.1,
+        'transformationLibraries': ["hydrolysis", "abiotic_reduction"],  # NOTE: no transformationLibraries key:val for mammalian metabolism
+        'excludeCondition': "hasValenceError()"
+    })
 
     def __init__(self, prop_name=None):
         
@@ -46,16 +61,6 @@ class MetabolizerCalc(Calculator):
 
         self.unranked_libs = ['photolysis']  # TODO: break into unranked_photolysis and ranked_photolysis
 
-        # CTSWS Transformation Products Request
-        self.transformation_request = {
-            'structure': None,
-            'generationLimit': 1,  # make sure to get this from front end
-            'populationLimit': 0,
-            'likelyLimit': 0.1,
-            'transformationLibraries': ["hydrolysis", "abiotic_reduction"],  # NOTE: no transformationLibraries key:val for mammalian metabolism
-            'excludeCondition': "hasValenceError()"
-        }
-
         self.unique_products = []
 
 
@@ -88,7 +93,7 @@ class MetabolizerCalc(Calculator):
         # can have edit the 'name' key with the node images...
 
 
-        return json.dumps(reDict)
+        return reDict
 
 
     def traverse(self, root, gen_limit, unranked=False):
@@ -176,20 +181,47 @@ class MetabolizerCalc(Calculator):
 
 
 
+    @request_context.bound
+    @dispatcher.dispatched
+    @deadline.bound
     def data_request_handler(self, request_dict):
 
+        _data_dict = self.get_metabolizer_post(request_dict)
+
+        response = self.getTransProducts(_data_dict, int(request_dict['gen_limit']))
+
+        return self.build_response_obj(request_dict, response)
+
+
+    @request_context.bound
+    @dispatcher.dispatched
+    @deadline.bound
+    async def data_request_handler_async(self, request_dict):
+        """
+        Async version of data_request_handler.
+        """
+        _data_dict = self.get_metabolizer_post(request_dict)
+
+        response = await self.getTransProducts_async(_data_dict)
+
+        return self.build_response_obj(request_dict, response)
+
+
+    def get_metabolizer_post(self, request_dict):
         _data_dict = request_dict.get('metabolizer_post')
         _data_dict.update({'structure': request_dict.get('chemical'), 'excludeCondition': 'hasValenceError()'})
+        return _data_dict
 
+
+    def build_response_obj(self, request_dict, response):
+        """
+        Builds gentrans response object from metabolizer response.
+        """
         unranked = False
-        if 'photolysis' in _data_dict.get('transformationLibraries', []):
+        if 'photolysis' in request_dict.get('metabolizer_post', {}).get('transformationLibraries', []):
             unranked = True
 
-        response = self.getTransProducts(_data_dict)
-
-        _results = self.recursive(response, int(request_dict['gen_limit']), unranked)
-
-        _products_data = json.loads(_results)
+        _products_data = self.recursive(response, int(request_dict['gen_limit']), unranked)
 
         _response_obj = {
             'calc': "chemaxon",  # todo: change to metabolizer, change in template too
@@ -227,15 +259,30 @@ class MetabolizerCalc(Calculator):
         return True
 
 
-    def getTransProducts(self, request_obj):
+    def getTransProducts(self, request_obj, gen_limit=None):
         """
-        Makes request to metabolizer
+        Makes request to metabolizer. With streaming on (see json_stream),
+        the tree is built as the response arrives, leaving out generations
+        past gen_limit.
         """
         url = self.efs_server_url + self.efs_metabolizer_endpoint
         self.request_timeout = 120
+        if gen_limit is not None and json_stream.is_enabled():
+            # products of generation n are nested n + 1 'metabolites' deep (parent is repeated):
+            load = lambda response: json_stream.load_pruned(response, 'metabolites', gen_limit + 1)
+            return self.web_call_stream(url, request_obj, load)
         return self.web_call(url, request_obj)
 
 
+    async def getTransProducts_async(self, request_obj):
+        """
+        Async version of getTransProducts.
+        """
+        url = self.efs_server_url + self.efs_metabolizer_endpoint
+        self.request_timeout = 120
+        return await self.web_call_async(url, request_obj)
+
+
 
     def setLikelyhoodValue(self, product_data):
         """
@@ -1,10 +1,16 @@
-import requests
-import json
 import logging
 import os
 import math
 from .calculator import Calculator
+from .templates import Template
 from .chemical_information import SMILESFilter
+from . import deadline
+from . import request_context
+from . import dispatcher
+from . import pchem_cache
+from . import json_codec
+from . import json_stream
+from contextlib import closing
 
 
 
@@ -12,6 +18,50 @@ class OperaCalc(Calculator):
     """
 	OPERA Suite Calculator
 	"""
+
+    propMap = Template({
+        'kow_no_ph': {
+            'result_key': "LogP_pred",  # is this correct?
+            'methods': None
+        },
+        'melting_point': {
+            'result_key': "MP_pred",
+            'methods': None
+        },
+        'boiling_point': {
+            'result_key': "BP_pred",
+            'methods': None
+        },
+        'vapor_press': {
+            'result_key': "LogVP_pred",
+            'methods': None
+        },
+        'henrys_law_con': {
+            'result_key': "LogHL_pred",
+            'methods': None
+        },
+        'water_sol': {
+            'result_key': "LogWS_pred",
+            'methods': None
+        },
+        'ion_con': {
+            'result_key': ["pKa_a_pred", "pKa_b_pred"],
+            'methods': {'pKa_a_pred': "pKa", 'pKa_b_pred': "pKb"}
+        },
+        'kow_wph': {
+            'result_key': ["LogD55_pred", "LogD74_pred"],
+            'methods': {'LogD55_pred': "LogD55", 'LogD74_pred': "LogD74"}
+        },
+        'log_bcf': {
+            'result_key': "LogBCF_pred",
+            'methods': None
+        },
+        'koc': {
+            'result_key': "LogKoc_pred",
+            'methods': None
+        }
+    })
+
     def __init__(self):
         Calculator.__init__(self)
         self.method = None
@@ -23,48 +73,6 @@ class OperaCalc(Calculator):
         self.props = ['kow_no_ph', 'melting_point', 'boiling_point', 'henrys_law_con', 'vapor_press', 'water_sol', 'ion_con', 'kow_wph', 'log_bcf', 'koc']
         self.opera_props = ['LogP_pred', 'MP_pred', 'BP_pred', 'LogVP_pred', 'LogWS_pred', 'pKa_a_pred',
             'pKa_b_pred', 'LogD55_pred', 'LogD74_pred', 'LogBCF_pred', 'LogKoc_pred']
-        self.propMap = {
-            'kow_no_ph': {
-                'result_key': "LogP_pred",  # is this correct?
-                'methods': None
-            },
-            'melting_point': {
-                'result_key': "MP_pred",
-                'methods': None
-            },
-            'boiling_point': {
-                'result_key': "BP_pred",
-                'methods': None
-            },
-            'vapor_press': {
-                'result_key': "LogVP_pred",
-                'methods': None
-            },
-            'henrys_law_con': {
-                'result_key': "LogHL_pred",
-                'methods': None
-            },
-            'water_sol': {
-                'result_key': "LogWS_pred",
-                'methods': None
-            },
-            'ion_con': {
-                'result_key': ["pKa_a_pred", "pKa_b_pred"],
-                'methods': {'pKa_a_pred': "pKa", 'pKa_b_pred': "pKb"}
-            },
-            'kow_wph': {
-                'result_key': ["LogD55_pred", "LogD74_pred"],
-                'methods': {'LogD55_pred': "LogD55", 'LogD74_pred': "LogD74"}
-            },
-            'log_bcf': {
-                'result_key': "LogBCF_pred",
-                'methods': None
-            },
-            'koc': {
-                'result_key': "LogKoc_pred",
-                'methods': None
-            }
-        }
         self.meta_info = {
             'metaInfo': {
                 'model': "opera",
@@ -259,30 +267,118 @@ class OperaCalc(Calculator):
                 new_results.append(result)
         return new_results
 
+    def personalize_cached_response(self, response, request_dict):
+        """
+        Sets the requested chemical and its node on cached OPERA results.
+        """
+        if not isinstance(request_dict.get('chemical'), list):
+            request_dict['chemical'] = [request_dict['chemical']]
+        response['chemical'] = request_dict['chemical']
+        if 'nodes' in request_dict:
+            response['nodes'] = request_dict['nodes']
+        if isinstance(response.get('data'), list):
+            for data_obj in response['data']:
+                data_obj['chemical'] = request_dict['chemical'][0]
+                data_obj['node'] = self.match_chemical_with_node(data_obj['chemical'], request_dict.get('nodes'))
+        return response
+
+    def pchem_document_response(self, db_handler, query, request_dict):
+        """
+        Builds a p-chem cache entry from the pchem collection's
+        precomputed OPERA data, if it has every requested prop. That
+        data is from the declared model version (meta_info), it isn't
+        used once the version is set or probed as something else.
+        """
+        if query['version'] != self.get_model_version():
+            return None
+        props = query['prop'] if isinstance(query['prop'], list) else [query['prop']]
+        db_results = db_handler.find_pchem_documents({
+            'dsstoxSubstanceId': query['chemical'],
+            'calc': "opera",
+            'prop': {'$in': props},
+            'cache_key': {'$exists': False}
+        })
+        db_results = self.remove_opera_db_duplicates(db_results)
+        db_results = self.curate_logd(db_results, {'props': props}, query['ph'] or self.default_ph)
+        if not db_results or set(props) - set(result.get('prop') for result in db_results):
+            return None
+        data = []
+        for result in db_results:
+            data_obj = {'calc': "opera", 'prop': result['prop'], 'data': result.get('data')}
+            if result.get('method'):
+                data_obj['method'] = result['method']
+            data.append(data_obj)
+        return {
+            'fields': {'data': data, 'valid': True, 'method': None},
+            'echo_nodes': True,
+            'request_post': True
+        }
+
     def makeDataRequest(self, smiles):
+        _url, _post = self.get_data_request(smiles)
+        return self.request_logic(_url, _post)
+
+    def makeDataRequest_stream(self, smiles):
+        """
+        Streaming version of makeDataRequest (see json_stream), 'data'
+        yields each chemical's results as they're parsed.
+        """
+        _url, _post = self.get_data_request(smiles)
+        return {'data': self.request_logic_stream(_url, _post)}
+
+    async def makeDataRequest_async(self, smiles):
+        _url, _post = self.get_data_request(smiles)
+        return await self.request_logic_async(_url, _post)
+
+    def get_data_request(self, smiles):
+        """
+        Returns url and post for OPERA request.
+        """
         _post = {'smiles': smiles}
         _url = self.baseUrl + self.urlStruct
-        return self.request_logic(_url, _post)
+        return _url, _post
     
     def request_logic(self, url, post_data):
         """
         Handles retries and validation of responses
         """
-        _valid_result = False  # for retry logic
-        _retries = 0
-        while not _valid_result and _retries < self.max_retries:
-            # retry data request to chemaxon server until max retries or a valid result is returned
-            try:
-                response = requests.post(url, data=json.dumps(post_data), headers=self.headers, timeout=self.request_timeout)
-                _valid_result = self.validate_response(response)
-                if _valid_result:
-                    self.results = json.loads(response.content)
-                    return self.results
-                _retries += 1
-            except Exception as e:
-                logging.warning("Exception in calculator_opera.py: {}".format(e))
-                _retries += 1
-            logging.info("Max retries: {}, Retries left: {}".format(self.max_retries, _retries))
+        try:
+            response = self.request_with_retries('POST', url, self.validate_response, data=json_codec.dumps(post_data), headers=self.headers)
+            return self.parse_response(response)
+        except Exception as e:
+            return self.request_failed(e)
+
+    def request_logic_stream(self, url, post_data):
+        """
+        Streams the response, yielding results as they're parsed.
+        Unlike request_logic, errors are raised to the caller.
+        """
+        response = self.request_with_retries('POST', url, self.validate_response, data=json_codec.dumps(post_data), headers=self.headers, stream=True, coalesce=False)
+        with closing(response):
+            yield from json_stream.iter_items(response, 'data.item')
+
+    async def request_logic_async(self, url, post_data):
+        """
+        Async version of request_logic.
+        """
+        try:
+            response = await self.request_with_retries_async('POST', url, self.validate_response, data=json_codec.dumps(post_data), headers=self.headers)
+            return self.parse_response(response)
+        except Exception as e:
+            return self.request_failed(e)
+
+    def parse_response(self, response):
+        """
+        Sets and returns results from OPERA server's response.
+        """
+        self.results = json_codec.loads(response.content)
+        return self.results
+
+    def request_failed(self, err):
+        """
+        Sets and returns results for a request that failed.
+        """
+        logging.warning("Exception in calculator_opera.py: {}".format(err))
         self.results = "calc server not found"
         return self.results
 
@@ -298,13 +394,47 @@ class OperaCalc(Calculator):
             return False
         return True
 
+    @request_context.bound
+    @pchem_cache.cached
+    @dispatcher.dispatched
+    @deadline.bound
     def data_request_handler(self, request_dict):
         """
         Makes requests to the OPERA Suite server
         """
+        _response_dict = self.get_response_dict(request_dict)
+
+        try:
+            if json_stream.is_enabled():
+                _result_obj = self.makeDataRequest_stream(request_dict['chemical'])  # parsed as results arrive
+            else:
+                _result_obj = self.makeDataRequest(request_dict['chemical'])
+            return self.get_data_response(_response_dict, _result_obj)
+        except Exception as err:
+            return self.request_error_response(_response_dict, request_dict, err)
+
+    @request_context.bound
+    @pchem_cache.cached
+    @dispatcher.dispatched
+    @deadline.bound
+    async def data_request_handler_async(self, request_dict):
+        """
+        Async version of data_request_handler. Parsing runs in the
+        loop's thread pool, since water_sol conversion can request mass.
+        """
+        _response_dict = self.get_response_dict(request_dict)
 
-        OPERA_URL = os.environ.get("CTS_OPERA_SERVER")
+        try:
+            _result_obj = await self.makeDataRequest_async(request_dict['chemical'])
+            return await self.run_sync(self.get_data_response, _response_dict, _result_obj)
+        except Exception as err:
+            return self.request_error_response(_response_dict, request_dict, err)
 
+    def get_response_dict(self, request_dict):
+        """
+        Response object with overlapping keys from request,
+        with the request's chemical as a list.
+        """
         if not isinstance(request_dict.get('chemical'), list):
             request_dict['chemical'] = [request_dict['chemical']]
 
@@ -314,17 +444,23 @@ class OperaCalc(Calculator):
         for key in request_dict.keys():
             _response_dict[key] = request_dict.get(key)
         _response_dict.update({'request_post': request_dict, 'method': None})
+        return _response_dict
 
-        try:
-            _result_obj = self.makeDataRequest(request_dict['chemical'])
-            _result_obj = self.parse_results_for_cts(_response_dict, _result_obj)
-            _response_dict['data'] = _result_obj
-            _response_dict['valid'] = True
-            return _response_dict
-        except Exception as err:
-            logging.warning("Exception occurred getting {} data: {}".format(request_dict['calc'], err))
-            _response_dict.update({
-                'data': "Cannot reach OPERA calculator",
-                'valid': False
-            })
-            return _response_dict
\ No newline at end of file
+    def get_data_response(self, _response_dict, _result_obj):
+        """
+        Fills response object with OPERA's results, parsed for CTS.
+        """
+        _response_dict['data'] = self.parse_results_for_cts(_response_dict, _result_obj)
+        _response_dict['valid'] = True
+        return _response_dict
+
+    def request_error_response(self, _response_dict, request_dict, err):
+        """
+        Fills response object with an error message for a failed request.
+        """
+        logging.warning("Exception occurred getting {} data: {}".format(request_dict['calc'], err))
+        _response_dict.update({
+            'data': "Cannot reach OPERA calculator",
+            'valid': False
+        })
+        return _response_dict
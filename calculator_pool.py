@@ -0,0 +1,36 @@
+"""
+Shared calculator instances for hot paths.
+
+SMILES filtering, mass checks and speciation used to construct new
+Calculator, SMILESFilter and jchem prop objects for every chemical and
+transformation product. Callers that don't keep request state on the
+object they use (e.g., web_call, getMass, parseSmilesByCalculator) get
+a shared instance from here instead. Instances are per thread, so
+worker threads never share one.
+"""
+
+import threading
+
+
+
+_local = threading.local()
+
+
+def get_instance(cls):
+	"""
+	Returns this thread's shared instance of cls, creating it if needed.
+	"""
+	instances = getattr(_local, 'instances', None)
+	if instances is None:
+		instances = _local.instances = {}
+	instance = instances.get(cls)
+	if instance is None:
+		instance = instances[cls] = cls()
+	return instance
+
+
+def clear():
+	"""
+	Drops this thread's shared instances.
+	"""
+	_local.instances = {}
@@ -1,12 +1,19 @@
-import json
 import logging
-import requests
 import os
 from .calculator import Calculator
 from .chemical_information import SMILESFilter
+from . import calculator_pool
+from . import deadline
+from . import request_context
+from . import dispatcher
+from . import pchem_cache
+from . import json_codec
 
 
 class SparcCalc(Calculator):
+    smiles = request_context.RequestAttribute()  # filtered smiles being requested
+    melting_point = request_context.RequestAttribute(0.0)
+
     def __init__(self, smiles=None, melting_point=0.0, pressure=760.0, temperature=25.0):
 
         Calculator.__init__(self)  # inherit Calculator base class
@@ -100,73 +107,113 @@ class SparcCalc(Calculator):
         return calculations
 
 
+    @request_context.bound
+    @pchem_cache.cached
+    @dispatcher.dispatched
+    @deadline.bound
     def data_request_handler(self, request_dict):
 
-        for key, val in self.pchem_request.items():
-            if not key in request_dict.keys():
-                logging.info("request key {} not in request, using default value: {}".format(key, val))
-                request_dict.update({key: val})
-
+        self.fill_pchem_request(request_dict)
 
         _filtered_smiles = ''
         try:
-            _filtered_smiles = SMILESFilter().parseSmilesByCalculator(request_dict['chemical'], request_dict['calc']) # call smilesfilter
+            _filtered_smiles = calculator_pool.get_instance(SMILESFilter).parseSmilesByCalculator(request_dict['chemical'], request_dict['calc']) # call smilesfilter
         except Exception as err:
-            logging.warning("Error filtering SMILES: {}".format(err))
-            request_dict.update({'data': 'Cannot filter SMILES'})
-            return request_dict
+            return self.smiles_filter_error(request_dict, err)
 
 
         self.smiles = _filtered_smiles  # set smiles attribute to filtered smiles
 
         # Gets melting point for sparc calculations.
-        if request_dict.get('prop') == 'water_sol' or request_dict.get('prop') == 'vapor_press':                
+        self.melting_point = None
+        if self.requires_melting_point(request_dict):
             self.melting_point = self.get_melting_point(_filtered_smiles, 
                                     request_dict.get('sessionid'), self)
-        else:
-            self.melting_point = None
 
         logging.info("Using melting point: {} for SPARC calculation".format(self.melting_point))
 
-        _response_dict = {}
-        for key in request_dict.keys():
-            if not key == 'nodes':
-                _response_dict[key] = request_dict.get(key)  # fill any overlapping keys from request1
+        _response_dict = self.get_response_dict(request_dict)
+
+        try:
+            _url, _post = self.get_data_request(request_dict)
+            return self.parse_data_response(self.request_logic(_url, _post), request_dict, _response_dict)
+        except Exception as err:
+            return self.request_error_response(_response_dict, request_dict, err)
 
-        _response_dict.update({'request_post': request_dict, 'method': None})
+
+    @request_context.bound
+    @pchem_cache.cached
+    @dispatcher.dispatched
+    @deadline.bound
+    async def data_request_handler_async(self, request_dict):
+        """
+        Async version of data_request_handler.
+        """
+        self.fill_pchem_request(request_dict)
 
         try:
-            # Runs ion_con endpoint if it's user's requested property
-            if request_dict.get('prop') == 'ion_con':
-                response = self.makeCallForPka() # response as d ict returned..
-                pka_data = self.getPkaResults(response)
-                _response_dict.update({'data': pka_data, 'prop': 'ion_con'})
-                return _response_dict
-
-            # Runs kow_wph endpoint if it's user's requested property
-            elif request_dict.get('prop') == 'kow_wph':
-                response = self.makeCallForLogD() # response as dict returned..
-                _response_dict.update({'data': self.getLogDForPH(response, request_dict['ph']), 'prop': 'kow_wph'})
-                return _response_dict
-
-            # Runs multiprop request if request prop is not kow_wph or ion_con
-            else:
-                _post = self.get_sparc_query()
-                _url = self.base_url + self.multiproperty_url
-                _multi_response = self.makeDataRequest()
-
-                if 'calculationResults' in _multi_response:
-                    _multi_response = self.parseMultiPropResponse(_multi_response['calculationResults'], request_dict)
-                    return _multi_response
+            _filtered_smiles = await calculator_pool.get_instance(SMILESFilter).parseSmilesByCalculator_async(request_dict['chemical'], request_dict['calc'])
+        except Exception as err:
+            return self.smiles_filter_error(request_dict, err)
 
+        self.smiles = _filtered_smiles
+
+        self.melting_point = None
+        if self.requires_melting_point(request_dict):
+            self.melting_point = await self.get_melting_point_async(_filtered_smiles,
+                                    request_dict.get('sessionid'), self)
+
+        logging.info("Using melting point: {} for SPARC calculation".format(self.melting_point))
+
+        _response_dict = self.get_response_dict(request_dict)
+
+        try:
+            _url, _post = self.get_data_request(request_dict)
+            return self.parse_data_response(await self.request_logic_async(_url, _post), request_dict, _response_dict)
         except Exception as err:
-            logging.warning("Exception occurred getting SPARC data: {}".format(err))
-            _response_dict.update({
-                'data': "request timed out",
-                'prop': request_dict.get('prop')
-            })
+            return self.request_error_response(_response_dict, request_dict, err)
+
+
+    def get_data_request(self, request_dict):
+        """
+        Returns url and post for the requested prop: ion_con and
+        kow_wph have their own endpoints, other props use multiprop.
+        """
+        if request_dict.get('prop') == 'ion_con':
+            return self.get_pka_request()
+        elif request_dict.get('prop') == 'kow_wph':
+            return self.get_logd_request()
+        return self.base_url + self.multiproperty_url, self.get_sparc_query()
+
+
+    def parse_data_response(self, response, request_dict, _response_dict):
+        """
+        Parses SPARC's response (from get_data_request's request)
+        into CTS response object.
+        """
+        if request_dict.get('prop') == 'ion_con':
+            _response_dict.update({'data': self.getPkaResults(response), 'prop': 'ion_con'})
+            return _response_dict
+
+        elif request_dict.get('prop') == 'kow_wph':
+            _response_dict.update({'data': self.getLogDForPH(response, request_dict['ph']), 'prop': 'kow_wph'})
             return _response_dict
 
+        elif 'calculationResults' in response:
+            return self.parseMultiPropResponse(response['calculationResults'], request_dict)
+
+
+    def request_error_response(self, _response_dict, request_dict, err):
+        """
+        Fills response object with an error message for a failed request.
+        """
+        logging.warning("Exception occurred getting SPARC data: {}".format(err))
+        _response_dict.update({
+            'data': "request timed out",
+            'prop': request_dict.get('prop')
+        })
+        return _response_dict
+
 
     def makeDataRequest(self):
         _post = self.get_sparc_query()
@@ -178,21 +225,37 @@ class SparcCalc(Calculator):
         """
         Handles retries and validation of responses
         """
-        _valid_result = False  # for retry logic
-        _retries = 0
-        while not _valid_result and _retries < self.max_retries:
-            # retry data request to chemaxon server until max retries or a valid result is returned
-            try:
-                response = requests.post(url, data=json.dumps(post_data), headers=self.headers, timeout=self.request_timeout)
-                _valid_result = self.validate_response(response)
-                if _valid_result:
-                    self.results = json.loads(response.content)
-                    return self.results
-                _retries += 1
-            except Exception as e:
-                logging.warning("Exception in calculator_sparc.py: {}".format(e))
-                _retries += 1
-            logging.info("Max retries: {}, Retries left: {}".format(self.max_retries, _retries))
+        try:
+            response = self.request_with_retries('POST', url, self.validate_response, data=json_codec.dumps(post_data), headers=self.headers)
+            return self.parse_response(response)
+        except Exception as e:
+            return self.request_failed(e)
+
+
+    async def request_logic_async(self, url, post_data):
+        """
+        Async version of request_logic.
+        """
+        try:
+            response = await self.request_with_retries_async('POST', url, self.validate_response, data=json_codec.dumps(post_data), headers=self.headers)
+            return self.parse_response(response)
+        except Exception as e:
+            return self.request_failed(e)
+
+
+    def parse_response(self, response):
+        """
+        Sets and returns results from SPARC server's response.
+        """
+        self.results = json_codec.response_json(response)  # decoded once, in validate_response
+        return self.results
+
+
+    def request_failed(self, err):
+        """
+        Sets and returns results for a request that failed.
+        """
+        logging.warning("Exception in calculator_sparc.py: {}".format(err))
         self.results = "calc server not found"
         return self.results
 
@@ -208,7 +271,7 @@ class SparcCalc(Calculator):
             return False
         
         try:
-            response_obj = json.loads(response.content)
+            response_obj = json_codec.response_json(response)
         except Exception as e:
             logging.warning("Could not convert response to json object, sparc validate_response: {}".format(e))
             return False
@@ -226,6 +289,21 @@ class SparcCalc(Calculator):
         return True
 
 
+    def is_cacheable_response(self, response):
+        """
+        Multiprop results are cacheable if every requested prop came back,
+        ion_con and kow_wph results if a value did.
+        """
+        if isinstance(response, list):
+            return bool(response) and all(data_obj.get('data') != "prop not found" for data_obj in response)
+        if not isinstance(response, dict):
+            return False
+        data = response.get('data')
+        if response.get('prop') == 'ion_con':
+            return isinstance(data, dict) and any(data.get(key) for key in ('pKa', 'pKb'))
+        return self.is_pchem_value(data)
+
+
     def parseMultiPropResponse(self, results, request_dict):
         """
         Loops through data grabbing the results
@@ -267,6 +345,14 @@ class SparcCalc(Calculator):
         """
         Separate call for SPARC pKa
         """
+        _url, _sparc_post = self.get_pka_request()
+        return self.request_logic(_url, _sparc_post)
+
+
+    def get_pka_request(self):
+        """
+        Returns url and post for SPARC pKa request
+        """
         _pka_url = "/sparc-integration/rest/calc/fullSpeciation"
         _url = self.base_url + _pka_url
         logging.info("URL: {}".format(_url))
@@ -281,9 +367,7 @@ class SparcCalc(Calculator):
             "elimBase":[],
             "considerMethylAsAcid": True
         }
-        _post_string = json.dumps(_sparc_post)
-
-        return self.request_logic(_url, _sparc_post)
+        return _url, _sparc_post
 
 
     def getPkaResults(self, results):
@@ -328,6 +412,15 @@ class SparcCalc(Calculator):
         Seprate call for octanol/water partition
         coefficient with pH (logD?)
         """
+        _url, _post = self.get_logd_request()
+        logd_results = self.request_logic(_url, _post)
+        return logd_results
+
+
+    def get_logd_request(self):
+        """
+        Returns url and post for SPARC logD request
+        """
         _logd_url = "/sparc-integration/rest/calc/logd"
         _url = self.base_url + _logd_url
         _post = {
@@ -344,9 +437,7 @@ class SparcCalc(Calculator):
            "ionic_strength": 0.0,
            "smiles": self.smiles
         }
-
-        logd_results = self.request_logic(_url, _post)
-        return logd_results
+        return _url, _post
 
 
     def getLogDForPH(self, results, ph=7.0):
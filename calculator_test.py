@@ -1,5 +1,3 @@
-import requests
-import json
 import logging
 import os
 #try:
@@ -7,7 +5,18 @@ import os
 #except ImportError as e:
 #    from cts_calcs.calculator import Calculator
 from .calculator import Calculator
+from .templates import Template
 from .chemical_information import SMILESFilter
+from . import calculator_pool
+from .retry_policy import RetryError
+from . import deadline
+from . import request_context
+from . import dispatcher
+from . import pchem_cache
+from . import json_codec
+from . import lazy_imports
+
+requests = lazy_imports.module('requests')
 
 headers = {'Content-Type': 'application/json'}
 
@@ -18,6 +27,49 @@ class TestWSCalc(Calculator):
 	TEST WS Calculator at https://comptox.epa.gov/dashboard/web-test/
 	Additional documentation: Todd Martin's User's Guide
 	"""
+	method = request_context.RequestAttribute()  # TEST method for the current request
+
+	# map workflow parameters to test
+	propMap = Template({
+		'melting_point': {
+		   'urlKey': 'MP'
+		},
+		'boiling_point': {
+		   'urlKey': 'BP'
+		},
+		'water_sol': {
+		   'urlKey': 'WS'
+		},
+		'vapor_press': {
+		   'urlKey': 'VP'
+		},
+		'log_bcf': {
+			'urlKey': 'BCF'
+		}
+		# 'henrys_law_con': ,
+		# 'kow_no_ph': 
+	})
+
+	# TESTWS API responses map:
+	response_map = Template({
+		# NOTE: MP TESTWS endpoint is only returning '*ValMass', but with 'massUnits'="*C"
+		'melting_point': {
+			'data_type': 'predValMass'
+		},
+		# NOTE: BP TESTWS endpoint is only returning '*ValMass', but with 'massUnits'="*C"
+		'boiling_point': {
+			'data_type': 'predValMass'
+		},
+		'water_sol': {
+			'data_type': 'predValMass'
+		},
+		'vapor_press': {
+			'data_type': 'predValMass'
+		},
+		'log_bcf': {
+			'data_type': 'predValMolarLog'
+		}
+	})
 
 	def __init__(self):
 
@@ -36,53 +88,11 @@ class TestWSCalc(Calculator):
 		self.bcf_method = "sm"
 		self.timeout = 10
 
-		# map workflow parameters to test
-		self.propMap = {
-			'melting_point': {
-			   'urlKey': 'MP'
-			},
-			'boiling_point': {
-			   'urlKey': 'BP'
-			},
-			'water_sol': {
-			   'urlKey': 'WS'
-			},
-			'vapor_press': {
-			   'urlKey': 'VP'
-			},
-			'log_bcf': {
-				'urlKey': 'BCF'
-			}
-			# 'henrys_law_con': ,
-			# 'kow_no_ph': 
-		}
-
 		self.result_keys = ['id', 'smiles', 'expValMass', 'expValMolarLog', 'predValMass',
 			'predValMolarLog', 'massUnits', 'molarLogUnits']
 
 		self.cts_testws_data_key = 'predValMass'
 
-		# TESTWS API responses map:
-		self.response_map = {
-			# NOTE: MP TESTWS endpoint is only returning '*ValMass', but with 'massUnits'="*C"
-			'melting_point': {
-				'data_type': 'predValMass'
-			},
-			# NOTE: BP TESTWS endpoint is only returning '*ValMass', but with 'massUnits'="*C"
-			'boiling_point': {
-				'data_type': 'predValMass'
-			},
-			'water_sol': {
-				'data_type': 'predValMass'
-			},
-			'vapor_press': {
-				'data_type': 'predValMass'
-			},
-			'log_bcf': {
-				'data_type': 'predValMolarLog'
-			}
-		}
-
 
 
 	def convertWaterSolubility(self, _response_dict):
@@ -102,59 +112,141 @@ class TestWSCalc(Calculator):
 
 
 	def makeDataRequest(self, structure, calc, prop, method):
-		test_prop = self.propMap[prop]['urlKey'] # prop name TEST understands
-		_url = self.baseUrl + "/{}".format(test_prop)
-		_payload = {'smiles': structure, 'method': method}
+		_url, _payload = self.get_data_request(structure, prop, method)
 		try:
-			response = requests.get(_url, params=_payload, timeout=self.timeout)
-		except requests.exceptions.ConnectionError as ce:
-			logging.warning("connection exception: {}".format(ce))
-			return {'error': 'connection error'}
-		except requests.exceptions.Timeout as te:
-			logging.warning("timeout exception: {}".format(te))
-			return {'error': 'timeout error'}
-		except Exception as e:
-			logging.warning("exception: {}".format(e))
+			response = self.request_with_retries('GET', _url, params=_payload, timeout=self.timeout)
+		except RetryError as e:
+			response = self.handle_retry_error(e)
 
 		self.results = response
 		return response
 
 
 
-	def data_request_handler(self, request_dict):		
+	async def makeDataRequest_async(self, structure, calc, prop, method):
+		"""
+		Async version of makeDataRequest.
+		"""
+		_url, _payload = self.get_data_request(structure, prop, method)
+		try:
+			response = await self.request_with_retries_async('GET', _url, params=_payload, timeout=self.timeout)
+		except RetryError as e:
+			response = self.handle_retry_error(e)
 
-		_filtered_smiles = ''
-		_response_dict = {}
+		self.results = response
+		return response
 
-		# fill any overlapping keys from request:
+
+
+	def get_data_request(self, structure, prop, method):
+		"""
+		Returns url and query params for TESTWS request.
+		"""
+		test_prop = self.propMap[prop]['urlKey'] # prop name TEST understands
+		_url = self.baseUrl + "/{}".format(test_prop)
+		_payload = {'smiles': structure, 'method': method}
+		return _url, _payload
+
+
+
+	def handle_retry_error(self, e):
+		"""
+		Returns the last response of a failed request, or
+		an error object if no response came back.
+		"""
+		if e.response is not None:
+			return e.response  # non-200 response, handled by data_request_handler
+		elif isinstance(e.exception, requests.exceptions.ConnectionError):
+			logging.warning("connection exception: {}".format(e.exception))
+			return {'error': 'connection error'}
+		elif isinstance(e.exception, requests.exceptions.Timeout):
+			logging.warning("timeout exception: {}".format(e.exception))
+			return {'error': 'timeout error'}
+		else:
+			logging.warning("exception: {}".format(e.exception))
+			return {'error': 'connection error'}
+
+
+
+	def get_response_dict(self, request_dict):
+		"""
+		Response object with any overlapping keys from request.
+		"""
+		_response_dict = {}
 		for key in request_dict.keys():
 			if not key == 'nodes':
 				_response_dict[key] = request_dict.get(key)
 		_response_dict.update({'request_post': request_dict})
 		# _response_dict.update({'request_post': {'service': "pchemprops"}})  # TODO: get rid of 'request_post' and double data
+		return _response_dict
+
+
+
+	def set_method(self, request_dict, _response_dict):
+		if request_dict.get('method') and request_dict['method'] in self.methods + [self.bcf_method]:
+			# Uses method provided in request to get data from TESTWS, otherwise uses default
+			self.method = request_dict.get('method')
+			# Make sure method name is all caps (it's an acronym):
+			_response_dict['method'] = _response_dict.get('method').upper()
+
+
+
+	@request_context.bound
+	@pchem_cache.cached
+	@dispatcher.dispatched
+	@deadline.bound
+	async def data_request_handler_async(self, request_dict):
+		"""
+		Async version of data_request_handler.
+		"""
+		_response_dict = self.get_response_dict(request_dict)
+
+		try:
+			_filtered_smiles = await calculator_pool.get_instance(SMILESFilter).parseSmilesByCalculator_async(request_dict.get('chemical'), self.name)
+		except Exception as err:
+			return self.smiles_filter_error(_response_dict, err, "Cannot filter SMILES for TEST WS data")
+
+		self.set_method(request_dict, _response_dict)
+
+		_response = await self.makeDataRequest_async(_filtered_smiles, self.name, request_dict.get('prop'), self.method)
+
+		return self.parse_test_response(_response, request_dict, _response_dict)
+
+
+
+	@request_context.bound
+	@pchem_cache.cached
+	@dispatcher.dispatched
+	@deadline.bound
+	def data_request_handler(self, request_dict):		
+
+		_filtered_smiles = ''
+		_response_dict = self.get_response_dict(request_dict)
 
 
 		# filter smiles before sending to TEST:
 		# ++++++++++++++++++++++++ smiles filtering!!! ++++++++++++++++++++
 		try:
-			_filtered_smiles = SMILESFilter().parseSmilesByCalculator(request_dict.get('chemical'), self.name) # call smilesfilter
+			_filtered_smiles = calculator_pool.get_instance(SMILESFilter).parseSmilesByCalculator(request_dict.get('chemical'), self.name) # call smilesfilter
 		except Exception as err:
-			logging.warning("Error filtering SMILES: {}".format(err))
-			_response_dict.update({'data': "Cannot filter SMILES for TEST WS data"})
-			return _response_dict
+			return self.smiles_filter_error(_response_dict, err, "Cannot filter SMILES for TEST WS data")
 		# +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 		# logging.info("TEST WS Filtered SMILES: {}".format(_filtered_smiles))
 		# logging.info("Calling TEST WS for {} data...".format(request_dict['prop']))
 
-		if request_dict.get('method') and request_dict['method'] in self.methods + [self.bcf_method]:
-			# Uses method provided in request to get data from TESTWS, otherwise uses default
-			self.method = request_dict.get('method')
-			# Make sure method name is all caps (it's an acronym):
-			_response_dict['method'] = _response_dict.get('method').upper()
+		self.set_method(request_dict, _response_dict)
 
 		_response = self.makeDataRequest(_filtered_smiles, self.name, request_dict.get('prop'), self.method)
 
+		return self.parse_test_response(_response, request_dict, _response_dict)
+
+
+
+	def parse_test_response(self, _response, request_dict, _response_dict):
+		"""
+		Parses TESTWS response into CTS response object.
+		"""
 		if 'error' in _response:
 			_response_dict.update({'data': _response['error']})
 			return _response_dict
@@ -163,7 +255,7 @@ class TestWSCalc(Calculator):
 			_response_dict.update({'data': "Cannot reach TESTWS"})
 			return _response_dict
 
-		_response_obj = json.loads(_response.content)
+		_response_obj = json_codec.loads(_response.content)
 		_test_data = _response_obj['predictions'][0]  # list of predictions (getting first because only one chemical comes back for GET requests)
 
 		if 'error' in _test_data:
@@ -190,6 +282,15 @@ class TestWSCalc(Calculator):
 
 
 
+	def is_cacheable_response(self, response):
+		"""
+		Results are cacheable if TESTWS returned a value, not "N/A"
+		or an error message.
+		"""
+		return isinstance(response, dict) and self.is_pchem_value(response.get('data'))
+
+
+
 	def convert_testws_scinot(self, pchem_data):
 		"""
 		Converts TESTWS scientific notation format.
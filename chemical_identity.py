@@ -0,0 +1,178 @@
+"""
+Canonical chemical identity index.
+
+The same substance reaches CTS as a name, CAS#, drawn MRV, SMILES or
+CTS-filtered SMILES, and each form used to be a separate cache key, so
+"aspirin", 50-78-2 and its SMILES each cost a full chem info run. Once
+ChemInfo.get_cheminfo has identified a chemical, every form it saw
+(entered chemical, initial and filtered SMILES, CAS#, preferred name,
+DTXSID) is registered as an alias of one canonical key: the DTXSID if
+DSSTox has it, otherwise the filtered SMILES. Result caches key on
+get_key(chemical), so all forms share entries.
+
+Aliases resolve through an in-process LRU, redis (CTS_CHEM_IDENTITY_TTL
+seconds) and mongodb's chem_aliases collection (if CTS_DB_HOST is set),
+which keeps them across redis restarts.
+"""
+
+import os
+import hashlib
+import logging
+from .response_cache import LRUCache
+from . import redis_pool
+from . import json_codec
+from . import lazy_imports
+
+mongodb_handler = lazy_imports.module('.mongodb_handler', __package__)
+
+
+
+RECORD_KEYS = ['dtxsid', 'smiles', 'orig_smiles', 'casrn', 'preferredName']
+EMPTY_VALUES = ["", "N/A", None]
+
+
+
+def normalize(chemical):
+	"""
+	Returns the alias form of a chemical (surrounding whitespace removed).
+	"""
+	if not isinstance(chemical, str):
+		return None
+	return chemical.strip() or None
+
+
+def get_canonical_key(record):
+	"""
+	Returns the canonical key for an identity record: its
+	DTXSID if it has one, otherwise its filtered SMILES.
+	"""
+	dtxsid = record.get('dtxsid')
+	if isinstance(dtxsid, str) and dtxsid.startswith('DTXSID'):
+		return dtxsid
+	return record.get('smiles')
+
+
+
+class IdentityIndex(object):
+	"""
+	Maps any form of a chemical to its identity record ({key, dtxsid,
+	smiles, orig_smiles, casrn, preferredName, and optionally cached
+	chem info}).
+	"""
+	key_prefix = "cts_chemid"
+
+	def __init__(self, enabled=None, ttl=None, max_bytes=None, use_mongo=None):
+		if enabled is None:
+			enabled = os.environ.get('CTS_CHEM_IDENTITY', 'true').lower() == 'true'
+		if use_mongo is None:
+			use_mongo = bool(os.environ.get('CTS_DB_HOST')) and os.environ.get('CTS_CHEM_IDENTITY_MONGO', 'true').lower() == 'true'
+		self.enabled = enabled
+		self.use_mongo = use_mongo
+		self.ttl = ttl or int(os.environ.get('CTS_CHEM_IDENTITY_TTL', 7 * 24 * 3600))
+		self.local = LRUCache(max_bytes or int(os.environ.get('CTS_CHEM_IDENTITY_MAX_BYTES', 16 * 1024 * 1024)))
+
+	def make_alias_key(self, alias):
+		digest = hashlib.sha1(alias.encode('utf-8')).hexdigest()  # MRV input can be large
+		return "{}:alias:{}".format(self.key_prefix, digest)
+
+	def make_record_key(self, key):
+		digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+		return "{}:record:{}".format(self.key_prefix, digest)
+
+	def get_db_handler(self):
+		if not self.use_mongo:
+			return None
+		return mongodb_handler.get_shared_handler()
+
+	def resolve(self, chemical, redis_conn=None):
+		"""
+		Returns the identity record for any known form of chemical, or None.
+		"""
+		alias = normalize(chemical)
+		if not self.enabled or not alias:
+			return None
+		alias_key = self.make_alias_key(alias)
+
+		value = self.local.get(alias_key)
+		if value is not None:
+			return json_codec.loads(value)
+
+		redis_conn = redis_conn or redis_pool.get_redis()
+		key = redis_pool.get_many([alias_key], redis_conn)[0]
+		if key is not None:
+			key = key.decode('utf-8') if isinstance(key, bytes) else key
+			value = redis_pool.get_many([self.make_record_key(key)], redis_conn)[0]
+			if value is not None:
+				value = value.decode('utf-8') if isinstance(value, bytes) else value
+				self.local.set(alias_key, value, self.ttl)
+				return json_codec.loads(value)
+
+		db_handler = self.get_db_handler()
+		if db_handler is None:
+			return None
+		try:
+			document = db_handler.find_alias_document({'alias': alias})
+		except Exception as e:
+			logging.warning("Unable to get chem alias from db: {}".format(e))
+			return None
+		if not document or not document.get('record'):
+			return None
+		record = document['record']
+		self.cache_record(record, [alias], redis_conn)  # back into the faster tiers
+		return record
+
+	def get_key(self, chemical, redis_conn=None):
+		"""
+		Returns chemical's canonical key, or chemical itself if it isn't known.
+		"""
+		record = self.resolve(chemical, redis_conn)
+		if record and record.get('key'):
+			return record['key']
+		return chemical
+
+	def register(self, record, aliases, redis_conn=None):
+		"""
+		Stores an identity record (see RECORD_KEYS) under its canonical
+		key and each of its aliases. Returns the record, or None if it
+		has no canonical key.
+		"""
+		if not self.enabled:
+			return None
+		record = dict(record)
+		key = get_canonical_key(record)
+		if not key:
+			return None
+		record['key'] = key
+		aliases = [key] + [record.get(name) for name in RECORD_KEYS] + list(aliases)
+		aliases = list(dict.fromkeys(normalize(alias) for alias in aliases if alias not in EMPTY_VALUES))
+		aliases = [alias for alias in aliases if alias]
+		self.cache_record(record, aliases, redis_conn or redis_pool.get_redis())
+		db_handler = self.get_db_handler()
+		if db_handler is not None:
+			try:
+				db_handler.upsert_alias_documents([{'alias': alias, 'key': key, 'record': record} for alias in aliases])
+			except Exception as e:
+				logging.warning("Unable to store chem aliases in db: {}".format(e))
+		return record
+
+	def cache_record(self, record, aliases, redis_conn):
+		value = json_codec.dumps(record)
+		mapping = {self.make_record_key(record['key']): value}
+		for alias in aliases:
+			alias_key = self.make_alias_key(alias)
+			mapping[alias_key] = record['key']
+			self.local.set(alias_key, value, self.ttl)
+		redis_pool.set_many(mapping, ex=self.ttl, redis_conn=redis_conn)
+
+
+
+identity_index = IdentityIndex()
+
+
+
+def get_key(chemical, redis_conn=None):
+	"""
+	Returns the canonical key for any known form of chemical
+	(or chemical itself), for keying result caches.
+	"""
+	return identity_index.get_key(chemical, redis_conn)
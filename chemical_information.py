@@ -1,11 +1,17 @@
 __author__ = "np"
 
-import requests
 import logging
 import json
-from .calculator_metabolizer import MetabolizerCalc
-from .actorws import ACTORWS
 from .smilesfilter import SMILESFilter
+from . import http_sessions
+from . import rate_limiter
+from . import chemical_identity
+from . import lazy_imports
+
+# only needed for chem info requests, not the SMILESFilter calculators import from here
+calculator_metabolizer = lazy_imports.module('.calculator_metabolizer', __package__)
+actorws = lazy_imports.module('.actorws', __package__)
+requests = lazy_imports.module('requests')
 
 
 
@@ -65,9 +71,9 @@ class ChemInfo(object):
 	chemical data.
 	"""
 	def __init__(self, chemical=""):
-		self.actorws_obj = ACTORWS()
+		self.actorws_obj = actorws.ACTORWS()
 		self.smiles_filter_obj = SMILESFilter()
-		self.calc_obj = MetabolizerCalc()  # note: inherits Calculator class as well
+		self.calc_obj = calculator_metabolizer.MetabolizerCalc()  # note: inherits Calculator class as well
 		self.cas_url = "https://cactus.nci.nih.gov/chemical/structure/{}/cas"  # associated CAS
 		self.carbon_anomolies = {
 			"C": "methane",
@@ -186,6 +192,15 @@ class ChemInfo(object):
 		orig_smiles = None  # initial SMILES pre CTS filter
 		is_name = False  # bool for whether smiles was actually acronym
 
+		# Uses cached chem info if the chemical's been looked up before (in any form):
+		identity = None if only_dsstox else chemical_identity.identity_index.resolve(chemical, self.calc_obj.redis_conn)
+		if identity and identity.get('cheminfo'):
+			if not identity.get('has_carbon', True) and not is_node:
+				return {'status': False, 'request_post': request_post, 'error': "CTS only accepts organic chemicals"}
+			logging.info("Using cached chem info for {} ({})".format(chemical, identity['key']))
+			molecule_obj = dict(identity['cheminfo'], chemical=chemical)
+			return self.wrap_cheminfo(molecule_obj, identity.get('has_carbon', True), request_post)
+
 		# Determines chemical type from user (e.g., smiles, cas, name, etc.):
 		chem_type = self.calc_obj.get_chemical_type(chemical)
 
@@ -268,14 +283,6 @@ class ChemInfo(object):
 
 		molecule_obj['cas'] = cas_list
 
-
-		has_carbon = self.smiles_filter_obj.check_for_carbon(filtered_smiles)
-		if not has_carbon and is_node:
-			molecule_obj['has_carbon'] = False
-		else:
-			molecule_obj['has_carbon'] = True
-
-
 		# Sets 'smiles' (main chemical key for pchem requests, etc.) to CTS standardized smiles:
 		molecule_obj['smiles'] = filtered_smiles
 
@@ -289,6 +296,44 @@ class ChemInfo(object):
 			if key not in molecule_obj:
 				molecule_obj.update({key: "N/A"})  # fill in any missed data from actorws with "N/A"
 
+		has_carbon = self.smiles_filter_obj.check_for_carbon(filtered_smiles)
+
+		self.register_identity(molecule_obj, has_carbon, [request_post.get('chemical'), chemical])
+
+		return self.wrap_cheminfo(molecule_obj, has_carbon, request_post)
+
+	def register_identity(self, molecule_obj, has_carbon, aliases):
+		"""
+		Registers the chemical's forms as aliases of its canonical identity
+		(see chemical_identity), with its chem info for later lookups.
+		"""
+		record = {
+			'dtxsid': molecule_obj.get('dsstoxSubstanceId'),
+			'smiles': molecule_obj.get('smiles'),
+			'orig_smiles': molecule_obj.get('orig_smiles'),
+			'casrn': molecule_obj.get('casrn'),
+			'preferredName': molecule_obj.get('preferredName'),
+			'has_carbon': has_carbon,
+			'cheminfo': {key: val for key, val in molecule_obj.items() if key not in ['chemical', 'has_carbon']}
+		}
+		try:
+			chemical_identity.identity_index.register(record, aliases, self.calc_obj.redis_conn)
+		except Exception as e:
+			logging.warning("Unable to register chemical identity: {}".format(e))
+
+	def wrap_cheminfo(self, molecule_obj, has_carbon, request_post):
+		"""
+		Adds carbon check and tree node images to molecule_obj,
+		and wraps it for the frontend.
+		"""
+		is_node = request_post.get('is_node')  # bool for tree node or not
+		filtered_smiles = molecule_obj['smiles']
+
+		if not has_carbon and is_node:
+			molecule_obj['has_carbon'] = False
+		else:
+			molecule_obj['has_carbon'] = True
+
 		# Adds popup image with cheminfo table if it's a gentrans product (i.e., node):
 		# if is_node or db_handler.is_connected:
 		if is_node:
@@ -370,7 +415,8 @@ class ChemInfo(object):
 		"""
 		try:
 			url = self.cas_url.format(requests.utils.quote(smiles))  # encoding smiles for url
-			response = requests.get(url, verify=False)
+			rate_limiter.acquire(url)
+			response = http_sessions.get(url, verify=False)
 			if response.status_code != 200:
 				return "N/A"
 			if '<html>' in response.content.decode('utf-8'):
@@ -0,0 +1,197 @@
+"""
+Per-backend circuit breakers for CTS calculator requests.
+
+Breaker state lives in redis so every celery worker sees the same
+state: once a backend (e.g., CTS_SPARC_SERVER) fails enough times,
+all workers fail fast instead of each waiting out its own timeouts
+and retries. After reset_timeout seconds one trial request is let
+through (half-open), and a success closes the circuit again.
+
+A closed state read from redis is trusted for CTS_CIRCUIT_STATE_TTL
+seconds (per process), so requests to a healthy backend don't make a
+redis round trip each, and the state's keys are read in one pipeline.
+Timeouts the caller's deadline shortened (see deadline) aren't the
+backend's failures and aren't counted.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from . import deadline
+from . import lazy_imports
+
+requests = lazy_imports.module('requests')
+request_errors = lazy_imports.module('.request_errors', __package__)
+
+
+
+class CircuitBreaker(object):
+	"""
+	Redis-backed circuit breaker for a backend (keyed by its host url).
+
+	States:
+	  + closed - requests go through, failures are counted.
+	  + open - requests fail fast with CircuitOpenError.
+	  + half_open - reset timeout passed, one trial request goes through.
+	"""
+	CLOSED = 'closed'
+	OPEN = 'open'
+	HALF_OPEN = 'half_open'
+
+	def __init__(self, backend, redis_conn, failure_threshold=None, failure_window=None, reset_timeout=None, state_ttl=None):
+		self.backend = backend
+		self.redis_conn = redis_conn
+		self.state_ttl = state_ttl if state_ttl is not None else float(os.environ.get('CTS_CIRCUIT_STATE_TTL', 1))  # seconds a closed state is trusted
+		self.failure_threshold = failure_threshold or int(os.environ.get('CTS_CIRCUIT_FAILURE_THRESHOLD', 5))  # failures before opening
+		self.failure_window = failure_window or int(os.environ.get('CTS_CIRCUIT_FAILURE_WINDOW', 60))  # seconds failures are counted over
+		self.reset_timeout = reset_timeout or int(os.environ.get('CTS_CIRCUIT_RESET_TIMEOUT', 30))  # seconds to stay open
+		self.key_prefix = "cts_circuit:{}".format(backend)
+		self.failures_key = self.key_prefix + ":failures"  # failure count in current window
+		self.open_key = self.key_prefix + ":open"  # exists while open, expires after reset_timeout
+		self.tripped_key = self.key_prefix + ":tripped"  # exists from opening until a trial request succeeds
+		self.probe_key = self.key_prefix + ":probe"  # lock for the half-open trial request
+
+	def is_closed_locally(self):
+		"""
+		True if this process read a closed state less than state_ttl seconds ago.
+		"""
+		return time.time() - _closed_at.get(self.backend, 0) < self.state_ttl
+
+	def get_state(self):
+		"""
+		Returns the breaker's state (closed, open, or half_open).
+		"""
+		if self.is_closed_locally():
+			return self.CLOSED
+		try:
+			pipe = self.redis_conn.pipeline(transaction=False)
+			pipe.exists(self.open_key)
+			pipe.exists(self.tripped_key)
+			is_open, is_tripped = pipe.execute()
+		except Exception as e:
+			logging.warning("Unable to get circuit state for {} from redis: {}".format(self.backend, e))
+			return self.CLOSED
+		if is_open:
+			return self.OPEN
+		if is_tripped:
+			return self.HALF_OPEN
+		_closed_at[self.backend] = time.time()
+		return self.CLOSED
+
+	def before_request(self):
+		"""
+		Raises CircuitOpenError if the request shouldn't be made.
+		In the half-open state only the worker that gets the probe
+		lock makes a trial request.
+		"""
+		state = self.get_state()
+		if state == self.CLOSED:
+			return
+		if state == self.HALF_OPEN:
+			try:
+				if self.redis_conn.set(self.probe_key, 1, nx=True, ex=self.reset_timeout):
+					logging.info("Circuit half-open for {}, sending trial request..".format(self.backend))
+					return
+			except Exception as e:
+				logging.warning("Unable to get circuit probe lock for {}: {}".format(self.backend, e))
+				return
+		raise request_errors.CircuitOpenError("Circuit open for {}, not sending request.".format(self.backend))
+
+	def record_success(self):
+		"""
+		Closes the circuit if it was tripped and clears failures.
+		"""
+		if self.is_closed_locally():
+			return  # wasn't tripped a moment ago
+		try:
+			if self.redis_conn.exists(self.tripped_key):
+				logging.info("Circuit closed for {}.".format(self.backend))
+				self.redis_conn.delete(self.tripped_key, self.probe_key, self.failures_key)
+		except Exception as e:
+			logging.warning("Unable to record circuit success for {}: {}".format(self.backend, e))
+
+	def record_failure(self):
+		"""
+		Counts a failure, and opens the circuit if the threshold is
+		reached or if a half-open trial request failed.
+		"""
+		_closed_at.pop(self.backend, None)  # checks redis again until it's known closed
+		try:
+			pipe = self.redis_conn.pipeline()
+			pipe.exists(self.tripped_key)
+			pipe.incr(self.failures_key)
+			pipe.expire(self.failures_key, self.failure_window)
+			is_tripped, failures = pipe.execute()[:2]
+			if is_tripped:
+				self.trip()  # trial request failed, stays open
+			elif int(failures) >= self.failure_threshold:
+				self.trip()
+		except Exception as e:
+			logging.warning("Unable to record circuit failure for {}: {}".format(self.backend, e))
+
+	def trip(self):
+		"""
+		Opens the circuit for reset_timeout seconds.
+		"""
+		logging.warning("Opening circuit for {} for {}s.".format(self.backend, self.reset_timeout))
+		pipe = self.redis_conn.pipeline()
+		pipe.set(self.open_key, 1, ex=self.reset_timeout)
+		pipe.set(self.tripped_key, 1)
+		pipe.delete(self.probe_key, self.failures_key)
+		pipe.execute()
+
+	def record_response(self, response):
+		"""
+		Records a response's outcome, 5xx responses count as failures.
+		"""
+		status = getattr(response, 'status_code', None)
+		if isinstance(status, int) and status >= 500:
+			self.record_failure()
+		else:
+			self.record_success()
+
+	def is_failure(self, exception, truncated):
+		"""
+		False for timeouts of requests whose timeout the deadline shortened.
+		"""
+		return not (truncated and isinstance(exception, requests.exceptions.Timeout))
+
+	def call(self, send, timeout=None):
+		"""
+		Makes the request with send() if the circuit allows it, and
+		records the outcome. Connection errors, timeouts and 5xx
+		responses count as failures. timeout is the request's own
+		timeout, to tell when the deadline shortened it.
+		"""
+		self.before_request()
+		truncated = deadline.truncates(timeout)
+		try:
+			response = send()
+		except requests.exceptions.RequestException as e:
+			if self.is_failure(e, truncated):
+				self.record_failure()
+			raise
+		self.record_response(response)
+		return response
+
+	async def call_async(self, send, timeout=None):
+		"""
+		Async version of call(), where send is a coroutine function.
+		The redis calls run in the loop's thread pool so they don't block it.
+		"""
+		loop = asyncio.get_running_loop()
+		await loop.run_in_executor(None, self.before_request)
+		truncated = deadline.truncates(timeout)
+		try:
+			response = await send()
+		except requests.exceptions.RequestException as e:
+			if self.is_failure(e, truncated):
+				await loop.run_in_executor(None, self.record_failure)
+			raise
+		await loop.run_in_executor(None, self.record_response, response)
+		return response
+
+
+
+_closed_at = {}  # backend: when this process last read a closed state
@@ -0,0 +1,222 @@
+"""
+Adaptive per-backend concurrency limits for CTS calculator requests.
+
+Each backend (keyed by host url, like http_sessions) gets an AIMD
+limit on in-flight requests: the limit grows by about one for every
+limit's worth of healthy responses, and is cut by backoff_ratio when a
+request fails or its latency goes over latency_tolerance times its
+endpoint's baseline (lowest recent) latency. Baselines are per endpoint
+since one backend can serve quick and slow endpoints (e.g., CTSWS's
+standardizer and metabolizer). Timeouts the caller's deadline shortened
+(see deadline) don't count against the backend. Requests over the limit
+wait up to acquire_timeout seconds for a slot. Batch requests (see
+dispatcher) can't use the interactive_reserve share of the limit.
+
+Limits are per worker process, use get_limits() to see them. The
+interactive reserve only matters where a process has requests in flight
+at once (threaded or async workers, see dispatcher).
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import collections
+from . import deadline
+from . import dispatcher
+from . import lazy_imports
+
+requests = lazy_imports.module('requests')
+request_errors = lazy_imports.module('.request_errors', __package__)
+
+
+
+class AdaptiveLimiter(object):
+	"""
+	AIMD concurrency limiter for a backend.
+	Inputs:
+	  + initial_limit, min_limit, max_limit - in-flight request limits.
+	  + backoff_ratio - limit multiplier on failures or high latency.
+	  + latency_tolerance - latency over baseline * tolerance counts as overloaded.
+	  + acquire_timeout - seconds to wait for a slot.
+	  + interactive_reserve - share of the limit batch requests can't use.
+	"""
+	def __init__(self, backend, initial_limit=None, min_limit=None, max_limit=None, backoff_ratio=None, latency_tolerance=None, acquire_timeout=None, interactive_reserve=None):
+		self.backend = backend
+		self.min_limit = min_limit or int(os.environ.get('CTS_CONCURRENCY_MIN_LIMIT', 1))
+		self.max_limit = max_limit or int(os.environ.get('CTS_CONCURRENCY_MAX_LIMIT', 100))
+		self.limit = float(initial_limit or int(os.environ.get('CTS_CONCURRENCY_INITIAL_LIMIT', 10)))
+		self.backoff_ratio = backoff_ratio or float(os.environ.get('CTS_CONCURRENCY_BACKOFF_RATIO', 0.75))
+		self.latency_tolerance = latency_tolerance or float(os.environ.get('CTS_CONCURRENCY_LATENCY_TOLERANCE', 3.0))
+		self.acquire_timeout = acquire_timeout if acquire_timeout is not None else float(os.environ.get('CTS_CONCURRENCY_ACQUIRE_TIMEOUT', 30))
+		self.interactive_reserve = interactive_reserve if interactive_reserve is not None else float(os.environ.get('CTS_CONCURRENCY_INTERACTIVE_RESERVE', 0.2))
+		self.in_flight = 0
+		self.latencies = {}  # endpoint: recent healthy latencies, for its baseline
+		self.last_decrease = 0.0
+		self.condition = threading.Condition()
+
+	def get_baseline(self, endpoint=None):
+		latencies = self.latencies.get(endpoint)
+		if not latencies:
+			return None
+		return min(latencies)
+
+	def get_limit(self):
+		"""
+		Returns the limit for the current request's priority.
+		"""
+		limit = int(self.limit)
+		if dispatcher.current_priority() == dispatcher.BATCH:
+			limit -= int(limit * self.interactive_reserve)
+		return limit
+
+	def try_acquire(self):
+		with self.condition:
+			if self.in_flight < self.get_limit():
+				self.in_flight += 1
+				return True
+			return False
+
+	def acquire(self):
+		"""
+		Waits for a slot, raises ConcurrencyLimitError on timeout.
+		"""
+		wait_until = time.time() + deadline.get_timeout(self.acquire_timeout)
+		with self.condition:
+			while self.in_flight >= self.get_limit():
+				remaining = wait_until - time.time()
+				if remaining <= 0:
+					raise request_errors.ConcurrencyLimitError("Concurrency limit ({}) reached for {}.".format(self.get_limit(), self.backend))
+				self.condition.wait(remaining)
+			self.in_flight += 1
+
+	async def acquire_async(self):
+		"""
+		Async version of acquire(), polls for a slot without blocking the loop.
+		"""
+		wait_until = time.time() + deadline.get_timeout(self.acquire_timeout)
+		while not self.try_acquire():
+			if time.time() >= wait_until:
+				raise request_errors.ConcurrencyLimitError("Concurrency limit ({}) reached for {}.".format(self.get_limit(), self.backend))
+			await asyncio.sleep(0.01)
+
+	def release(self, latency=None, failed=False, endpoint=None):
+		"""
+		Frees a slot and adjusts the limit. latency is None for requests
+		that shouldn't affect the limit (e.g., open circuit), and is
+		compared to endpoint's baseline.
+		"""
+		with self.condition:
+			self.in_flight -= 1
+			if latency is not None:
+				baseline = self.get_baseline(endpoint)
+				overloaded = baseline is not None and latency > baseline * self.latency_tolerance
+				if failed or overloaded:
+					self.decrease(failed, baseline)
+				else:
+					self.latencies.setdefault(endpoint, collections.deque(maxlen=100)).append(latency)
+					self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+			self.condition.notify_all()
+
+	def decrease(self, failed, baseline=None):
+		"""
+		Multiplicative decrease, at most once per baseline latency so a
+		burst of slow responses from the same moment only counts once.
+		"""
+		now = time.time()
+		if now - self.last_decrease < (baseline or 0):
+			return
+		self.last_decrease = now
+		old_limit = int(self.limit)
+		self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+		if int(self.limit) != old_limit:
+			logging.warning("Concurrency limit for {} lowered {} -> {} ({}).".format(self.backend, old_limit, int(self.limit), "failure" if failed else "latency"))
+
+	def is_failure(self, response):
+		status = getattr(response, 'status_code', None)
+		return isinstance(status, int) and status >= 500
+
+	def call(self, send, endpoint=None, timeout=None):
+		"""
+		Makes the request with send() once a slot is free.
+		Inputs:
+		  + endpoint - request url (or other key) whose baseline latency it's compared to.
+		  + timeout - the request's own timeout, to tell when the deadline shortened it.
+		"""
+		self.acquire()
+		truncated = deadline.truncates(timeout)
+		start_time = time.time()
+		try:
+			response = send()
+		except request_errors.CircuitOpenError:
+			self.release()
+			raise
+		except requests.exceptions.Timeout:
+			self.release(None if truncated else time.time() - start_time, failed=True, endpoint=endpoint)
+			raise
+		except requests.exceptions.RequestException:
+			self.release(time.time() - start_time, failed=True, endpoint=endpoint)
+			raise
+		except BaseException:
+			self.release()
+			raise
+		self.release(time.time() - start_time, self.is_failure(response), endpoint)
+		return response
+
+	async def call_async(self, send, endpoint=None, timeout=None):
+		"""
+		Async version of call(), where send is a coroutine function.
+		"""
+		await self.acquire_async()
+		truncated = deadline.truncates(timeout)
+		start_time = time.time()
+		try:
+			response = await send()
+		except request_errors.CircuitOpenError:
+			self.release()
+			raise
+		except requests.exceptions.Timeout:
+			self.release(None if truncated else time.time() - start_time, failed=True, endpoint=endpoint)
+			raise
+		except requests.exceptions.RequestException:
+			self.release(time.time() - start_time, failed=True, endpoint=endpoint)
+			raise
+		except BaseException:
+			self.release()
+			raise
+		self.release(time.time() - start_time, self.is_failure(response), endpoint)
+		return response
+
+	def get_state(self):
+		return {
+			'limit': int(self.limit),
+			'in_flight': self.in_flight,
+			'baseline_latency': {endpoint: min(latencies) for endpoint, latencies in list(self.latencies.items()) if latencies}
+		}
+
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(backend):
+	"""
+	Returns the shared limiter for a backend key (e.g., host url).
+	"""
+	limiter = _limiters.get(backend)
+	if limiter:
+		return limiter
+	with _limiters_lock:
+		if not backend in _limiters:
+			_limiters[backend] = AdaptiveLimiter(backend)
+		return _limiters[backend]
+
+
+def get_limits():
+	"""
+	Returns current limit, in-flight requests and baseline
+	latency per endpoint for each backend, e.g., for monitoring.
+	"""
+	return {backend: limiter.get_state() for backend, limiter in list(_limiters.items())}
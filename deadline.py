@@ -0,0 +1,149 @@
+"""
+Request-level deadlines for CTS calculator requests.
+
+A p-chem request can fan out into SMILES filtering, melting point
+requests to other calculators (each with their own filtering) and
+more than one calculator run, so per-call timeouts alone don't bound
+how long it takes. The outermost data_request_handler starts a
+Deadline (CTS_REQUEST_DEADLINE seconds), which is carried to the
+nested calls in a context variable. HTTP calls use the remaining
+budget as their timeout, and nothing new is started once it's spent.
+"""
+
+import os
+import time
+import asyncio
+import functools
+import contextlib
+import contextvars
+from . import lazy_imports
+
+request_errors = lazy_imports.module('.request_errors', __package__)  # imports requests
+
+
+
+class Deadline(object):
+	"""
+	Time budget (seconds) for a request and all its nested calls.
+	"""
+	def __init__(self, seconds):
+		self.seconds = seconds
+		self.expires_at = time.time() + seconds
+
+	def remaining(self):
+		return max(0.0, self.expires_at - time.time())
+
+	def expired(self):
+		return self.remaining() <= 0
+
+	def check(self):
+		"""
+		Raises DeadlineExceeded if the budget's spent.
+		"""
+		if self.expired():
+			raise request_errors.DeadlineExceeded("Request deadline of {}s exceeded.".format(self.seconds))
+
+	def get_timeout(self, timeout=None):
+		"""
+		Returns timeout capped at the remaining budget. Also
+		works for (connect, read) timeout tuples.
+		"""
+		remaining = self.remaining()
+		if timeout is None:
+			return remaining
+		if isinstance(timeout, tuple):
+			return tuple(min(t, remaining) if t is not None else remaining for t in timeout)
+		return min(timeout, remaining)
+
+
+
+_current = contextvars.ContextVar('cts_deadline', default=None)
+
+
+def get_default_seconds():
+	seconds = os.environ.get('CTS_REQUEST_DEADLINE')
+	return float(seconds) if seconds else None
+
+
+def current():
+	"""
+	Returns the current request's Deadline, or None.
+	"""
+	return _current.get()
+
+
+def get_timeout(timeout=None):
+	"""
+	Returns timeout capped at the current deadline's remaining budget.
+	"""
+	deadline = current()
+	if deadline is None:
+		return timeout
+	return deadline.get_timeout(timeout)
+
+
+def truncates(timeout):
+	"""
+	True if the current deadline shortens timeout, so a request timing
+	out is the caller running out of time, not the backend being slow.
+	"""
+	return current() is not None and get_timeout(timeout) != timeout
+
+
+def check():
+	"""
+	Raises DeadlineExceeded if the current deadline has passed.
+	"""
+	deadline = current()
+	if deadline is not None:
+		deadline.check()
+
+
+def expired():
+	deadline = current()
+	return deadline is not None and deadline.expired()
+
+
+@contextlib.contextmanager
+def scope(seconds=None):
+	"""
+	Starts a deadline for the calls made inside the block, unless one's
+	already running (nested calls share the outer request's deadline).
+	"""
+	seconds = seconds if seconds is not None else get_default_seconds()
+	if current() is not None or not seconds:
+		yield current()
+		return
+	token = _current.set(Deadline(seconds))
+	try:
+		yield current()
+	finally:
+		_current.reset(token)
+
+
+def bound(func):
+	"""
+	Decorator for data request handlers (sync or async),
+	runs them within a deadline scope.
+	"""
+	if asyncio.iscoroutinefunction(func):
+		@functools.wraps(func)
+		async def async_wrapper(*args, **kwargs):
+			with scope():
+				return await func(*args, **kwargs)
+		return async_wrapper
+
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		with scope():
+			return func(*args, **kwargs)
+	return wrapper
+
+
+def wrap(func):
+	"""
+	Returns func bound to a copy of the current context, so a thread
+	pool runs it under the caller's deadline.
+	"""
+	context = contextvars.copy_context()
+	return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
@@ -0,0 +1,241 @@
+"""
+Priority-aware dispatch for calculator data requests.
+
+Interactive p-chem requests (a user waiting on a single chemical) and
+batch/gentrans product workloads used to go through data_request_handler
+on equal terms, so one large batch could hold every request slot of a
+process that handles many at once. Handlers are now dispatched with a
+priority class:
+  + interactive - can use any of the process's slots.
+  + batch - run_type "batch" (CTS_DISPATCH_BATCH_RUN_TYPES), gentrans
+    product nodes, or an explicit request_dict['priority'] of "batch".
+    Can't use the slots reserved for interactive requests, and waits
+    behind any interactive request. Waiting batch requests are served
+    round-robin by sessionid, so a 5,000 chemical batch gets its turn
+    alongside everyone else's instead of ahead of them.
+
+The priority is also kept for the request's backend calls, where the
+concurrency limiter holds back a share of each backend's slots for
+interactive requests (see concurrency_limiter).
+
+Slots, priorities and session queues are per worker process (threading
+structures, like the backend concurrency limits), so they only order
+requests that share a process: threaded or async workers (e.g., celery's
+threads/gevent pools, or data_request_handler_async on one event loop).
+A prefork worker process runs one task at a time, so its requests never
+wait here, and priority across processes is up to how tasks are queued.
+"""
+
+import os
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+import collections
+from . import deadline
+from . import lazy_imports
+
+request_errors = lazy_imports.module('.request_errors', __package__)  # imports requests
+
+
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+_priority = contextvars.ContextVar('cts_dispatch_priority', default=None)
+
+
+
+def get_priority(request_dict):
+	"""
+	Returns the priority class (interactive or batch) for a request.
+	"""
+	request_dict = request_dict if isinstance(request_dict, dict) else {}
+	priority = request_dict.get('priority')
+	if priority in (INTERACTIVE, BATCH):
+		return priority
+	batch_run_types = os.environ.get('CTS_DISPATCH_BATCH_RUN_TYPES', 'batch').split(',')
+	if request_dict.get('run_type') in batch_run_types:
+		return BATCH
+	if request_dict.get('workflow') == 'gentrans' and request_dict.get('node'):
+		return BATCH  # p-chem for a transformation product
+	return INTERACTIVE
+
+
+def current_priority():
+	"""
+	Returns the priority of the request being handled, or None.
+	"""
+	return _priority.get()
+
+
+
+class Dispatcher(object):
+	"""
+	Slots for data requests, max_concurrent in all, with
+	reserved_interactive of them kept for interactive requests.
+	"""
+	def __init__(self, max_concurrent=None, reserved_interactive=None, acquire_timeout=None):
+		self.max_concurrent = max_concurrent or int(os.environ.get('CTS_DISPATCH_MAX_CONCURRENT', 20))
+		self.reserved_interactive = reserved_interactive if reserved_interactive is not None else int(os.environ.get('CTS_DISPATCH_INTERACTIVE_RESERVED', 4))
+		self.reserved_interactive = min(self.reserved_interactive, self.max_concurrent - 1)  # batch always gets a slot
+		self.acquire_timeout = acquire_timeout if acquire_timeout is not None else float(os.environ.get('CTS_DISPATCH_ACQUIRE_TIMEOUT', 600))
+		self.running = {INTERACTIVE: 0, BATCH: 0}
+		self.interactive_waiting = 0
+		self.batch_queues = collections.OrderedDict()  # sessionid -> deque of waiting tickets, in round-robin order
+		self.condition = threading.Condition()
+
+	def get_running(self):
+		return self.running[INTERACTIVE] + self.running[BATCH]
+
+	def try_start(self, priority, ticket=None):
+		"""
+		Takes a slot if priority (and, for batch, ticket) is next. Call with condition held.
+		"""
+		if self.get_running() >= self.max_concurrent:
+			return False
+		if priority == BATCH:
+			if self.interactive_waiting or self.running[BATCH] >= self.max_concurrent - self.reserved_interactive:
+				return False
+			sessionid, queue = next(iter(self.batch_queues.items()))
+			if queue[0] is not ticket:
+				return False
+			queue.popleft()
+			del self.batch_queues[sessionid]
+			if queue:
+				self.batch_queues[sessionid] = queue  # back of the line for this session's next request
+		self.running[priority] += 1
+		return True
+
+	def enqueue(self, priority, sessionid):
+		"""
+		Registers a waiting request, returns its ticket. Call with condition held.
+		"""
+		if priority == INTERACTIVE:
+			self.interactive_waiting += 1
+			return None
+		ticket = object()
+		self.batch_queues.setdefault(sessionid, collections.deque()).append(ticket)
+		return ticket
+
+	def dequeue(self, priority, sessionid, ticket):
+		"""
+		Removes a request that's no longer waiting. Call with condition held.
+		"""
+		if priority == INTERACTIVE:
+			self.interactive_waiting -= 1
+			return
+		queue = self.batch_queues.get(sessionid)
+		if queue and ticket in queue:
+			queue.remove(ticket)
+			if not queue:
+				del self.batch_queues[sessionid]
+
+	def get_timeout_error(self, priority, sessionid):
+		return request_errors.DispatchTimeout("No {} dispatch slot for session {} after {}s.".format(priority, sessionid, self.acquire_timeout))
+
+	def acquire(self, priority, sessionid=None):
+		"""
+		Waits for a slot, raises DispatchTimeout on timeout.
+		"""
+		wait_until = time.time() + deadline.get_timeout(self.acquire_timeout)
+		with self.condition:
+			ticket = self.enqueue(priority, sessionid)
+			try:
+				while not self.try_start(priority, ticket):
+					remaining = wait_until - time.time()
+					if remaining <= 0:
+						raise self.get_timeout_error(priority, sessionid)
+					self.condition.wait(remaining)
+			finally:
+				self.dequeue(priority, sessionid, ticket)
+				self.condition.notify_all()  # next in line may be able to start
+
+	async def acquire_async(self, priority, sessionid=None):
+		"""
+		Async version of acquire(), polls for a slot without blocking the loop.
+		"""
+		wait_until = time.time() + deadline.get_timeout(self.acquire_timeout)
+		with self.condition:
+			ticket = self.enqueue(priority, sessionid)
+		try:
+			while True:
+				with self.condition:
+					if self.try_start(priority, ticket):
+						return
+				if time.time() >= wait_until:
+					raise self.get_timeout_error(priority, sessionid)
+				await asyncio.sleep(0.01)
+		finally:
+			with self.condition:
+				self.dequeue(priority, sessionid, ticket)
+				self.condition.notify_all()
+
+	def release(self, priority):
+		with self.condition:
+			self.running[priority] -= 1
+			self.condition.notify_all()
+
+	def get_state(self):
+		with self.condition:
+			return {
+				'max_concurrent': self.max_concurrent,
+				'reserved_interactive': self.reserved_interactive,
+				'running': dict(self.running),
+				'interactive_waiting': self.interactive_waiting,
+				'batch_waiting': {sessionid: len(queue) for sessionid, queue in self.batch_queues.items()}
+			}
+
+
+
+dispatcher = Dispatcher()
+
+
+
+def dispatched(func):
+	"""
+	Decorator for data request handlers (sync or async), which waits
+	for a dispatch slot for the request's priority and sessionid. Nested
+	handler calls (e.g., melting point requests) run in the outer call's slot.
+	"""
+	def get_request(args, kwargs):
+		request_dict = kwargs.get('request_dict', args[1] if len(args) > 1 else None)
+		request_dict = request_dict if isinstance(request_dict, dict) else {}
+		return get_priority(request_dict), request_dict.get('sessionid')
+
+	if asyncio.iscoroutinefunction(func):
+		@functools.wraps(func)
+		async def async_wrapper(*args, **kwargs):
+			if _priority.get() is not None:
+				return await func(*args, **kwargs)
+			priority, sessionid = get_request(args, kwargs)
+			await dispatcher.acquire_async(priority, sessionid)
+			token = _priority.set(priority)
+			try:
+				return await func(*args, **kwargs)
+			finally:
+				_priority.reset(token)
+				dispatcher.release(priority)
+		return async_wrapper
+
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		if _priority.get() is not None:
+			return func(*args, **kwargs)
+		priority, sessionid = get_request(args, kwargs)
+		dispatcher.acquire(priority, sessionid)
+		token = _priority.set(priority)
+		try:
+			return func(*args, **kwargs)
+		finally:
+			_priority.reset(token)
+			dispatcher.release(priority)
+	return wrapper
+
+
+def get_state():
+	"""
+	Returns the dispatcher's slots and waiting requests, e.g., for monitoring.
+	"""
+	return dispatcher.get_state()
@@ -0,0 +1,184 @@
+"""
+Hedged requests for idempotent backend calls (e.g., jchem detail
+and calculate requests).
+
+Latency of each hedged endpoint is tracked, and when hedging is on
+(CTS_HEDGE_REQUESTS) a call that hasn't answered within the
+CTS_HEDGE_PERCENTILE latency of its recent calls gets one duplicate
+request, and whichever response comes back first is used. The losing
+request isn't cancelled, it's left to finish in the background.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import collections
+import concurrent.futures
+from . import deadline
+
+
+
+class LatencyTracker(object):
+	"""
+	Keeps the latest sample_size latencies (seconds) of an endpoint.
+	"""
+	def __init__(self, sample_size=None):
+		self.sample_size = sample_size or int(os.environ.get('CTS_HEDGE_SAMPLE_SIZE', 200))
+		self.latencies = collections.deque(maxlen=self.sample_size)
+		self.lock = threading.Lock()
+
+	def record(self, latency):
+		with self.lock:
+			self.latencies.append(latency)
+
+	def percentile(self, p):
+		"""
+		Returns the pth percentile latency, or None if there aren't any samples.
+		"""
+		with self.lock:
+			latencies = sorted(self.latencies)
+		if not latencies:
+			return None
+		index = min(len(latencies) - 1, int(round(p / 100.0 * (len(latencies) - 1))))
+		return latencies[index]
+
+	def __len__(self):
+		return len(self.latencies)
+
+
+
+class Hedger(object):
+	"""
+	Sends a hedge (duplicate) request when a call is slower than the
+	percentile latency of the endpoint's recent calls.
+	Inputs:
+	  + enabled - hedging on/off (latencies are tracked either way).
+	  + percentile - latency percentile to hedge after (e.g., 95).
+	  + min_samples - no hedging until an endpoint has this many latencies.
+	  + min_delay - lower limit (seconds) for the hedge delay.
+	"""
+	def __init__(self, enabled=None, percentile=None, min_samples=None, min_delay=None, max_workers=None):
+		if enabled is None:
+			enabled = os.environ.get('CTS_HEDGE_REQUESTS', 'false').lower() == 'true'
+		self.enabled = enabled
+		self.percentile = percentile or float(os.environ.get('CTS_HEDGE_PERCENTILE', 95))
+		self.min_samples = min_samples if min_samples is not None else int(os.environ.get('CTS_HEDGE_MIN_SAMPLES', 20))
+		self.min_delay = min_delay if min_delay is not None else float(os.environ.get('CTS_HEDGE_MIN_DELAY', 0.05))
+		self.max_workers = max_workers or int(os.environ.get('CTS_HEDGE_MAX_WORKERS', 20))
+		self.trackers = {}  # endpoint key -> LatencyTracker
+		self.lock = threading.Lock()
+		self.executor = None
+		self.pid = None
+
+	def get_tracker(self, key):
+		tracker = self.trackers.get(key)
+		if tracker:
+			return tracker
+		with self.lock:
+			if not key in self.trackers:
+				self.trackers[key] = LatencyTracker()
+			return self.trackers[key]
+
+	def get_executor(self):
+		"""
+		Thread pool for hedged calls, recreated in forked workers.
+		"""
+		if self.executor is None or self.pid != os.getpid():
+			with self.lock:
+				if self.executor is None or self.pid != os.getpid():
+					self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+					self.pid = os.getpid()
+		return self.executor
+
+	def get_hedge_delay(self, key):
+		"""
+		Returns seconds to wait before hedging, or None if the
+		call shouldn't be hedged.
+		"""
+		if not self.enabled:
+			return None
+		tracker = self.get_tracker(key)
+		if len(tracker) < self.min_samples:
+			return None
+		return max(self.min_delay, tracker.percentile(self.percentile))
+
+	def run(self, send, key):
+		"""
+		Calls send(), hedging it with a second send() if it's slow.
+		Returns the first successful result (raises the last exception
+		if both calls fail).
+		"""
+		tracker = self.get_tracker(key)
+		delay = self.get_hedge_delay(key)
+		start_time = time.time()
+
+		if delay is None:
+			result = send()
+			tracker.record(time.time() - start_time)
+			return result
+
+		executor = self.get_executor()
+		send = deadline.wrap(send)  # runs under caller's deadline in pool threads
+		pending = {executor.submit(send)}
+		done, pending = concurrent.futures.wait(pending, timeout=delay)
+
+		if not done:
+			logging.info("No response from {} after {:.3f}s, sending hedge request..".format(key, delay))
+			pending.add(executor.submit(send))
+
+		exception = None
+		while done or pending:
+			for future in done:
+				if future.exception() is None:
+					tracker.record(time.time() - start_time)
+					return future.result()
+				exception = future.exception()
+			if not pending:
+				break
+			done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+		raise exception
+
+	async def run_async(self, send, key):
+		"""
+		Async version of run(), where send is a coroutine function.
+		The losing request is cancelled.
+		"""
+		tracker = self.get_tracker(key)
+		delay = self.get_hedge_delay(key)
+		start_time = time.time()
+
+		if delay is None:
+			result = await send()
+			tracker.record(time.time() - start_time)
+			return result
+
+		pending = {asyncio.ensure_future(send())}
+		done, pending = await asyncio.wait(pending, timeout=delay)
+
+		if not done:
+			logging.info("No response from {} after {:.3f}s, sending hedge request..".format(key, delay))
+			pending.add(asyncio.ensure_future(send()))
+
+		exception = None
+		try:
+			while done or pending:
+				for task in done:
+					if task.exception() is None:
+						tracker.record(time.time() - start_time)
+						return task.result()
+					exception = task.exception()
+				if not pending:
+					break
+				done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+		finally:
+			for task in pending:
+				task.cancel()
+
+		raise exception
+
+
+
+hedger = Hedger()
@@ -0,0 +1,237 @@
+"""
+Shared HTTP session registry for CTS backend calls.
+
+Keeps one pooled, keep-alive requests.Session per backend host
+(jchem, CTSWS, EPI, OPERA, SPARC, etc.), so the many sequential
+calls a single CTS request makes to the same server reuse open
+connections instead of doing a new TCP/TLS handshake each time.
+
+Sessions ask for gzip/deflate responses, and POST bodies to backends
+listed in CTS_HTTP_COMPRESS_HOSTS are gzipped when they're large
+(e.g., OPERA SMILES lists). Wire vs. decoded byte counts per backend
+are kept in transfer_stats.
+"""
+
+import os
+import gzip
+import logging
+import threading
+from . import lazy_imports
+
+requests = lazy_imports.module('requests')  # imported when the first session's created
+
+
+
+class SessionRegistry(object):
+	"""
+	Registry of pooled requests.Session objects, one per backend host.
+	Pool sizes can be set with the CTS_HTTP_POOL_CONNECTIONS and
+	CTS_HTTP_POOL_MAXSIZE env vars.
+	Inputs:
+	  + accept_encoding - response encodings to ask for (CTS_HTTP_ACCEPT_ENCODING).
+	  + compress_hosts - backends that accept gzipped POST bodies (CTS_HTTP_COMPRESS_HOSTS, comma-separated urls).
+	  + compress_min_bytes - smallest POST body worth gzipping (CTS_HTTP_COMPRESS_MIN_BYTES).
+	"""
+	def __init__(self, pool_connections=None, pool_maxsize=None, pool_block=False, accept_encoding=None, compress_hosts=None, compress_min_bytes=None):
+		self.pool_connections = pool_connections or int(os.environ.get('CTS_HTTP_POOL_CONNECTIONS', 10))  # number of host pools per adapter
+		self.pool_maxsize = pool_maxsize or int(os.environ.get('CTS_HTTP_POOL_MAXSIZE', 20))  # max open connections kept per host
+		self.pool_block = pool_block  # wait for a free connection instead of opening an extra one
+		self.keep_alive_headers = {'Connection': 'keep-alive'}
+		self.accept_encoding = accept_encoding or os.environ.get('CTS_HTTP_ACCEPT_ENCODING', 'gzip, deflate')
+		if compress_hosts is None:
+			compress_hosts = [host for host in os.environ.get('CTS_HTTP_COMPRESS_HOSTS', '').split(',') if host.strip()]
+		self.compress_hosts = set(self.get_host_key(host) for host in compress_hosts)
+		self.compress_min_bytes = compress_min_bytes or int(os.environ.get('CTS_HTTP_COMPRESS_MIN_BYTES', 1024))
+		self.sessions = {}  # host key -> requests.Session
+		self.pid = os.getpid()  # sessions aren't shared across forked workers
+		self.lock = threading.Lock()
+
+	def get_host_key(self, url):
+		"""
+		Returns the scheme and host of a url (e.g., "http://jchem:8080"),
+		which is the key sessions are pooled by.
+		"""
+		url = url.strip()
+		if '://' in url:
+			scheme, rest = url.split('://', 1)
+		else:
+			scheme, rest = '', url
+		host = rest.split('/', 1)[0].split('?', 1)[0]
+		return "{}://{}".format(scheme.lower(), host.lower())
+
+	def create_session(self):
+		"""
+		Creates a keep-alive session with a sized connection pool.
+		Retries are left to the calculators, so the adapter doesn't retry.
+		"""
+		session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(
+			pool_connections=self.pool_connections,
+			pool_maxsize=self.pool_maxsize,
+			pool_block=self.pool_block,
+			max_retries=0
+		)
+		session.mount('http://', adapter)
+		session.mount('https://', adapter)
+		session.headers.update(self.keep_alive_headers)
+		session.headers['Accept-Encoding'] = self.accept_encoding
+		return session
+
+	def compress_body(self, url, data, headers=None):
+		"""
+		Gzips a str/bytes POST body if url's backend accepts compressed
+		requests and the body is at least compress_min_bytes.
+		Returns the (data, headers) to send.
+		"""
+		if self.get_host_key(url) not in self.compress_hosts or not isinstance(data, (str, bytes)):
+			return data, headers
+		if headers and 'Content-Encoding' in headers:
+			return data, headers  # already encoded by the caller
+		body = data.encode('utf-8') if isinstance(data, str) else data
+		if len(body) < self.compress_min_bytes:
+			return data, headers
+		headers = dict(headers or {})
+		headers['Content-Encoding'] = 'gzip'
+		return gzip.compress(body), headers
+
+	def get_session(self, url):
+		"""
+		Returns the pooled session for url's host, creating it if needed.
+		"""
+		if self.pid != os.getpid():
+			self.reset()  # forked worker, don't reuse the parent's sockets
+		key = self.get_host_key(url)
+		session = self.sessions.get(key)
+		if session:
+			return session
+		with self.lock:
+			session = self.sessions.get(key)
+			if not session:
+				logging.info("Creating pooled http session for {}".format(key))
+				session = self.create_session()
+				self.sessions[key] = session
+		return session
+
+	def reset(self):
+		"""
+		Drops all sessions (without closing sockets that may belong
+		to a parent process).
+		"""
+		with self.lock:
+			self.sessions = {}
+			self.pid = os.getpid()
+
+	def close(self):
+		"""
+		Closes all pooled sessions and their connections.
+		"""
+		with self.lock:
+			for key, session in self.sessions.items():
+				try:
+					session.close()
+				except Exception as e:
+					logging.warning("Exception closing http session for {}: {}".format(key, e))
+			self.sessions = {}
+
+
+
+class TransferStats(object):
+	"""
+	Request and response body byte counts per backend host, as sent/received
+	on the wire (compressed, if it was) and decoded, to see what
+	compression saves. Streamed response bodies aren't counted.
+	"""
+	def __init__(self):
+		self.counts = {}  # host key -> byte counts
+		self.lock = threading.Lock()
+
+	def record(self, key, direction, wire_bytes, decoded_bytes):
+		"""
+		Adds a body's byte counts, direction is 'request' or 'response'.
+		"""
+		with self.lock:
+			counts = self.counts.setdefault(key, {
+				'request_bytes': 0,
+				'request_wire_bytes': 0,
+				'response_bytes': 0,
+				'response_wire_bytes': 0
+			})
+			counts[direction + '_bytes'] += decoded_bytes
+			counts[direction + '_wire_bytes'] += wire_bytes
+
+	def record_response(self, key, response, wire_bytes=None):
+		"""
+		Adds a response's byte counts. Wire bytes come from the
+		connection if they aren't given.
+		"""
+		content = response.content
+		if not isinstance(content, bytes):
+			return
+		if wire_bytes is None:
+			try:
+				wire_bytes = int(response.raw.tell())  # bytes read from the socket, before decoding
+			except Exception:
+				wire_bytes = len(content)
+		self.record(key, 'response', wire_bytes, len(content))
+
+	def get(self, key=None):
+		"""
+		Returns byte counts for a backend, or all backends.
+		"""
+		with self.lock:
+			if key is not None:
+				return dict(self.counts.get(key, {}))
+			return {key: dict(counts) for key, counts in self.counts.items()}
+
+	def reset(self):
+		with self.lock:
+			self.counts = {}
+
+
+
+registry = SessionRegistry()
+transfer_stats = TransferStats()
+
+
+
+def get_session(url):
+	"""
+	Returns the shared pooled session for url's host.
+	"""
+	return registry.get_session(url)
+
+
+def body_size(data):
+	return len(data.encode('utf-8')) if isinstance(data, str) else len(data)
+
+
+def request(method, url, **kwargs):
+	"""
+	Makes an HTTP request through the shared session for url's host.
+	Takes the same keyword args as requests.request.
+	"""
+	key = registry.get_host_key(url)
+	data = kwargs.get('data')
+	if data is not None:
+		kwargs['data'], kwargs['headers'] = registry.compress_body(url, data, kwargs.get('headers'))
+		if isinstance(data, (str, bytes)):
+			transfer_stats.record(key, 'request', body_size(kwargs['data']), body_size(data))
+	response = get_session(url).request(method, url, **kwargs)
+	if not kwargs.get('stream'):
+		transfer_stats.record_response(key, response)
+	return response
+
+
+def get_transfer_stats():
+	"""
+	Returns wire vs. decoded byte counts per backend host.
+	"""
+	return transfer_stats.get()
+
+
+def get(url, params=None, **kwargs):
+	return request('GET', url, params=params, **kwargs)
+
+
+def post(url, data=None, json=None, **kwargs):
+	return request('POST', url, data=data, json=json, **kwargs)
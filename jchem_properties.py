@@ -1,8 +1,10 @@
-import requests
-import json
 import logging
 import os
 from .calculator import Calculator
+from .hedged_requests import hedger
+from .single_flight import single_flight, make_key
+from . import json_codec
+from .templates import Template
 
 
 class JchemProperty(Calculator):
@@ -11,6 +13,7 @@ class JchemProperty(Calculator):
     This module in particular handles Jchem's "Advanced Properties"
     requests (section 4.2.x in docs) using the /calculate endpoint.
     """
+    postData = Template({})  # POST data in json, defaults for each property
 
     def __init__(self):
 
@@ -24,7 +27,6 @@ class JchemProperty(Calculator):
         self.results = ''  # json result
         self.name = ''  # name of property
         self.url = ''  # url to jchem ws endpoint
-        self.postData = {}  # POST data in json
         self.ph = 7.0
 
 
@@ -37,7 +39,24 @@ class JchemProperty(Calculator):
         """
         prop_obj = self.getPropObject(request_dict.get('prop'))
         prop_obj.results = self.make_data_request(request_dict.get('chemical'), prop_obj, request_dict.get('method'))
+        return self.build_result_dict(request_dict, prop_obj)
 
+
+
+    async def getJchemPropData_async(self, request_dict):
+        """
+        Async version of getJchemPropData.
+        """
+        prop_obj = self.getPropObject(request_dict.get('prop'))
+        prop_obj.results = await self.make_data_request_async(request_dict.get('chemical'), prop_obj, request_dict.get('method'))
+        return self.build_result_dict(request_dict, prop_obj)
+
+
+
+    def build_result_dict(self, request_dict, prop_obj):
+        """
+        Wraps prop_obj's results in a CTS data object.
+        """
         prop_obj.results = prop_obj.get_data(request_dict)
 
         _result_dict = {
@@ -85,6 +104,41 @@ class JchemProperty(Calculator):
 
     def make_data_request(self, structure, prop_obj, method=None):
         url = self.baseUrl + prop_obj.url
+        post_data = self.get_request_post(structure, prop_obj, method)
+
+        try:
+            send = lambda: self.request_with_retries('POST', url, self.validate_response, data=json_codec.dumps(post_data), headers=self.headers, coalesce=False)
+            response = single_flight.do(make_key('POST', url, post_data), lambda: hedger.run(send, url))
+            prop_obj.results = json_codec.loads(response.content)
+            return prop_obj.results
+        except Exception as e:
+            logging.warning("Exception in jchem_calculator.py: {}".format(e))
+        return None
+
+
+
+    async def make_data_request_async(self, structure, prop_obj, method=None):
+        """
+        Async version of make_data_request.
+        """
+        url = self.baseUrl + prop_obj.url
+        post_data = self.get_request_post(structure, prop_obj, method)
+
+        try:
+            send = lambda: self.request_with_retries_async('POST', url, self.validate_response, data=json_codec.dumps(post_data), headers=self.headers, coalesce=False)
+            response = await single_flight.do_async(make_key('POST', url, post_data), lambda: hedger.run_async(send, url))
+            prop_obj.results = json_codec.loads(response.content)
+            return prop_obj.results
+        except Exception as e:
+            logging.warning("Exception in jchem_calculator.py: {}".format(e))
+        return None
+
+
+
+    def get_request_post(self, structure, prop_obj, method=None):
+        """
+        POST data for prop_obj's jchem /calculate request.
+        """
         prop_obj.postData.update({
             "result-display": {
                 "include": ["structureData", "image"],
@@ -101,23 +155,7 @@ class JchemProperty(Calculator):
         if method:
             post_data['parameters']['method'] = method
 
-        _valid_result = False  # for retry logic
-        _retries = 0
-        while not _valid_result and _retries < self.max_retries:
-            # retry data request to chemaxon server until max retries or a valid result is returned
-            try:
-                response = requests.post(url, data=json.dumps(post_data), headers=self.headers, timeout=self.request_timeout)
-                _valid_result = self.validate_response(response)
-                if _valid_result:
-                    prop_obj.results = json.loads(response.content)
-                    return json.loads(response.content)
-                _retries += 1
-            except Exception as e:
-                logging.warning("Exception in jchem_calculator.py: {}".format(e))
-                _retries += 1
-
-            logging.info("Max retries: {}, Retries left: {}".format(self.max_retries, _retries))
-        return None
+        return post_data
 
 
 
@@ -186,21 +224,22 @@ class JchemProperty(Calculator):
 
 
 class Pka(JchemProperty):
+    postData = Template({
+        "pHLower": 0.0,
+        "pHUpper": 14.0,
+        "pHStep": 0.1,
+        "temperature": 298.0,
+        "micro": False,
+        "considerTautomerization": True,
+        "pKaLowerLimit": 0.0,
+        "pKaUpperLimit": 14.0,
+        "prefix": "DYNAMIC"
+    })
+
     def __init__(self):
         JchemProperty.__init__(self)
         self.name = 'pKa'
         self.url = self.url_pattern.format('pKa')
-        self.postData = {
-            "pHLower": 0.0,
-            "pHUpper": 14.0,
-            "pHStep": 0.1,
-            "temperature": 298.0,
-            "micro": False,
-            "considerTautomerization": True,
-            "pKaLowerLimit": 0.0,
-            "pKaUpperLimit": 14.0,
-            "prefix": "DYNAMIC"
-        }
 
     def getMostAcidicPka(self):
         """
@@ -307,14 +346,15 @@ class Pka(JchemProperty):
 
 
 class IsoelectricPoint(JchemProperty):
+    postData = Template({
+        "pHStep": 0.1,
+        "doublePrecision": 2
+    })
+
     def __init__(self):
         JchemProperty.__init__(self)
         self.name = 'isoelectricPoint'
         self.url = self.url_pattern.format('isoelectricPoint')
-        self.postData = {
-            "pHStep": 0.1,
-            "doublePrecision": 2
-        }
 
     def getIsoelectricPoint(self):
         """
@@ -346,14 +386,15 @@ class IsoelectricPoint(JchemProperty):
 
 
 class MajorMicrospecies(JchemProperty):
+    postData = Template({
+        "pH": 7.0,
+        "takeMajorTautomericForm": True
+    })
+
     def __init__(self):
         JchemProperty.__init__(self)
         self.name = 'majorMicrospecies'
         self.url = self.url_pattern.format('majorMicrospecies')
-        self.postData = {
-            "pH": 7.0,
-            "takeMajorTautomericForm": True
-        }
 
     def getMajorMicrospecies(self, test=False):
         majorMsDict = {}
@@ -370,28 +411,29 @@ class MajorMicrospecies(JchemProperty):
 
 
 class Tautomerization(JchemProperty):
+    postData = Template({
+        "calculationType": "DOMINANT",
+        "maxStructureCount": 1000,
+        "considerPH": True,
+        "pH": 7.0,
+        "enableMaxPathLength": True,
+        "maxPathLength": 4,
+        "rationalTautomerGenerationMode": False,
+        "singleFragmentMode": True,
+        "protectAromaticity": True,
+        "protectCharge": True,
+        "excludeAntiAromaticCompounds": True,
+        "protectDoubleBondStereo": False,
+        "protectAllTetrahedralStereoCenters": False,
+        "protectLabeledTetrahedralStereoCenters": False,
+        "protectEsterGroups": True,
+        "ringChainTautomerizationAllowed": False
+    })
+
     def __init__(self):
         JchemProperty.__init__(self)
         self.name = 'tautomerization'
         self.url = self.url_pattern.format('tautomerization')
-        self.postData = {
-            "calculationType": "DOMINANT",
-            "maxStructureCount": 1000,
-            "considerPH": True,
-            "pH": 7.0,
-            "enableMaxPathLength": True,
-            "maxPathLength": 4,
-            "rationalTautomerGenerationMode": False,
-            "singleFragmentMode": True,
-            "protectAromaticity": True,
-            "protectCharge": True,
-            "excludeAntiAromaticCompounds": True,
-            "protectDoubleBondStereo": False,
-            "protectAllTetrahedralStereoCenters": False,
-            "protectLabeledTetrahedralStereoCenters": False,
-            "protectEsterGroups": True,
-            "ringChainTautomerizationAllowed": False
-        }
 
     def getTautomers(self, test=False):
         """
@@ -421,17 +463,18 @@ class Tautomerization(JchemProperty):
 
 
 class Stereoisomer(JchemProperty):
+    postData = Template({
+        "stereoisomerismType": "TETRAHEDRAL",
+        "maxStructureCount": 100,
+        "protectDoubleBondStereo": False,
+        "protectTetrahedralStereo": False,
+        "filterInvalid3DStructures": False
+    })
+
     def __init__(self):
         JchemProperty.__init__(self)
         self.name = 'stereoisomer'
         self.url = self.url_pattern.format('stereoisomer')
-        self.postData = {
-            "stereoisomerismType": "TETRAHEDRAL",
-            "maxStructureCount": 100,
-            "protectDoubleBondStereo": False,
-            "protectTetrahedralStereo": False,
-            "filterInvalid3DStructures": False
-        }
 
     def getStereoisomers(self, test=False):
         stereoList = []
@@ -450,16 +493,17 @@ class Stereoisomer(JchemProperty):
 
 
 class Solubility(JchemProperty):
+    postData = Template({
+        "pHLower": 0.0,
+        "pHUpper": 14.0,
+        "pHStep": 0.1,
+        "unit": "MGPERML"
+    })
+
     def __init__(self):
         JchemProperty.__init__(self)
         self.name = 'solubility'
         self.url = self.url_pattern.format('solubility')
-        self.postData = {
-            "pHLower": 0.0,
-            "pHUpper": 14.0,
-            "pHStep": 0.1,
-            "unit": "MGPERML"
-        }
 
     def getIntrinsicSolubility(self):
         """
@@ -515,19 +559,20 @@ class Solubility(JchemProperty):
 
 
 class LogP(JchemProperty):
+    postData = Template({
+        "wVG": 1.0,
+        "wKLOP": 1.0,
+        "wPHYS": 1.0,
+        "Cl": 0.1,
+        "NaK": 0.1,
+        "considerTautomerization": False
+    })
+
     def __init__(self):
         JchemProperty.__init__(self)
         self.name = 'logP'
         self.url = self.url_pattern.format('logP')
         self.methods = ['KLOP', 'VG', 'PHYS']
-        self.postData = {
-            "wVG": 1.0,
-            "wKLOP": 1.0,
-            "wPHYS": 1.0,
-            "Cl": 0.1,
-            "NaK": 0.1,
-            "considerTautomerization": False
-        }
 
     def getLogP(self):
         """
@@ -545,22 +590,23 @@ class LogP(JchemProperty):
 
 
 class LogD(JchemProperty):
+    postData = Template({
+        "pHLower": 0.0,
+        "pHUpper": 14.0,
+        "pHStep": 0.1,
+        "wVG": 1.0,
+        "wKLOP": 1.0,
+        "wPHYS": 1.0,
+        "Cl": 0.1,
+        "NaK": 0.1,
+        "considerTautomerization": False
+    })
+
     def __init__(self):
         JchemProperty.__init__(self)
         self.name = 'logD'
         self.url = self.url_pattern.format('logD')
         self.methods = ['KLOP', 'VG', 'PHYS']
-        self.postData = {
-            "pHLower": 0.0,
-            "pHUpper": 14.0,
-            "pHStep": 0.1,
-            "wVG": 1.0,
-            "wKLOP": 1.0,
-            "wPHYS": 1.0,
-            "Cl": 0.1,
-            "NaK": 0.1,
-            "considerTautomerization": False
-        }
 
     def getLogD(self, ph):
         """
@@ -584,16 +630,17 @@ class LogD(JchemProperty):
 
 
 class ElementalAnalysis(JchemProperty):
+    postData = Template({
+        "singleFragmentMode": True,
+        "symbolID": True
+    })
+
     def __init__(self):
         JchemProperty.__init__(self)
         self.name = 'elementalAnalysis'
         self.url = self.url_pattern.format('elementalAnalysis')
         self.methods = None
         self.result_key = 'composition'
-        self.postData = {
-            "singleFragmentMode": True,
-            "symbolID": True
-        }
 
     def get_elemental_analysis(self):
         """
@@ -0,0 +1,55 @@
+"""
+JSON encoding/decoding for all CTS request and response handling.
+
+Uses orjson (optional dependency) when it's installed, otherwise
+the stdlib json module. orjson is stricter than stdlib json (e.g., no
+NaN literals, which OPERA can return), so anything it can't handle
+falls back to stdlib json.
+"""
+
+import json
+from . import lazy_imports
+
+orjson = lazy_imports.optional('orjson')  # imported on first use
+
+
+
+def loads(data):
+	"""
+	Decodes a JSON str or bytes body.
+	"""
+	if orjson is not None:
+		try:
+			return orjson.loads(data)
+		except orjson.JSONDecodeError:
+			pass  # e.g., NaN, stdlib json handles it
+	if isinstance(data, (bytes, bytearray)):
+		data = data.decode('utf-8')
+	return json.loads(data)
+
+
+def dumps(obj, sort_keys=False, default=None):
+	"""
+	Encodes obj as a compact JSON str.
+	"""
+	if orjson is not None:
+		option = orjson.OPT_NON_STR_KEYS
+		if sort_keys:
+			option |= orjson.OPT_SORT_KEYS
+		try:
+			return orjson.dumps(obj, option=option, default=default).decode('utf-8')
+		except TypeError:
+			pass  # e.g., ints too large for orjson
+	return json.dumps(obj, sort_keys=sort_keys, separators=(',', ':'), default=default)
+
+
+def response_json(response):
+	"""
+	Decodes a response's JSON body once, later calls (e.g., validating
+	then parsing the same response) get the same decoded object.
+	"""
+	decoded = vars(response).get('_cts_json')
+	if decoded is None:
+		decoded = loads(response.content)
+		response._cts_json = decoded
+	return decoded
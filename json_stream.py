@@ -0,0 +1,154 @@
+"""
+Incremental parsing of large JSON responses.
+
+Metabolizer trees and OPERA batch results can be several MB of JSON.
+With CTS_JSON_STREAMING on and ijson (optional dependency) installed,
+those responses are requested with stream=True and parsed as the body
+arrives, so the whole body is never held in memory: OPERA results are
+parsed a chemical at a time, and metabolizer trees are built without the
+generations past the requested limit. Otherwise bodies are decoded whole
+with json_codec.
+"""
+
+import os
+import re
+from . import lazy_imports
+
+ijson = lazy_imports.optional('ijson')  # imported on first streamed response
+
+
+
+def is_enabled():
+	"""
+	Returns True if responses should be streamed.
+	"""
+	return ijson is not None and os.environ.get('CTS_JSON_STREAMING', 'false').lower() == 'true'
+
+
+
+class NonFiniteReader(object):
+	"""
+	File-like wrapper for a response body that quotes NaN/Infinity
+	literals (which OPERA returns, but ijson rejects) outside of strings,
+	so they're parsed as "NaN"/"Infinity" strings, which float() reads.
+	"""
+	pattern = re.compile(rb'(?P<string>"(?:[^"\\]|\\.)*")|(?P<open>"(?:[^"\\]|\\.)*\\?\Z)|(?P<literal>-?Infinity|NaN)', re.DOTALL)
+	partial = re.compile(rb'[-A-Za-z]+\Z')  # literal that may continue in the next chunk
+
+	def __init__(self, raw):
+		self.raw = raw
+		self.carry = b''
+
+	def quote(self, data, final):
+		"""
+		Returns data with literals quoted, and the tail (e.g., a string
+		or literal cut off mid-chunk) to hold until the next chunk.
+		"""
+		parts = []
+		pos = 0
+		for match in self.pattern.finditer(data):
+			parts.append(data[pos:match.start()])
+			if match.lastgroup == 'open' and not final:
+				return b''.join(parts), data[match.start():]
+			if match.lastgroup == 'literal':
+				parts.append(b'"' + match.group() + b'"')
+			else:
+				parts.append(match.group())
+			pos = match.end()
+		rest = data[pos:]
+		tail = None if final else self.partial.search(rest)
+		if tail:
+			parts.append(rest[:tail.start()])
+			return b''.join(parts), rest[tail.start():]
+		parts.append(rest)
+		return b''.join(parts), b''
+
+	def read(self, size=-1):
+		if size == 0:
+			return b''
+		while True:
+			chunk = self.raw.read(size) if size and size > 0 else self.raw.read()
+			final = not chunk
+			data, self.carry = self.quote(self.carry + chunk, final)
+			if data or final:
+				return data
+
+
+
+def get_body(response):
+	"""
+	Returns a streamed response's body as a file object,
+	decompressed if the backend compressed it.
+	"""
+	response.raw.decode_content = True
+	return NonFiniteReader(response.raw)
+
+
+def iter_items(response, prefix):
+	"""
+	Yields the objects at prefix (ijson prefix, e.g., 'data.item'
+	for each item of a 'data' list) as they're parsed.
+	"""
+	return ijson.items(get_body(response), prefix, use_float=True)
+
+
+def load_pruned(response, key, max_depth):
+	"""
+	Decodes a streamed response, leaving out anything nested more than
+	max_depth key objects deep (see build_pruned).
+	"""
+	return build_pruned(ijson.parse(get_body(response), use_float=True), key, max_depth)
+
+
+def build_pruned(events, key, max_depth):
+	"""
+	Builds a JSON document from ijson parse events. Containers nested
+	more than max_depth objects deep under key (e.g., 'metabolites'
+	past the generation limit) are left empty and their contents
+	are skipped as they're parsed.
+	"""
+	root = None
+	stack = []  # [container, current map key, depth]
+	skip = 0
+
+	for _prefix, event, value in events:
+		if skip:
+			if event in ('start_map', 'start_array'):
+				skip += 1
+			elif event in ('end_map', 'end_array'):
+				skip -= 1
+			continue
+
+		if event == 'map_key':
+			stack[-1][1] = value
+			continue
+		if event in ('end_map', 'end_array'):
+			stack.pop()
+			continue
+
+		depth = stack[-1][2] if stack else 0
+		if stack and isinstance(stack[-1][0], dict) and stack[-1][1] == key:
+			depth += 1
+
+		is_container = event in ('start_map', 'start_array')
+		if event == 'start_map':
+			node = {}
+		elif event == 'start_array':
+			node = []
+		else:
+			node = value
+
+		if not stack:
+			root = node
+		elif isinstance(stack[-1][0], dict):
+			stack[-1][0][stack[-1][1]] = node
+		else:
+			stack[-1][0].append(node)
+
+		if is_container:
+			if depth > max_depth:
+				skip = 1
+			else:
+				stack.append([node, None, depth])
+
+	return root
@@ -0,0 +1,116 @@
+"""
+Deferred imports for CTS's heavier dependencies.
+
+Celery workers and the app import the calculators at startup, which
+used to import redis, pymongo, bs4, pytz, aiohttp, etc. and the modules
+that are only needed for some requests (metabolizer, actorws) up front.
+Those are LazyModules now: the module's imported the first time one of
+its attributes is used, so cold starts only pay for what a worker uses.
+A LazyAttribute does the same for a module's singleton or function,
+e.g., calculator's request handling (single_flight, caches, limiters).
+"""
+
+import importlib
+import importlib.util
+
+
+
+class LazyModule(object):
+	"""
+	Stands in for a module until it's used. name can be relative
+	to package (e.g., LazyModule('.actorws', __package__)).
+	"""
+	def __init__(self, name, package=None):
+		self.__dict__['_name'] = name
+		self.__dict__['_package'] = package
+		self.__dict__['_module'] = None
+
+	def load(self):
+		"""
+		Imports the module (once) and returns it.
+		"""
+		module = self.__dict__['_module']
+		if module is None:
+			module = self.__dict__['_module'] = importlib.import_module(self._name, self._package)
+		return module
+
+	def __getattr__(self, attr):
+		return getattr(self.load(), attr)
+
+	def __setattr__(self, attr, value):
+		setattr(self.load(), attr, value)
+
+	def __delattr__(self, attr):
+		delattr(self.load(), attr)
+
+	def __repr__(self):
+		return "<lazy module '{}'>".format(self._name)
+
+
+
+class LazyAttribute(object):
+	"""
+	Stands in for a module's attribute until it's used, the module's
+	imported then. It's looked up on every use, so it follows the
+	module's attribute if that's replaced (e.g., patched in tests).
+	"""
+	def __init__(self, lazy_module, attr):
+		self.__dict__['_lazy_module'] = lazy_module
+		self.__dict__['_attr'] = attr
+
+	def _load(self):
+		"""
+		Imports the module (once) and returns the attribute. Underscored,
+		the attribute's own methods (e.g., a cache's get) are proxied.
+		"""
+		return getattr(self._lazy_module.load(), self._attr)
+
+	def __getattr__(self, attr):
+		return getattr(self._load(), attr)
+
+	def __setattr__(self, attr, value):
+		setattr(self._load(), attr, value)
+
+	def __call__(self, *args, **kwargs):
+		return self._load()(*args, **kwargs)
+
+	def __repr__(self):
+		return "<lazy attribute '{}.{}'>".format(self._lazy_module._name, self._attr)
+
+
+
+def module(name, package=None):
+	"""
+	Returns a LazyModule for name.
+	"""
+	return LazyModule(name, package)
+
+
+def attribute(name, attr, package=None):
+	"""
+	Returns a LazyAttribute for module name's attr (e.g., a singleton
+	like single_flight's, or a function).
+	"""
+	return LazyAttribute(LazyModule(name, package), attr)
+
+
+def optional(name):
+	"""
+	Lazy version of "try: import name / except ImportError: name = None"
+	for optional dependencies. Checks that name is installed without
+	importing it, returns a LazyModule or None.
+	"""
+	try:
+		spec = importlib.util.find_spec(name)
+	except (ImportError, ValueError):
+		spec = None
+	return LazyModule(name) if spec is not None else None
+
+
+def is_loaded(lazy):
+	"""
+	Returns True if a LazyModule (or a regular module) has been imported.
+	"""
+	if isinstance(lazy, LazyModule):
+		return lazy.__dict__['_module'] is not None
+	return lazy is not None
@@ -0,0 +1,108 @@
+"""
+Calculator model versions, for namespacing cached p-chem results.
+
+p-chem cache keys include the calculator's model version, so upgrading a
+backend model invalidates its old results lazily: requests start missing
+under the new version's keys (and fill them) while old entries age out,
+instead of a full cache flush followed by a cold-start stampede.
+
+A calculator's version is:
+  + CTS_<CALC>_MODEL_VERSION, if set (e.g., CTS_EPI_MODEL_VERSION=4.11),
+  + otherwise its meta_info modelVersion (e.g., OPERA's "2.3"),
+plus, with CTS_MODEL_VERSION_PROBE=true, whatever its backend reports
+at CTS_<CALC>_VERSION_URL (see Calculator.probe_model_version). Probed
+versions are rechecked every CTS_MODEL_VERSION_PROBE_INTERVAL seconds and
+shared by workers through redis, so a backend upgrade is picked up without
+a deploy. A failed probe keeps the last known version.
+"""
+
+import os
+import time
+import logging
+import threading
+from . import redis_pool
+from . import json_codec
+
+
+
+class ModelVersions(object):
+	"""
+	Declared and (optionally) probed model versions by calculator name.
+	"""
+	key_prefix = "cts_model_version"
+
+	def __init__(self, probe=None, probe_interval=None, probe_timeout=None):
+		if probe is None:
+			probe = os.environ.get('CTS_MODEL_VERSION_PROBE', 'false').lower() == 'true'
+		self.probe = probe
+		self.probe_interval = probe_interval or int(os.environ.get('CTS_MODEL_VERSION_PROBE_INTERVAL', 600))
+		self.probe_timeout = probe_timeout or float(os.environ.get('CTS_MODEL_VERSION_PROBE_TIMEOUT', 5))
+		self.probed = {}  # calc name: (version, checked)
+		self.lock = threading.Lock()
+
+	def get_key(self, calc_name):
+		return "{}:{}".format(self.key_prefix, calc_name)
+
+	def get_declared(self, calc, calc_name):
+		"""
+		Returns the version a calculator declares (env var or meta_info).
+		"""
+		return os.environ.get('CTS_{}_MODEL_VERSION'.format(calc_name.upper())) or calc.get_model_version()
+
+	def get(self, calc, calc_name, redis_conn=None):
+		"""
+		Returns the calculator's model version, "" if it has none.
+		"""
+		version = self.get_declared(calc, calc_name)
+		probed = self.get_probed(calc, calc_name, redis_conn)
+		if probed:
+			version = "{}+{}".format(version, probed) if version else probed
+		return version
+
+	def get_probed(self, calc, calc_name, redis_conn=None):
+		"""
+		Returns the backend-reported version (see module docstring), or None.
+		"""
+		url = os.environ.get('CTS_{}_VERSION_URL'.format(calc_name.upper()))
+		if not self.probe or not url:
+			return None
+		with self.lock:
+			version, checked = self.probed.get(calc_name, (None, 0))
+			if time.time() - checked < self.probe_interval:
+				return version
+			self.probed[calc_name] = (version, time.time())  # other threads use the last version while this one checks
+
+		shared = redis_pool.get_many([self.get_key(calc_name)], redis_conn or redis_pool.get_redis())[0]
+		if shared is not None:
+			new_version = json_codec.loads(shared)
+		else:
+			try:
+				new_version = calc.probe_model_version(url, self.probe_timeout)
+			except Exception as e:
+				logging.warning("Unable to probe {} model version, using {}: {}".format(calc_name, version, e))
+				return version
+			if new_version is None:
+				return version
+			redis_pool.set_many({self.get_key(calc_name): json_codec.dumps(new_version)}, ex=self.probe_interval, redis_conn=redis_conn or redis_pool.get_redis())
+
+		if version is not None and new_version != version:
+			logging.warning("{} model version changed {} -> {}, cached results will be recomputed.".format(calc_name, version, new_version))
+		with self.lock:
+			self.probed[calc_name] = (new_version, time.time())
+		return new_version
+
+	def clear(self):
+		with self.lock:
+			self.probed.clear()
+
+
+
+model_versions = ModelVersions()
+
+
+
+def get_version(calc, calc_name, redis_conn=None):
+	"""
+	Returns the model version for namespacing calc_name's cached results.
+	"""
+	return model_versions.get(calc, calc_name, redis_conn)
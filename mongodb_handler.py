@@ -2,11 +2,21 @@
 Handles CTS mongodb interactions.
 """
 
-import pymongo
 import datetime
-import pytz
 import logging
 import os
+import threading
+from .bloom_filter import MembershipIndex
+from . import lazy_imports
+
+pymongo = lazy_imports.module('pymongo')  # imported when connecting
+pytz = lazy_imports.module('pytz')
+
+# stored values of the fields chemicals are looked up by (see bloom_filter),
+# shared by the process's handlers. dtxcid is loaded from DSST_IDs.csv,
+# not through this package, so its index is off unless CTS_BLOOM_DTXCID_INDEX=true:
+pchem_index = MembershipIndex('pchem', ["dsstoxSubstanceId", "cache_key"])
+dtxcid_index = MembershipIndex('dtxcid', ["DTXCID", "DTXSID", "CASRN"], default_enabled=False)
 
 
 
@@ -17,6 +27,8 @@ class MongoDBHandler:
 		self.db = None  # opens cts database (set in connection function)
 		self.chem_info_collection = None  # chem info data collection (set in connection function)
 		self.pchem_collection = None  # pchem data collection
+		self.alias_collection = None  # chemical alias -> canonical identity (see chemical_identity)
+		self.popularity_collection = None  # p-chem request counts by DTXSID (see pchem_cache)
 		self.db_conn_timeout = 1
 		self.is_connected = False
 		self.mongodb_conn = None
@@ -29,11 +41,14 @@ class MongoDBHandler:
 		self.extra_chem_info_Keys = ["node_image", "popup_image"]  # html wrappers w/ images for product nodes and popups
 
 		# Keys for pchem collection document entry:
-		self.pchem_keys = ["dsstoxSubstanceId", "calc", "prop", "data", "method", "ph"]
+		self.pchem_keys = ["dsstoxSubstanceId", "calc", "prop", "data", "method", "ph", "cache_key", "model_version", "response"]
 
 		# Keys for dtxcid -> dtxsid document entries (see DSST_IDs.csv):
 		self.dtxcid_keys = ["DTXCID", "DTXSID", "CASRN", "PreferredName"]
 
+		# Keys for chem alias document entries:
+		self.alias_keys = ["alias", "key", "record"]
+
 	def connect_to_db(self):
 		"""
 		Tries to connect to mongodb.
@@ -46,6 +61,8 @@ class MongoDBHandler:
 			# self.chem_info_collection = self.db.chem_info  # chem info data collection
 			self.pchem_collection = self.db.pchem  # pchem data collection
 			self.dtxcid_collection = self.db.dtxcid  # dtxcid data collection
+			self.alias_collection = self.db.chem_aliases  # chem alias data collection
+			self.popularity_collection = self.db.pchem_popularity  # p-chem request counts
 			self.test_db_connection()
 		except pymongo.errors.ConnectionFailure as e:
 			logging.warning("(mongodb_handler.py) Unable to connect to db: {}".format(e))
@@ -129,9 +146,53 @@ class MongoDBHandler:
 		"""
 		# if not self.is_connected or not query_obj:
 		# 	return None
+		if not pchem_index.might_contain(query_obj, self.pchem_collection):
+			return None  # definitely not stored
 		pchem_result = self.pchem_collection.find_one(query_obj)  # searches db
 		return pchem_result
 
+	def find_pchem_documents(self, query_obj):
+		"""
+		Searches pchem collection for all documents matching query (e.g., each prop of a chemical).
+		"""
+		if not pchem_index.might_contain(query_obj, self.pchem_collection):
+			return []
+		return list(self.pchem_collection.find(query_obj, {'_id': False}))
+
+	def upsert_pchem_document(self, pchem_obj):
+		"""
+		Inserts or updates a cached p-chem result document, keyed by cache_key.
+		"""
+		if not self.is_connected or not pchem_obj:
+			return None
+		db_object = self.create_pchem_document(pchem_obj)
+		pchem_index.add(db_object)
+		return self.pchem_collection.update_one({'cache_key': db_object['cache_key']}, {'$set': db_object}, upsert=True)
+
+	def iter_pchem_cache_documents(self, dtxsids, batch_size=100):
+		"""
+		Streams p-chem cache documents (with a cache_key and response) for the given DTXSIDs.
+		"""
+		query_obj = {'dsstoxSubstanceId': {'$in': list(dtxsids)}, 'cache_key': {'$exists': True}}
+		projection = {'_id': False, 'cache_key': True, 'calc': True, 'model_version': True, 'response': True}
+		return self.pchem_collection.find(query_obj, projection).batch_size(batch_size)
+
+	def increment_pchem_popularity(self, counts):
+		"""
+		Adds {dtxsid: number of requests} to the p-chem request counts.
+		"""
+		if not self.is_connected or not counts:
+			return None
+		operations = [pymongo.UpdateOne({'_id': dtxsid}, {'$inc': {'count': count}}, upsert=True) for dtxsid, count in counts.items()]
+		return self.popularity_collection.bulk_write(operations, ordered=False)
+
+	def find_popular_chemicals(self, limit):
+		"""
+		Returns the DTXSIDs with the most p-chem requests, most requested first.
+		"""
+		cursor = self.popularity_collection.find({}, {'_id': True}).sort('count', pymongo.DESCENDING).limit(limit)
+		return [document['_id'] for document in cursor]
+
 	# def insert_pchem_data(self, pchem_obj):
 	# 	"""
 	# 	Inserts pchem data into chem info collection.
@@ -163,6 +224,8 @@ class MongoDBHandler:
 		"""
 		# if not self.is_connected or not query_obj:
 		# 	return None
+		if not dtxcid_index.might_contain(query_obj, self.dtxcid_collection):
+			return None  # definitely not stored
 		dtxcid_result = self.dtxcid_collection.find_one(query_obj)  # searches db
 		return dtxcid_result
 
@@ -176,4 +239,53 @@ class MongoDBHandler:
 	# 	print("Inserting {} into db.".format(dtxcid_obj))
 	# 	db_object = self.create_dtxcid_document(dtxcid_obj)
 	# 	dtxcid_obj = self.dtxcid_collection.insert_one(db_object)  # inserts query object
-	# 	return dtxcid_obj
\ No newline at end of file
+	# 	return dtxcid_obj
+
+	def find_alias_document(self, query_obj):
+		"""
+		Searches chem alias collection for document matching alias.
+		Returns alias data if it exists, or None if it doesn't.
+		"""
+		alias_result = self.alias_collection.find_one(query_obj, {'_id': False})  # searches db
+		return alias_result
+
+	def upsert_alias_documents(self, alias_objs):
+		"""
+		Inserts or updates chem alias documents, keyed by alias.
+		"""
+		if not self.is_connected or not alias_objs:
+			return None
+		operations = []
+		for alias_obj in alias_objs:
+			db_object = {key: val for key, val in alias_obj.items() if key in self.alias_keys}
+			operations.append(pymongo.UpdateOne({'alias': db_object['alias']}, {'$set': db_object}, upsert=True))
+		return self.alias_collection.bulk_write(operations, ordered=False)
+
+
+
+_shared_handler = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_handler():
+	"""
+	Returns the process's shared MongoDBHandler (for caches), connecting
+	on first use, or None if CTS_DB_HOST isn't set or the db is unavailable.
+	Connects once, so an unreachable db isn't retried on every lookup.
+	"""
+	global _shared_handler
+	if not os.environ.get('CTS_DB_HOST'):
+		return None
+	with _shared_lock:
+		if _shared_handler is None:
+			_shared_handler = MongoDBHandler()
+			try:
+				_shared_handler.connect_to_db()
+				if _shared_handler.is_connected:
+					_shared_handler.alias_collection.create_index('alias', unique=True)
+					_shared_handler.pchem_collection.create_index('cache_key', sparse=True)
+					_shared_handler.popularity_collection.create_index([('count', pymongo.DESCENDING)])
+			except Exception as e:
+				logging.warning("(mongodb_handler.py) Unable to set up shared db handler: {}".format(e))
+				_shared_handler.is_connected = False
+	return _shared_handler if _shared_handler.is_connected else None
@@ -0,0 +1,90 @@
+"""
+Short-lived cache of negative outcomes for bad chemical inputs.
+
+Chemicals jchem can't read (errorCode 3, "Chemical not recognized")
+and SMILES CTSWS's metal check rejects (see SMILESFilter.filterSMILES) are
+rejected again by every calculator and retry. Those outcomes are cached
+for CTS_NEGATIVE_CACHE_TTL seconds, keyed by namespace and input, so
+repeated bad submissions are rejected without another backend call.
+Backend errors are keyed by the whole request (see get_request_key), an
+error is only about the chemical for that endpoint and payload, e.g., a
+SMILES that isn't a name is still a SMILES.
+Uses an in-process LRU and optionally (CTS_NEGATIVE_CACHE_REDIS) redis.
+"""
+
+import os
+import hashlib
+import logging
+from .response_cache import LRUCache
+from . import json_codec
+
+
+
+class NegativeCache(object):
+	"""
+	Caches error outcomes (JSON serializable) for inputs.
+	"""
+	key_prefix = "cts_negative"
+
+	def __init__(self, enabled=None, ttl=None, max_bytes=None, use_redis=None):
+		if enabled is None:
+			enabled = os.environ.get('CTS_NEGATIVE_CACHE', 'true').lower() == 'true'
+		if use_redis is None:
+			use_redis = os.environ.get('CTS_NEGATIVE_CACHE_REDIS', 'false').lower() == 'true'
+		self.enabled = enabled
+		self.use_redis = use_redis
+		self.ttl = ttl or int(os.environ.get('CTS_NEGATIVE_CACHE_TTL', 300))
+		self.local = LRUCache(max_bytes or int(os.environ.get('CTS_NEGATIVE_CACHE_MAX_BYTES', 4 * 1024 * 1024)))
+
+	def make_key(self, namespace, value):
+		digest = hashlib.sha1(str(value).encode('utf-8')).hexdigest()
+		return "{}:{}:{}".format(self.key_prefix, namespace, digest)
+
+	def get(self, namespace, value, redis_conn=None):
+		"""
+		Returns the cached error outcome for value, or None.
+		"""
+		if not self.enabled or not value:
+			return None
+		key = self.make_key(namespace, value)
+		outcome = self.local.get(key)
+		if outcome is None and self.use_redis and redis_conn is not None:
+			try:
+				outcome = redis_conn.get(key)
+			except Exception as e:
+				logging.warning("Unable to get negative cache entry from redis: {}".format(e))
+			if outcome is not None:
+				outcome = outcome.decode('utf-8') if isinstance(outcome, bytes) else outcome
+				self.local.set(key, outcome, self.ttl)
+		if outcome is None:
+			return None
+		logging.info("Negative cache hit for {} input: {}".format(namespace, value))
+		return json_codec.loads(outcome)
+
+	def set(self, namespace, value, outcome, redis_conn=None):
+		"""
+		Caches an error outcome for value.
+		"""
+		if not self.enabled or not value:
+			return
+		key = self.make_key(namespace, value)
+		outcome = json_codec.dumps(outcome)
+		self.local.set(key, outcome, self.ttl)
+		if self.use_redis and redis_conn is not None:
+			try:
+				redis_conn.set(key, outcome, ex=self.ttl)
+			except Exception as e:
+				logging.warning("Unable to set negative cache entry in redis: {}".format(e))
+
+
+
+def get_request_key(url, data):
+	"""
+	Returns the negative cache input for a web_call request: its
+	endpoint and canonical (key-sorted JSON) payload.
+	"""
+	return "{}|{}".format(url, json_codec.dumps(data, sort_keys=True))
+
+
+
+negative_cache = NegativeCache()
@@ -0,0 +1,350 @@
+"""
+Read-through cache for p-chem data requests.
+
+Most p-chem traffic is repeat chemicals, but every request went back to
+its backend (EPI, TEST, SPARC, OPERA, Measured, ChemAxon). Handlers
+decorated with cached() look up results by (canonical chemical, calc,
+prop(s), method, pH) in three tiers:
+  + an in-process LRU,
+  + redis (CTS_PCHEM_CACHE_REDIS=true, off by default), shared by workers,
+  + mongodb's pchem collection (CTS_PCHEM_CACHE_MONGO, if CTS_DB_HOST
+    is set), for chemicals with a DTXSID, which outlives redis.
+A hit in a slower tier is copied into the faster ones, and a computed
+result is written to every tier on the way back. Only results with a
+value are cached, not "N/A" or errors (see each calculator's
+is_cacheable_response).
+
+Chemicals are keyed by chemical_identity.get_key, so a name, CAS# and
+SMILES for the same substance share entries. Keys are namespaced by the
+calculator's model version (see model_versions), so results from an older
+model are never served after an upgrade, they just age out. Cached results
+are stored without the request's own keys, which are filled back in from
+the current request on a hit (see Calculator.personalize_cached_response).
+Entries are encoded with stdlib json (see encode_entry), which keeps the
+NaN/Infinity values OPERA and TEST can return, so a cached result is the
+same as a fresh one.
+
+Lookups for DTXSID chemicals are counted (see PopularityCounter), so the
+most requested chemicals can be loaded back in after a deploy or redis
+flush (see pchem_warmup).
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import functools
+import threading
+import collections
+import json
+from .response_cache import LRUCache
+from . import chemical_identity
+from . import model_versions
+from . import redis_pool
+from . import json_codec
+from . import lazy_imports
+
+mongodb_handler = lazy_imports.module('.mongodb_handler', __package__)
+
+
+
+PH_PROPS = ['kow_wph', 'water_sol_ph']  # props whose results depend on request pH
+RESULT_KEYS = ['data', 'valid', 'method', 'prop', 'error']  # always stored, even if the request had them
+
+
+
+def encode_entry(entry):
+	"""
+	Encodes a cache entry as compact JSON. Uses stdlib json, not
+	json_codec, since orjson writes NaN and Infinity as null.
+	"""
+	return json.dumps(entry, separators=(',', ':'))
+
+
+
+class PopularityCounter(object):
+	"""
+	Counts p-chem requests by DTXSID (the pchem collection's key). Counts
+	are kept in-process and added to the db's pchem_popularity collection
+	every flush_interval seconds, or once max_pending chemicals are waiting.
+	"""
+	def __init__(self, enabled=None, flush_interval=None, max_pending=None):
+		if enabled is None:
+			enabled = bool(os.environ.get('CTS_DB_HOST')) and os.environ.get('CTS_PCHEM_POPULARITY', 'true').lower() == 'true'
+		self.enabled = enabled
+		self.flush_interval = flush_interval or int(os.environ.get('CTS_PCHEM_POPULARITY_FLUSH_INTERVAL', 60))
+		self.max_pending = max_pending or int(os.environ.get('CTS_PCHEM_POPULARITY_MAX_PENDING', 10000))
+		self.counts = collections.Counter()
+		self.last_flush = time.time()
+		self.lock = threading.Lock()
+
+	def record(self, chemical):
+		if not self.enabled or not chemical.startswith('DTXSID'):
+			return
+		with self.lock:
+			self.counts[chemical] += 1
+			due = len(self.counts) >= self.max_pending or time.time() - self.last_flush >= self.flush_interval
+		if due:
+			self.flush()
+
+	def flush(self):
+		"""
+		Adds the pending counts to the db. They're dropped if it's unavailable.
+		"""
+		with self.lock:
+			counts, self.counts = self.counts, collections.Counter()
+			self.last_flush = time.time()
+		db_handler = mongodb_handler.get_shared_handler() if counts else None
+		if db_handler is None:
+			return
+		try:
+			db_handler.increment_pchem_popularity(counts)
+		except Exception as e:
+			logging.warning("Unable to store p-chem request counts in db: {}".format(e))
+
+
+
+class PchemCache(object):
+	"""
+	Three-tier (in-process LRU, redis, mongodb) p-chem result cache.
+	Inputs:
+	  + enabled - cache on/off (CTS_PCHEM_CACHE, on by default).
+	  + ttl - seconds results are kept in the LRU and redis.
+	  + max_bytes - size limit of the in-process tier.
+	  + use_redis - shares results between workers through redis (CTS_PCHEM_CACHE_REDIS, off by default).
+	  + use_mongo - keeps results for DTXSID chemicals in the pchem collection.
+	"""
+	key_prefix = "cts_pchem"
+
+	def __init__(self, enabled=None, ttl=None, max_bytes=None, use_redis=None, use_mongo=None):
+		if enabled is None:
+			enabled = os.environ.get('CTS_PCHEM_CACHE', 'true').lower() == 'true'
+		if use_redis is None:
+			use_redis = os.environ.get('CTS_PCHEM_CACHE_REDIS', 'false').lower() == 'true'
+		if use_mongo is None:
+			use_mongo = bool(os.environ.get('CTS_DB_HOST')) and os.environ.get('CTS_PCHEM_CACHE_MONGO', 'true').lower() == 'true'
+		self.enabled = enabled
+		self.use_redis = use_redis
+		self.use_mongo = use_mongo
+		self.ttl = ttl or int(os.environ.get('CTS_PCHEM_CACHE_TTL', 7 * 24 * 3600))
+		self.local = LRUCache(max_bytes or int(os.environ.get('CTS_PCHEM_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+		self.popularity = PopularityCounter(enabled=False) if not use_mongo else PopularityCounter()
+		self.hits = 0
+		self.misses = 0
+
+	def get_query(self, calc, request_dict, redis_conn=None):
+		"""
+		Returns the cache query ({key, chemical, calc, version, prop, method, ph}) for
+		a request, or None if the request isn't cached (e.g., speciation,
+		or more than one chemical).
+		"""
+		if not self.enabled or not isinstance(request_dict, dict):
+			return None
+		if request_dict.get('service') == 'getSpeciationData':
+			return None
+		calc_name = calc.name or request_dict.get('calc')
+		chemical = request_dict.get('chemical')
+		if isinstance(chemical, list) and len(chemical) == 1:
+			chemical = chemical[0]
+		if not calc_name or not isinstance(chemical, str) or not chemical.strip():
+			return None
+
+		props = request_dict.get('props')
+		prop = sorted(props) if isinstance(props, list) and props else request_dict.get('prop')
+		ph = None
+		if any(name in PH_PROPS for name in (prop if isinstance(prop, list) else [prop])):
+			ph = float(request_dict.get('ph') or 7.0)
+		query = {
+			'chemical': chemical_identity.get_key(chemical, redis_conn),
+			'calc': calc_name,
+			'version': model_versions.get_version(calc, calc_name, redis_conn),
+			'prop': prop,
+			'method': request_dict.get('method'),
+			'ph': ph
+		}
+		digest = hashlib.sha1(json_codec.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()
+		query['key'] = "{}:{}:{}:{}".format(self.key_prefix, calc_name, query['version'].replace(" ", "_"), digest)
+		return query
+
+	def get(self, calc, query, request_dict, redis_conn=None):
+		"""
+		Returns the cached response for query, personalized for request_dict, or None.
+		"""
+		self.popularity.record(query['chemical'])
+		entry = self.local.get(query['key'])
+		if entry is not None:
+			entry = json_codec.loads(entry)
+		else:
+			entry = self.get_remote(calc, query, request_dict, redis_conn)
+		if entry is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		return calc.personalize_cached_response(self.build_response(entry, request_dict), request_dict)
+
+	def get_remote(self, calc, query, request_dict, redis_conn=None):
+		"""
+		Returns a cache entry from redis or mongodb, copying
+		it into the faster tiers, or None.
+		"""
+		if self.use_redis:
+			value = redis_pool.get_many([query['key']], redis_conn or redis_pool.get_redis())[0]
+			if value is not None:
+				value = value.decode('utf-8') if isinstance(value, bytes) else value
+				self.local.set(query['key'], value, self.ttl)
+				return json_codec.loads(value)
+
+		db_handler = self.get_db_handler(query)
+		if db_handler is None:
+			return None
+		try:
+			document = db_handler.find_pchem_document({'cache_key': query['key']})
+			if document and document.get('response'):
+				entry = document['response']
+			else:
+				entry = calc.pchem_document_response(db_handler, query, request_dict)  # e.g., precomputed OPERA data
+		except Exception as e:
+			logging.warning("Unable to get p-chem data from db: {}".format(e))
+			return None
+		if entry is None:
+			return None
+		self.set_entry(query, entry, redis_conn, to_db=False)
+		return entry
+
+	def set(self, calc, query, request_snapshot, response, redis_conn=None):
+		"""
+		Caches a valid response, request_snapshot is the request as
+		received (handlers add to request_dict).
+		"""
+		if not calc.is_cacheable_response(response):
+			return
+		entry = self.make_entry(request_snapshot, response)
+		try:
+			self.set_entry(query, entry, redis_conn)
+		except (TypeError, ValueError) as e:
+			logging.warning("Unable to cache p-chem response for {}: {}".format(query['key'], e))
+
+	def set_entry(self, query, entry, redis_conn=None, to_db=True):
+		value = encode_entry(entry)
+		self.local.set(query['key'], value, self.ttl)
+		if self.use_redis:
+			redis_pool.set_many({query['key']: value}, ex=self.ttl, redis_conn=redis_conn or redis_pool.get_redis())
+		db_handler = self.get_db_handler(query) if to_db else None
+		if db_handler is None:
+			return
+		document = {
+			'cache_key': query['key'],
+			'dsstoxSubstanceId': query['chemical'],
+			'calc': query['calc'],
+			'model_version': query['version'],
+			'prop': query['prop'],
+			'method': query['method'],
+			'ph': query['ph'],
+			'response': entry
+		}
+		try:
+			db_handler.upsert_pchem_document(document)
+		except Exception as e:
+			logging.warning("Unable to store p-chem data in db: {}".format(e))
+
+	def load(self, values, redis_conn=None, local=True):
+		"""
+		Loads {key: JSON entry} into redis and (if local) the in-process
+		tier, e.g., when warming the cache. Returns False if redis is unavailable.
+		"""
+		if local:
+			for key, value in values.items():
+				self.local.set(key, value, self.ttl)
+		if not self.use_redis:
+			return True
+		return redis_pool.set_many(values, ex=self.ttl, redis_conn=redis_conn or redis_pool.get_redis())
+
+	def get_db_handler(self, query):
+		"""
+		Returns the shared db handler if query's chemical has
+		a DTXSID (the pchem collection's key), otherwise None.
+		"""
+		if not self.use_mongo or not query['chemical'].startswith('DTXSID'):
+			return None
+		return mongodb_handler.get_shared_handler()
+
+	def make_entry(self, request_snapshot, response):
+		"""
+		Returns the cacheable part of a handler response: the keys it
+		didn't copy from the request, and how it copies the request.
+		"""
+		if isinstance(response, list):
+			return {'results': response}
+		fields = {}
+		for key, val in response.items():
+			if key == 'request_post':
+				continue
+			if key in RESULT_KEYS or key not in request_snapshot or request_snapshot[key] != val:
+				fields[key] = val
+		return {'fields': fields, 'echo_nodes': 'nodes' in response, 'request_post': 'request_post' in response}
+
+	def build_response(self, entry, request_dict):
+		"""
+		Rebuilds a handler response from a cache entry for request_dict.
+		"""
+		if 'results' in entry:
+			return entry['results']
+		response = {key: val for key, val in request_dict.items() if key != 'nodes' or entry.get('echo_nodes')}
+		response.update(entry['fields'])
+		if entry.get('request_post'):
+			response['request_post'] = request_dict
+		return response
+
+	def clear(self):
+		self.local.clear()
+		self.hits = 0
+		self.misses = 0
+
+
+
+pchem_cache = PchemCache()
+
+
+
+def cached(func):
+	"""
+	Decorator for data request handlers (sync or async), which returns
+	cached results for repeat requests (see PchemCache). Goes outside
+	dispatcher.dispatched, so cache hits don't wait for a dispatch slot.
+	"""
+	def get_request(args, kwargs):
+		calc, request_dict = args[0], kwargs.get('request_dict', args[1] if len(args) > 1 else None)
+		return calc, request_dict
+
+	if asyncio.iscoroutinefunction(func):
+		@functools.wraps(func)
+		async def async_wrapper(*args, **kwargs):
+			calc, request_dict = get_request(args, kwargs)
+			query = pchem_cache.get_query(calc, request_dict, calc.redis_conn)
+			if query is None:
+				return await func(*args, **kwargs)
+			loop = asyncio.get_running_loop()
+			response = await loop.run_in_executor(None, pchem_cache.get, calc, query, request_dict, calc.redis_conn)
+			if response is not None:
+				return response
+			request_snapshot = dict(request_dict)
+			response = await func(*args, **kwargs)
+			await loop.run_in_executor(None, pchem_cache.set, calc, query, request_snapshot, response, calc.redis_conn)
+			return response
+		return async_wrapper
+
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		calc, request_dict = get_request(args, kwargs)
+		query = pchem_cache.get_query(calc, request_dict, calc.redis_conn)
+		if query is None:
+			return func(*args, **kwargs)
+		response = pchem_cache.get(calc, query, request_dict, calc.redis_conn)
+		if response is not None:
+			return response
+		request_snapshot = dict(request_dict)
+		response = func(*args, **kwargs)
+		pchem_cache.set(calc, query, request_snapshot, response, calc.redis_conn)
+		return response
+	return wrapper
@@ -0,0 +1,190 @@
+"""
+Warms the p-chem cache from mongodb after a deploy or redis flush.
+
+With redis empty, every p-chem request goes to the slow backends until
+the cache fills again. PchemWarmUp loads the stored results of the most
+requested chemicals (pchem_cache's popularity counts) from the pchem
+collection back into redis and the in-process tier:
+  + bounded memory - chemicals are read CTS_PCHEM_WARMUP_BATCH_SIZE at a
+    time through a db cursor, and the in-process tier stops taking
+    entries after CTS_PCHEM_WARMUP_MAX_LOCAL_BYTES (redis still gets them).
+  + resumable - the ranking and position are checkpointed in redis after
+    each batch, so an interrupted run continues where it stopped.
+  + one at a time - a redis lock keeps workers from running it together.
+
+Run it with warm_cache(), e.g., from a scheduled task, or at worker start
+with CTS_PCHEM_WARMUP=true (see warmup.warm_up).
+"""
+
+import os
+import uuid
+import logging
+from .pchem_cache import pchem_cache, encode_entry
+from . import calculator_pool
+from . import model_versions
+from . import redis_pool
+from . import json_codec
+from . import lazy_imports
+
+mongodb_handler = lazy_imports.module('.mongodb_handler', __package__)
+
+
+
+# calc name: (module, class), for checking stored results' model versions
+calc_classes = {
+	'epi': ('.calculator_epi', 'EpiCalc'),
+	'test': ('.calculator_test', 'TestWSCalc'),
+	'sparc': ('.calculator_sparc', 'SparcCalc'),
+	'opera': ('.calculator_opera', 'OperaCalc'),
+	'measured': ('.calculator_measured', 'MeasuredCalc'),
+	'chemaxon': ('.calculator_chemaxon', 'JchemCalc'),
+}
+
+
+
+class PchemWarmUp(object):
+	"""
+	Loads the most requested chemicals' stored p-chem results into the cache.
+	Inputs:
+	  + limit - number of chemicals to load.
+	  + batch_size - chemicals read from the db at a time.
+	  + max_local_bytes - most the in-process tier takes from a run.
+	  + checkpoint_ttl - seconds an unfinished run can be resumed for.
+	"""
+	key_prefix = "cts_pchem_warmup"
+
+	def __init__(self, limit=None, batch_size=None, max_local_bytes=None, checkpoint_ttl=None, lock_ttl=None, redis_conn=None):
+		self.limit = limit or int(os.environ.get('CTS_PCHEM_WARMUP_LIMIT', 10000))
+		self.batch_size = batch_size or int(os.environ.get('CTS_PCHEM_WARMUP_BATCH_SIZE', 100))
+		self.max_local_bytes = max_local_bytes or int(os.environ.get('CTS_PCHEM_WARMUP_MAX_LOCAL_BYTES', pchem_cache.local.max_bytes // 2))
+		self.checkpoint_ttl = checkpoint_ttl or int(os.environ.get('CTS_PCHEM_WARMUP_CHECKPOINT_TTL', 24 * 3600))
+		self.lock_ttl = lock_ttl or int(os.environ.get('CTS_PCHEM_WARMUP_LOCK_TTL', 600))  # refreshed after each batch
+		self.redis_conn = redis_conn
+		self.lock_token = None
+
+	def get_key(self, name):
+		return "{}:{}".format(self.key_prefix, name)
+
+	def acquire_lock(self, redis_conn):
+		self.lock_token = uuid.uuid4().hex
+		try:
+			return bool(redis_conn.set(self.get_key('lock'), self.lock_token, nx=True, ex=self.lock_ttl))
+		except Exception as e:
+			logging.warning("Unable to lock p-chem cache warm-up: {}".format(e))
+			return False
+
+	def refresh_lock(self, redis_conn):
+		redis_pool.set_many({self.get_key('lock'): self.lock_token}, ex=self.lock_ttl, redis_conn=redis_conn)
+
+	def release_lock(self, redis_conn):
+		try:
+			value = redis_conn.get(self.get_key('lock'))
+			if value is not None and (value.decode('utf-8') if isinstance(value, bytes) else value) == self.lock_token:
+				redis_conn.delete(self.get_key('lock'))
+		except Exception as e:
+			logging.warning("Unable to unlock p-chem cache warm-up: {}".format(e))
+
+	def get_checkpoint(self, redis_conn):
+		"""
+		Returns (chemicals, progress) of an unfinished run, or (None, None).
+		"""
+		chemicals, progress = redis_pool.get_many([self.get_key('chemicals'), self.get_key('progress')], redis_conn)
+		if chemicals is None or progress is None:
+			return None, None
+		return json_codec.loads(chemicals), json_codec.loads(progress)
+
+	def save_checkpoint(self, redis_conn, progress, chemicals=None):
+		mapping = {self.get_key('progress'): json_codec.dumps(progress)}
+		if chemicals is not None:
+			mapping[self.get_key('chemicals')] = json_codec.dumps(chemicals)
+		redis_pool.set_many(mapping, ex=self.checkpoint_ttl, redis_conn=redis_conn)
+
+	def clear_checkpoint(self, redis_conn):
+		try:
+			redis_conn.delete(self.get_key('chemicals'), self.get_key('progress'))
+		except Exception as e:
+			logging.warning("Unable to clear p-chem cache warm-up checkpoint: {}".format(e))
+
+	def get_version(self, calc_name, redis_conn):
+		"""
+		Returns calc_name's current model version, or None if it can't be
+		checked. Results from other versions aren't loaded, their keys
+		would never be used.
+		"""
+		if calc_name not in calc_classes:
+			return None
+		module_name, class_name = calc_classes[calc_name]
+		try:
+			calc = calculator_pool.get_instance(getattr(lazy_imports.module(module_name, __package__), class_name))
+			return model_versions.get_version(calc, calc_name, redis_conn)
+		except Exception as e:
+			logging.warning("Unable to get {} model version for warm-up, loading all versions: {}".format(calc_name, e))
+			return None
+
+	def run(self, db_handler=None):
+		"""
+		Loads (or resumes loading) the most requested chemicals' results.
+		Returns {chemicals, loaded, skipped}, or None if it didn't run.
+		"""
+		db_handler = db_handler or mongodb_handler.get_shared_handler()
+		if db_handler is None:
+			logging.warning("No db for p-chem cache warm-up.")
+			return None
+		redis_conn = self.redis_conn or redis_pool.get_redis()
+		if not self.acquire_lock(redis_conn):
+			logging.info("p-chem cache warm-up is already running (or redis is unavailable).")
+			return None
+
+		try:
+			chemicals, progress = self.get_checkpoint(redis_conn)
+			if chemicals is None:
+				chemicals = db_handler.find_popular_chemicals(self.limit)
+				progress = {'position': 0, 'loaded': 0, 'skipped': 0}
+				self.save_checkpoint(redis_conn, progress, chemicals)
+			else:
+				logging.info("Resuming p-chem cache warm-up at {} of {} chemicals.".format(progress['position'], len(chemicals)))
+
+			versions = {}
+			local_bytes = 0
+			while progress['position'] < len(chemicals):
+				batch = chemicals[progress['position']:progress['position'] + self.batch_size]
+				values = {}
+				for document in db_handler.iter_pchem_cache_documents(batch, self.batch_size):
+					calc_name = document.get('calc')
+					if calc_name not in versions:
+						versions[calc_name] = self.get_version(calc_name, redis_conn)
+					if versions[calc_name] is not None and document.get('model_version') != versions[calc_name]:
+						progress['skipped'] += 1
+						continue
+					values[document['cache_key']] = encode_entry(document['response'])
+
+				local = local_bytes < self.max_local_bytes
+				pchem_cache.load(values, redis_conn, local=local)
+				if local:
+					local_bytes += sum(len(key) + len(value) for key, value in values.items())
+
+				progress['position'] += len(batch)
+				progress['loaded'] += len(values)
+				self.save_checkpoint(redis_conn, progress)
+				self.refresh_lock(redis_conn)
+
+			self.clear_checkpoint(redis_conn)
+			logging.info("p-chem cache warm-up loaded {} results for {} chemicals ({} skipped).".format(progress['loaded'], len(chemicals), progress['skipped']))
+			return {'chemicals': len(chemicals), 'loaded': progress['loaded'], 'skipped': progress['skipped']}
+
+		finally:
+			self.release_lock(redis_conn)
+
+
+
+def warm_cache():
+	"""
+	Loads the most requested chemicals' stored p-chem results into the
+	cache (see PchemWarmUp). Returns its stats, or None if it didn't run.
+	"""
+	pchem_cache.popularity.flush()  # this process's counts count too
+	try:
+		return PchemWarmUp().run()
+	except Exception as e:
+		logging.warning("p-chem cache warm-up stopped, it'll resume from its checkpoint: {}".format(e))
+		return None
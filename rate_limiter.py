@@ -0,0 +1,193 @@
+"""
+Distributed token-bucket rate limits for public upstream services.
+
+The public TEST WS (comptox.epa.gov), actorws.epa.gov and
+cactus.nci.nih.gov throttle or ban bursty clients. Requests to those
+hosts take a token from a per-host bucket kept in redis, so the rate
+is shared by every worker. When the bucket's empty, a request reserves
+the next token and waits for it (up to max_wait seconds, capped at the
+request deadline) instead of going out with the rest of a batch's burst.
+If redis is unavailable, buckets are kept per process.
+
+Limits are set with CTS_RATE_LIMITS as comma-separated "host=rate:burst"
+entries (rate in requests per second), CTS_RATE_LIMIT=false turns them off.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from .http_sessions import registry as http_registry
+from . import deadline
+from . import redis_pool
+from . import lazy_imports
+
+request_errors = lazy_imports.module('.request_errors', __package__)  # imports requests
+
+
+
+DEFAULT_LIMITS = "https://comptox.epa.gov=5:5,https://actorws.epa.gov=5:5,https://cactus.nci.nih.gov=2:2"
+
+
+
+class TokenBucket(object):
+	"""
+	Token bucket for a host, refilled at rate tokens per second up to burst.
+	Tokens can go negative, which is the queue of requests waiting on
+	reserved tokens.
+	"""
+	key_prefix = "cts_ratelimit"
+
+	# Takes a token (reserving a future one if there aren't any), and
+	# returns the seconds to wait for it, or nil if that's over max_wait.
+	# Uses redis's clock, so workers' clock skew doesn't skew the bucket
+	# (replicate_commands lets redis < 5 replicate writes after TIME).
+	reserve_script = """
+	if redis.replicate_commands then
+		redis.replicate_commands()
+	end
+	local rate = tonumber(ARGV[1])
+	local burst = tonumber(ARGV[2])
+	local max_wait = tonumber(ARGV[3])
+	local time = redis.call('TIME')
+	local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+	local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+	local tokens = tonumber(state[1]) or burst
+	local updated = tonumber(state[2]) or now
+	tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+	local wait = 0
+	if tokens < 1 then
+		wait = (1 - tokens) / rate
+	end
+	if wait > max_wait then
+		return nil
+	end
+	redis.call('HMSET', KEYS[1], 'tokens', tokens - 1, 'updated', math.max(now, updated))
+	redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate + max_wait) + 1)
+	return tostring(wait)
+	"""
+
+	def __init__(self, host, rate, burst, max_wait=None, redis_conn=None):
+		self.host = host
+		self.rate = float(rate)
+		self.burst = float(burst)
+		self.max_wait = max_wait if max_wait is not None else float(os.environ.get('CTS_RATE_LIMIT_MAX_WAIT', 10))
+		self.redis_conn = redis_conn
+		self.key = "{}:{}".format(self.key_prefix, host)
+		self.script = None
+		self.tokens = self.burst  # local bucket, if redis is unavailable
+		self.updated = time.time()
+		self.lock = threading.Lock()
+
+	def reserve(self, max_wait):
+		"""
+		Takes a token, returns the seconds to wait for it, or
+		None if the wait would be over max_wait.
+		"""
+		if self.redis_conn is not None:
+			try:
+				if self.script is None:
+					self.script = self.redis_conn.register_script(self.reserve_script)
+				wait = self.script(keys=[self.key], args=[self.rate, self.burst, max_wait])
+				return None if wait is None else float(wait)
+			except Exception as e:
+				logging.warning("Unable to use redis rate limit for {}, limiting per process: {}".format(self.host, e))
+		return self.reserve_local(time.time(), max_wait)
+
+	def reserve_local(self, now, max_wait):
+		with self.lock:
+			tokens = min(self.burst, self.tokens + max(0, now - self.updated) * self.rate)
+			wait = (1 - tokens) / self.rate if tokens < 1 else 0
+			if wait > max_wait:
+				return None
+			self.tokens = tokens - 1
+			self.updated = max(now, self.updated)
+			return wait
+
+	def get_wait(self):
+		max_wait = deadline.get_timeout(self.max_wait)
+		wait = self.reserve(max_wait)
+		if wait is None:
+			raise request_errors.RateLimitExceeded("Rate limit for {} would delay request over {}s.".format(self.host, round(max_wait, 2)))
+		if wait > 0:
+			logging.info("Rate limiting request to {} for {}s.".format(self.host, round(wait, 2)))
+		return wait
+
+	def acquire(self):
+		"""
+		Waits for a token, raises RateLimitExceeded if it's too long.
+		"""
+		wait = self.get_wait()
+		if wait > 0:
+			time.sleep(wait)
+
+	async def acquire_async(self):
+		"""
+		Async version of acquire(). The redis reservation runs in the
+		loop's thread pool so it doesn't block the loop.
+		"""
+		if self.redis_conn is not None:
+			wait = await asyncio.get_running_loop().run_in_executor(None, deadline.wrap(self.get_wait))
+		else:
+			wait = self.get_wait()
+		if wait > 0:
+			await asyncio.sleep(wait)
+
+
+
+def parse_limits(limits):
+	"""
+	Returns {host key: (rate, burst)} from a "host=rate:burst,..." string.
+	"""
+	parsed = {}
+	for entry in limits.split(','):
+		if not entry.strip():
+			continue
+		host, limit = entry.rsplit('=', 1)
+		rate, _, burst = limit.partition(':')
+		parsed[http_registry.get_host_key(host)] = (float(rate), float(burst or rate))
+	return parsed
+
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_limits = None
+
+
+def get_bucket(url):
+	"""
+	Returns the shared bucket for url's host, or None if it isn't rate limited.
+	"""
+	global _limits
+	if os.environ.get('CTS_RATE_LIMIT', 'true').lower() != 'true':
+		return None
+	if _limits is None:
+		_limits = parse_limits(os.environ.get('CTS_RATE_LIMITS', DEFAULT_LIMITS))
+	host = http_registry.get_host_key(url)
+	if not host in _limits:
+		return None
+	bucket = _buckets.get(host)
+	if bucket:
+		return bucket
+	with _buckets_lock:
+		if not host in _buckets:
+			rate, burst = _limits[host]
+			_buckets[host] = TokenBucket(host, rate, burst, redis_conn=redis_pool.get_redis())
+		return _buckets[host]
+
+
+def acquire(url):
+	"""
+	Waits for a token if url's host is rate limited.
+	"""
+	bucket = get_bucket(url)
+	if bucket:
+		bucket.acquire()
+
+
+async def acquire_async(url):
+	bucket = get_bucket(url)
+	if bucket:
+		await bucket.acquire_async()
@@ -0,0 +1,111 @@
+"""
+Process-wide redis connection pool for CTS.
+
+Calculators, SMILES filters and prop objects are created constantly,
+so they share one lazily created redis client (and its connection
+pool) per process instead of each building its own. redis-py's pool
+drops a forked parent's connections, so celery workers get their own.
+Also has pipelined helpers for getting/setting many keys in one round trip.
+"""
+
+import os
+import logging
+import threading
+from . import lazy_imports
+
+redis = lazy_imports.module('redis')  # imported when the client's created
+
+
+
+class RedisPool(object):
+	"""
+	Lazily created shared redis client, uses the REDIS_HOSTNAME and
+	REDIS_PORT env vars like Calculator did, and CTS_REDIS_MAX_CONNECTIONS
+	for the pool size. Redis is only a cache and coordination layer for
+	requests, so commands and connecting time out quickly
+	(CTS_REDIS_SOCKET_TIMEOUT, CTS_REDIS_CONNECT_TIMEOUT seconds) and
+	callers carry on without it instead of stalling.
+	"""
+	def __init__(self, host=None, port=None, db=0, max_connections=None, socket_timeout=None, connect_timeout=None):
+		self.host = host or os.environ.get('REDIS_HOSTNAME')
+		self.port = port or os.environ.get('REDIS_PORT')
+		self.db = db
+		self.max_connections = max_connections or (int(os.environ['CTS_REDIS_MAX_CONNECTIONS']) if os.environ.get('CTS_REDIS_MAX_CONNECTIONS') else None)
+		self.socket_timeout = socket_timeout or float(os.environ.get('CTS_REDIS_SOCKET_TIMEOUT', 1.0))
+		self.connect_timeout = connect_timeout or float(os.environ.get('CTS_REDIS_CONNECT_TIMEOUT', 0.5))
+		self.client = None
+		self.lock = threading.Lock()
+
+	def get_client(self):
+		"""
+		Returns the shared client, creating it (and its pool) if needed.
+		No connection is made until it's used.
+		"""
+		if self.client is not None:
+			return self.client
+		with self.lock:
+			if self.client is None:
+				kwargs = {'host': self.host or 'localhost', 'port': self.port or 6379, 'db': self.db,
+					'socket_timeout': self.socket_timeout, 'socket_connect_timeout': self.connect_timeout}
+				if self.max_connections:
+					kwargs['max_connections'] = self.max_connections
+				self.client = redis.StrictRedis(connection_pool=redis.ConnectionPool(**kwargs))
+		return self.client
+
+	def close(self):
+		"""
+		Disconnects the pool's connections.
+		"""
+		with self.lock:
+			if self.client is not None:
+				self.client.connection_pool.disconnect()
+				self.client = None
+
+
+
+pool = RedisPool()
+
+
+
+def get_redis():
+	"""
+	Returns the process's shared redis client.
+	"""
+	return pool.get_client()
+
+
+def get_many(keys, redis_conn=None):
+	"""
+	Gets keys in one pipelined round trip. Returns a list of values
+	(None for missing keys), or all None if redis is unavailable.
+	"""
+	if not keys:
+		return []
+	redis_conn = redis_conn or get_redis()
+	try:
+		pipe = redis_conn.pipeline(transaction=False)
+		for key in keys:
+			pipe.get(key)
+		return pipe.execute()
+	except Exception as e:
+		logging.warning("Unable to get keys from redis: {}".format(e))
+		return [None] * len(keys)
+
+
+def set_many(mapping, ex=None, redis_conn=None):
+	"""
+	Sets {key: value} in one pipelined round trip, with an optional
+	expiration in seconds. Returns False if redis is unavailable.
+	"""
+	if not mapping:
+		return True
+	redis_conn = redis_conn or get_redis()
+	try:
+		pipe = redis_conn.pipeline(transaction=False)
+		for key, value in mapping.items():
+			pipe.set(key, value, ex=ex)
+		pipe.execute()
+		return True
+	except Exception as e:
+		logging.warning("Unable to set keys in redis: {}".format(e))
+		return False
@@ -0,0 +1,112 @@
+"""
+Per-call request state for calculators.
+
+Calculators kept per-request values (results, the melting point sent
+with EPI/SPARC requests, TEST's method, metabolizer node counters) on
+the instance, so one calculator couldn't serve concurrent requests.
+Those attributes are RequestAttributes now: each data request handler
+call (see bound) gets its own RequestContext that holds them, so threads
+and tasks sharing a calculator don't see each other's values. Outside a
+handler call they're plain instance attributes, as before.
+
+The context lives in a contextvar like the request deadline, so it
+follows the call into run_sync's thread pool and asyncio tasks.
+"""
+
+import copy
+import asyncio
+import functools
+import contextlib
+import contextvars
+
+
+
+_current = contextvars.ContextVar('cts_request_context', default=None)
+
+
+
+class RequestContext(object):
+	"""
+	Request state for one handler call, per calculator instance.
+	"""
+	def __init__(self):
+		self.state = {}  # id(calculator) -> (calculator, {attribute name: value})
+
+	def get_state(self, instance):
+		entry = self.state.get(id(instance))
+		if entry is None:
+			entry = self.state[id(instance)] = (instance, {})  # keeps instance alive, so its id isn't reused
+		return entry[1]
+
+
+
+class RequestAttribute(object):
+	"""
+	Descriptor for per-request calculator state. Values are kept in the
+	current RequestContext if there is one, otherwise on the instance.
+	A call starts from a (shallow) copy of the instance's value.
+	"""
+	def __init__(self, default=None):
+		self.default = default
+		self.name = None
+
+	def __set_name__(self, owner, name):
+		self.name = name
+
+	def __get__(self, instance, owner=None):
+		if instance is None:
+			return self
+		value = instance.__dict__.get(self.name, self.default)
+		context = _current.get()
+		if context is None:
+			return value
+		state = context.get_state(instance)
+		if not self.name in state:
+			state[self.name] = copy.copy(value)
+		return state[self.name]
+
+	def __set__(self, instance, value):
+		context = _current.get()
+		if context is None:
+			instance.__dict__[self.name] = value
+		else:
+			context.get_state(instance)[self.name] = value
+
+
+
+def current():
+	"""
+	Returns the current RequestContext, or None.
+	"""
+	return _current.get()
+
+
+@contextlib.contextmanager
+def scope():
+	"""
+	Runs the block in a new RequestContext.
+	"""
+	token = _current.set(RequestContext())
+	try:
+		yield
+	finally:
+		_current.reset(token)
+
+
+def bound(func):
+	"""
+	Decorator for data request handlers (sync or async), which
+	runs each call in its own RequestContext.
+	"""
+	if asyncio.iscoroutinefunction(func):
+		@functools.wraps(func)
+		async def async_wrapper(*args, **kwargs):
+			with scope():
+				return await func(*args, **kwargs)
+		return async_wrapper
+
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		with scope():
+			return func(*args, **kwargs)
+	return wrapper
@@ -0,0 +1,59 @@
+"""
+Exceptions raised by CTS's request handling instead of making a backend request.
+
+They subclass requests' exceptions, so calculators handle them like
+the backend errors they stand in for (e.g., a CircuitOpenError like
+an unreachable server). Defining them imports requests, so the modules
+that raise them import this module lazily (see lazy_imports), and
+importing the calculators doesn't import requests.
+None of them are retried (see retry_policy).
+"""
+
+import requests
+
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+	"""
+	Raised instead of making a request once the request's deadline
+	has passed (see deadline). Not retried.
+	"""
+	retryable = False
+
+
+
+class DispatchTimeout(requests.exceptions.ConnectionError):
+	"""
+	Raised when a request waited too long for a dispatch slot (see dispatcher).
+	"""
+	retryable = False
+
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+	"""
+	Raised instead of making a request to a backend whose circuit
+	is open (see circuit_breaker). It's a ConnectionError, so calculators
+	handle it like an unreachable server, but it isn't retried.
+	"""
+	retryable = False
+
+
+
+class ConcurrencyLimitError(requests.exceptions.ConnectionError):
+	"""
+	Raised when a request couldn't get a slot under the backend's
+	concurrency limit in time (see concurrency_limiter). Not retried,
+	the backend's already busy.
+	"""
+	retryable = False
+
+
+
+class RateLimitExceeded(requests.exceptions.ConnectionError):
+	"""
+	Raised when a request would have to wait longer than max_wait
+	for a token (see rate_limiter). Not retried, retrying only adds
+	to the backlog.
+	"""
+	retryable = False
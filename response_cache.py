@@ -0,0 +1,173 @@
+"""
+Read-through cache for Calculator.web_call responses (jchem detail,
+mass and image requests, CTSWS standardizer actions, etc.).
+
+Responses are cached as JSON, keyed on endpoint and canonical request
+payload, in an in-process LRU that evicts by total size in bytes, and
+optionally (CTS_RESPONSE_CACHE_REDIS) in redis so workers share them.
+Each endpoint can have its own TTL, and a TTL of 0 turns caching off
+for that endpoint. Only valid responses are cached.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+import collections
+from urllib.parse import urlparse
+from .single_flight import canonicalize
+from . import json_codec
+
+
+
+class LRUCache(object):
+	"""
+	Thread-safe LRU cache of strings with TTLs, limited by total bytes.
+	"""
+	def __init__(self, max_bytes):
+		self.max_bytes = max_bytes
+		self.entries = collections.OrderedDict()  # key -> (value, size, expires_at)
+		self.size = 0
+		self.lock = threading.Lock()
+
+	def get(self, key):
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is None:
+				return None
+			if entry[2] <= time.time():
+				self.remove(key)
+				return None
+			self.entries.move_to_end(key)
+			return entry[0]
+
+	def set(self, key, value, ttl):
+		size = len(key) + len(value.encode('utf-8'))
+		if size > self.max_bytes:
+			return
+		with self.lock:
+			if key in self.entries:
+				self.remove(key)
+			self.entries[key] = (value, size, time.time() + ttl)
+			self.size += size
+			while self.size > self.max_bytes:
+				self.remove(next(iter(self.entries)))
+
+	def remove(self, key):
+		"""
+		Removes an entry, caller holds the lock.
+		"""
+		entry = self.entries.pop(key)
+		self.size -= entry[1]
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.size = 0
+
+	def __len__(self):
+		return len(self.entries)
+
+
+
+class ResponseCache(object):
+	"""
+	Two-tier (in-process LRU, optional redis) response cache.
+	Inputs:
+	  + enabled - cache on/off (CTS_RESPONSE_CACHE, on by default).
+	  + max_bytes - size limit of the in-process tier.
+	  + max_item_bytes - larger responses aren't cached.
+	  + default_ttl - seconds responses are cached for, unless set in ttls.
+	  + ttls - {endpoint path: ttl}, can be set with CTS_RESPONSE_CACHE_TTLS (JSON).
+	  + use_redis - shares cached responses between workers through redis.
+	"""
+	key_prefix = "cts_response"
+
+	def __init__(self, enabled=None, max_bytes=None, max_item_bytes=None, default_ttl=None, ttls=None, use_redis=None):
+		if enabled is None:
+			enabled = os.environ.get('CTS_RESPONSE_CACHE', 'true').lower() == 'true'
+		if use_redis is None:
+			use_redis = os.environ.get('CTS_RESPONSE_CACHE_REDIS', 'false').lower() == 'true'
+		self.enabled = enabled
+		self.use_redis = use_redis
+		self.max_item_bytes = max_item_bytes or int(os.environ.get('CTS_RESPONSE_CACHE_MAX_ITEM_BYTES', 1024 * 1024))
+		self.default_ttl = default_ttl if default_ttl is not None else int(os.environ.get('CTS_RESPONSE_CACHE_TTL', 3600))
+		self.ttls = {
+			'/ctsws/rest/metabolizer': 0,  # large trees, not worth caching per request
+		}
+		if os.environ.get('CTS_RESPONSE_CACHE_TTLS'):
+			self.ttls.update(json_codec.loads(os.environ['CTS_RESPONSE_CACHE_TTLS']))
+		self.ttls.update(ttls or {})
+		self.local = LRUCache(max_bytes or int(os.environ.get('CTS_RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+		self.hits = 0
+		self.misses = 0
+
+	def get_ttl(self, url):
+		"""
+		Returns TTL (seconds) for url's endpoint, 0 if it isn't cached.
+		"""
+		if not self.enabled:
+			return 0
+		return self.ttls.get(urlparse(url).path, self.default_ttl)
+
+	def make_key(self, url, data):
+		parsed = urlparse(url)
+		digest = hashlib.sha1(canonicalize(data).encode('utf-8')).hexdigest()
+		return "{}:{}{}:{}".format(self.key_prefix, parsed.netloc, parsed.path, digest)
+
+	def get(self, url, data, redis_conn=None):
+		"""
+		Returns cached response for url and data, or None.
+		"""
+		if not self.get_ttl(url):
+			return None
+		key = self.make_key(url, data)
+
+		value = self.local.get(key)
+
+		if value is None and self.use_redis and redis_conn is not None:
+			try:
+				value = redis_conn.get(key)
+			except Exception as e:
+				logging.warning("Unable to get cached response from redis: {}".format(e))
+			if value is not None:
+				value = value.decode('utf-8') if isinstance(value, bytes) else value
+				self.local.set(key, value, self.get_ttl(url))
+
+		if value is None:
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		return json_codec.loads(value)
+
+	def set(self, url, data, response, redis_conn=None):
+		"""
+		Caches a valid response for url and data.
+		"""
+		ttl = self.get_ttl(url)
+		if not ttl:
+			return
+		value = json_codec.dumps(response)
+		if len(value.encode('utf-8')) > self.max_item_bytes:
+			return
+		key = self.make_key(url, data)
+		self.local.set(key, value, ttl)
+		if self.use_redis and redis_conn is not None:
+			try:
+				redis_conn.set(key, value, ex=ttl)
+			except Exception as e:
+				logging.warning("Unable to cache response in redis: {}".format(e))
+
+	def get_stats(self):
+		return {
+			'hits': self.hits,
+			'misses': self.misses,
+			'entries': len(self.local),
+			'bytes': self.local.size
+		}
+
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,207 @@
+"""
+Shared retry handling for CTS backend calls.
+
+Retries use exponential backoff with full jitter, an optional cap
+on total elapsed time, and a per-backend retry budget that keeps
+retries to a fraction of that backend's recent traffic, so a
+struggling server doesn't get its load multiplied by retries.
+"""
+
+import os
+import time
+import asyncio
+import random
+import logging
+import threading
+import collections
+from . import lazy_imports
+
+requests = lazy_imports.module('requests')  # imported when a request fails
+
+
+
+class RetryError(Exception):
+	"""
+	Raised when a request didn't succeed within the retry policy.
+	Holds the last response (if one came back) and the last exception.
+	"""
+	def __init__(self, message, response=None, exception=None):
+		Exception.__init__(self, message)
+		self.response = response
+		self.exception = exception
+
+
+
+class RetryBudget(object):
+	"""
+	Sliding-window retry budget for a backend. Retries are allowed while
+	they're below min_retries + ratio * requests made in the last window seconds.
+	"""
+	def __init__(self, ratio=None, min_retries=None, window=None):
+		self.ratio = ratio if ratio is not None else float(os.environ.get('CTS_RETRY_BUDGET_RATIO', 0.2))
+		self.min_retries = min_retries if min_retries is not None else int(os.environ.get('CTS_RETRY_BUDGET_MIN', 10))
+		self.window = window or float(os.environ.get('CTS_RETRY_BUDGET_WINDOW', 10.0))  # seconds
+		self.requests = collections.deque()  # timestamps of first attempts
+		self.retries = collections.deque()  # timestamps of retries
+		self.lock = threading.Lock()
+
+	def prune(self, now):
+		while self.requests and now - self.requests[0] > self.window:
+			self.requests.popleft()
+		while self.retries and now - self.retries[0] > self.window:
+			self.retries.popleft()
+
+	def record_request(self):
+		with self.lock:
+			now = time.time()
+			self.prune(now)
+			self.requests.append(now)
+
+	def try_retry(self):
+		"""
+		Returns True and spends a retry if the budget allows one.
+		"""
+		with self.lock:
+			now = time.time()
+			self.prune(now)
+			if len(self.retries) >= self.min_retries + self.ratio * len(self.requests):
+				return False
+			self.retries.append(now)
+			return True
+
+
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def get_budget(backend):
+	"""
+	Returns the shared retry budget for a backend key (e.g., host url).
+	"""
+	budget = _budgets.get(backend)
+	if budget:
+		return budget
+	with _budgets_lock:
+		if not backend in _budgets:
+			_budgets[backend] = RetryBudget()
+		return _budgets[backend]
+
+
+def is_valid_status(response):
+	"""
+	Default response check, which retries server errors (5xx) only.
+	"""
+	status = getattr(response, 'status_code', None)
+	if isinstance(status, int) and status >= 500:
+		return False
+	return True
+
+
+
+class RetryPolicy(object):
+	"""
+	Retry policy for a backend request.
+	Inputs:
+	  + max_attempts - total number of tries, including the first.
+	  + base_delay - backoff delay (seconds) before the first retry, doubles each retry.
+	  + max_delay - upper limit for a single backoff delay.
+	  + max_elapsed - no retry is started after this many seconds (None for no limit).
+	  + budget - RetryBudget shared by all requests to a backend.
+	"""
+	def __init__(self, max_attempts=3, base_delay=None, max_delay=None, max_elapsed=None, budget=None):
+		self.max_attempts = max(1, int(max_attempts))
+		self.base_delay = base_delay if base_delay is not None else float(os.environ.get('CTS_RETRY_BASE_DELAY', 0.5))
+		self.max_delay = max_delay if max_delay is not None else float(os.environ.get('CTS_RETRY_MAX_DELAY', 10.0))
+		self.max_elapsed = max_elapsed
+		self.budget = budget
+
+	def get_delay(self, retry_num):
+		"""
+		Exponential backoff with full jitter for the nth retry (starting at 0).
+		"""
+		cap = min(self.max_delay, self.base_delay * (2 ** retry_num))
+		return random.uniform(0, cap)
+
+	def get_retry_delay(self, attempt, start_time, name=""):
+		"""
+		Returns the backoff delay before retry attempt (starting at 1),
+		or None if elapsed time or the retry budget don't allow it.
+		"""
+		delay = self.get_delay(attempt - 1)
+		if self.max_elapsed is not None and time.time() - start_time + delay > self.max_elapsed:
+			logging.warning("{} retries stopped, max elapsed time of {}s reached.".format(name, self.max_elapsed))
+			return None
+		if self.budget and not self.budget.try_retry():
+			logging.warning("{} retry budget spent, not retrying.".format(name))
+			return None
+		logging.info("Retrying {} request in {:.2f}s (attempt {} of {})..".format(name, delay, attempt + 1, self.max_attempts))
+		return delay
+
+	def run(self, send, validate=None, name=""):
+		"""
+		Calls send() until validate(response) is True.
+		Returns the valid response, or raises RetryError with the last
+		response/exception once attempts, elapsed time or budget run out.
+		"""
+		validate = validate or is_valid_status
+		start_time = time.time()
+		response, exception = None, None
+
+		if self.budget:
+			self.budget.record_request()
+
+		for attempt in range(self.max_attempts):
+
+			if attempt > 0:
+				delay = self.get_retry_delay(attempt, start_time, name)
+				if delay is None:
+					break
+				time.sleep(delay)
+
+			try:
+				response, exception = send(), None
+			except requests.exceptions.RequestException as e:
+				logging.warning("Exception requesting {}: {}".format(name, e))
+				response, exception = None, e
+				if not getattr(e, 'retryable', True):
+					break  # e.g., open circuit, fail fast
+				continue
+
+			if validate(response):
+				return response
+
+		raise RetryError("{} request failed after retries".format(name), response, exception)
+
+	async def run_async(self, send, validate=None, name=""):
+		"""
+		Async version of run(), where send is a coroutine function.
+		"""
+		validate = validate or is_valid_status
+		start_time = time.time()
+		response, exception = None, None
+
+		if self.budget:
+			self.budget.record_request()
+
+		for attempt in range(self.max_attempts):
+
+			if attempt > 0:
+				delay = self.get_retry_delay(attempt, start_time, name)
+				if delay is None:
+					break
+				await asyncio.sleep(delay)
+
+			try:
+				response, exception = await send(), None
+			except requests.exceptions.RequestException as e:
+				logging.warning("Exception requesting {}: {}".format(name, e))
+				response, exception = None, e
+				if not getattr(e, 'retryable', True):
+					break  # e.g., open circuit, fail fast
+				continue
+
+			if validate(response):
+				return response
+
+		raise RetryError("{} request failed after retries".format(name), response, exception)
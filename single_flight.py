@@ -0,0 +1,231 @@
+"""
+Single-flight coalescing of identical backend calls.
+
+Concurrent requests for the same chemical, and gentrans trees with
+repeated products, make the same backend call at the same time. The
+first caller for a key (URL + canonical payload) makes the call, and
+duplicates that come in while it's in flight wait for its result.
+Calls are coalesced within the process, and optionally
+(CTS_SINGLE_FLIGHT_REDIS) across workers with a redis lock, where the
+leader shares its JSON result through redis for a few seconds.
+"""
+
+import os
+import copy
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from . import deadline
+from . import json_codec
+
+
+
+def canonicalize(payload):
+	"""
+	Returns payload as a canonical JSON string (sorted keys), so
+	equivalent payloads get the same key. JSON strings are parsed first.
+	"""
+	if isinstance(payload, bytes):
+		payload = payload.decode('utf-8', errors='replace')
+	if isinstance(payload, str):
+		try:
+			payload = json_codec.loads(payload)
+		except ValueError:
+			return payload
+	return json_codec.dumps(payload, sort_keys=True, default=str)
+
+
+def make_key(method, url, payload=None, params=None):
+	"""
+	Returns single-flight key for a request.
+	"""
+	digest = hashlib.sha1("{}|{}".format(canonicalize(payload), canonicalize(params)).encode('utf-8')).hexdigest()
+	return "{}:{}:{}".format(method, url, digest)
+
+
+
+class Call(object):
+	"""
+	An in-flight call that duplicate callers wait on.
+	"""
+	def __init__(self):
+		self.event = threading.Event()
+		self.future = None  # for do_async
+		self.result = None
+		self.exception = None
+		self.followers = 0
+
+
+
+class SingleFlight(object):
+	"""
+	Coalesces concurrent calls with the same key.
+	Inputs:
+	  + enabled - coalescing on/off (CTS_SINGLE_FLIGHT, on by default).
+	  + use_redis - also coalesce across workers with redis (CTS_SINGLE_FLIGHT_REDIS).
+	  + lock_ttl - seconds a worker's redis lock lasts if it never finishes.
+	  + result_ttl - seconds a leader's result is kept in redis for followers.
+	  + wait_timeout - seconds a follower in another worker waits before making the call itself.
+	"""
+	key_prefix = "cts_singleflight"
+
+	def __init__(self, enabled=None, use_redis=None, lock_ttl=None, result_ttl=None, wait_timeout=None):
+		if enabled is None:
+			enabled = os.environ.get('CTS_SINGLE_FLIGHT', 'true').lower() == 'true'
+		if use_redis is None:
+			use_redis = os.environ.get('CTS_SINGLE_FLIGHT_REDIS', 'false').lower() == 'true'
+		self.enabled = enabled
+		self.use_redis = use_redis
+		self.lock_ttl = lock_ttl or int(os.environ.get('CTS_SINGLE_FLIGHT_LOCK_TTL', 120))
+		self.result_ttl = result_ttl or int(os.environ.get('CTS_SINGLE_FLIGHT_RESULT_TTL', 5))
+		self.wait_timeout = wait_timeout or float(os.environ.get('CTS_SINGLE_FLIGHT_WAIT', 30))
+		self.poll_interval = 0.05
+		self.calls = {}  # key -> Call
+		self.futures = {}  # (loop id, key) -> Call with an asyncio.Future
+		self.lock = threading.Lock()
+
+	def copy(self, result):
+		"""
+		Followers get their own copy of dict/list results, since
+		callers tend to update them. The leader's result is copied once
+		before it's handed back (the leader's caller can update it right
+		away), and each follower copies that snapshot.
+		"""
+		if isinstance(result, (dict, list)):
+			return copy.deepcopy(result)
+		return result
+
+	def do(self, key, func):
+		"""
+		Returns func()'s result, or the result of an identical
+		call that's already in flight.
+		"""
+		if not self.enabled:
+			return func()
+
+		with self.lock:
+			call = self.calls.get(key)
+			is_leader = call is None
+			if is_leader:
+				call = Call()
+				self.calls[key] = call
+			else:
+				call.followers += 1
+
+		if not is_leader:
+			logging.info("Waiting on in-flight call for {}".format(key))
+			if not call.event.wait(deadline.get_timeout(None)):
+				raise deadline.DeadlineExceeded("Request deadline exceeded waiting on {}".format(key))
+			if call.exception is not None:
+				raise call.exception
+			return self.copy(call.result)
+
+		result = None
+		try:
+			result = func()
+			return result
+		except BaseException as e:
+			call.exception = e
+			raise
+		finally:
+			with self.lock:
+				del self.calls[key]  # no followers join after this
+			if call.followers:
+				call.result = self.copy(result)
+			call.event.set()
+
+	def do_distributed(self, key, func, redis_conn):
+		"""
+		Like do(), but also coalesces with other workers through redis when
+		use_redis is set. func's result must be JSON serializable.
+		"""
+		if not self.use_redis or redis_conn is None:
+			return self.do(key, func)
+		return self.do(key, lambda: self.do_redis(key, func, redis_conn))
+
+	def do_redis(self, key, func, redis_conn):
+		lock_key = "{}:{}".format(self.key_prefix, key)
+		result_key = lock_key + ":result"
+
+		try:
+			result = redis_conn.get(result_key)
+			if result is not None:
+				return json_codec.loads(result)  # leader finished a moment ago
+			is_leader = redis_conn.set(lock_key, 1, nx=True, ex=self.lock_ttl)
+		except Exception as e:
+			logging.warning("Unable to use redis single-flight lock for {}: {}".format(key, e))
+			return func()
+
+		if is_leader:
+			try:
+				result = func()
+				try:
+					redis_conn.set(result_key, json_codec.dumps(result), ex=self.result_ttl)
+				except Exception as e:
+					logging.warning("Unable to share single-flight result for {}: {}".format(key, e))
+				return result
+			finally:
+				try:
+					redis_conn.delete(lock_key)
+				except Exception as e:
+					logging.warning("Unable to release single-flight lock for {}: {}".format(key, e))
+
+		logging.info("Waiting on another worker's call for {}".format(key))
+		wait_until = time.time() + deadline.get_timeout(self.wait_timeout)
+		try:
+			while time.time() < wait_until:
+				result = redis_conn.get(result_key)
+				if result is not None:
+					return json_codec.loads(result)
+				if not redis_conn.exists(lock_key):
+					break  # leader failed or its result expired
+				time.sleep(self.poll_interval)
+		except Exception as e:
+			logging.warning("Unable to get single-flight result for {}: {}".format(key, e))
+
+		deadline.check()
+		return func()
+
+	async def do_async(self, key, func):
+		"""
+		Async version of do() (in-process only), where func is a
+		coroutine function. Calls are coalesced per event loop.
+		"""
+		if not self.enabled:
+			return await func()
+
+		loop = asyncio.get_running_loop()
+		loop_key = (id(loop), key)
+		call = self.futures.get(loop_key)
+
+		if call is not None:
+			logging.info("Waiting on in-flight call for {}".format(key))
+			call.followers += 1
+			try:
+				result = await asyncio.wait_for(asyncio.shield(call.future), deadline.get_timeout(None))
+			except asyncio.TimeoutError:
+				raise deadline.DeadlineExceeded("Request deadline exceeded waiting on {}".format(key))
+			return self.copy(result)
+
+		call = Call()
+		future = call.future = loop.create_future()
+		self.futures[loop_key] = call
+		try:
+			result = await func()
+			future.set_result(self.copy(result) if call.followers else result)
+			return result
+		except asyncio.CancelledError:
+			future.cancel()
+			raise
+		except BaseException as e:
+			future.set_exception(e)
+			future.exception()  # marks it retrieved if nobody was waiting
+			raise
+		finally:
+			del self.futures[loop_key]
+
+
+
+single_flight = SingleFlight()
@@ -1,9 +1,11 @@
-import requests
-import json
 import logging
 import os
 from .calculator import Calculator
 from .jchem_properties import Tautomerization, ElementalAnalysis
+from .negative_cache import negative_cache
+from . import json_codec
+from . import calculator_pool
+from .templates import Template
 
 
 
@@ -13,17 +15,18 @@ class SMILESFilter(object):
 	clumped in with other classes related to chem info.
 	"""
 
+	excludestring = Template([".","[Ag]","[Al]","[As","[As+","[Au]","[B]","[B-]","[Br-]","[Ca]",
+					"[Ca+","[Cl-]","[Co]","[Co+","[Fe]","[Fe+","[Hg]","[K]","[K+","[Li]",
+					"[Li+","[Mg]","[Mg+","[Na]","[Na+","[Pb]","[Pb2+]","[Pb+","[Pt]",
+					"[Sc]","[Si]","[Si+","[SiH]","[Sn]","[W]"])
+	return_val = Template({
+		"valid" : False,
+		"smiles": "",
+		"processedsmiles" : ""
+	})
+
 	def __init__(self):
 		self.max_weight = 1500  # max weight [g/mol] for epi, test, and sparc
-		self.excludestring = [".","[Ag]","[Al]","[As","[As+","[Au]","[B]","[B-]","[Br-]","[Ca]",
-						"[Ca+","[Cl-]","[Co]","[Co+","[Fe]","[Fe+","[Hg]","[K]","[K+","[Li]",
-						"[Li+","[Mg]","[Mg+","[Na]","[Na+","[Pb]","[Pb2+]","[Pb+","[Pt]",
-						"[Sc]","[Si]","[Si+","[SiH]","[Sn]","[W]"]
-		self.return_val = {
-			"valid" : False,
-			"smiles": "",
-			"processedsmiles" : ""
-		}
 		self.baseUrl = os.environ['CTS_EFS_SERVER']
 		self.is_valid_url = self.baseUrl + '/ctsws/rest/isvalidchemical'
 
@@ -32,10 +35,12 @@ class SMILESFilter(object):
 	def is_valid_smiles(self, smiles):
 		"""
 		Makes request to ctsws /isvalidchemical endpoint to check
-		if user smiles is valid. Returns boolean.
+		if user smiles is valid, with retries and CTSWS's circuit
+		breaker (see Calculator.request_with_retries). Returns boolean.
 		"""
-		is_valid_response = requests.post(self.is_valid_url, data=json.dumps({'smiles': smiles}), headers={'Content-Type': 'application/json'}, timeout=5)
-		is_valid = json.loads(is_valid_response.content).get('result')  # result should be "true" or "false"
+		calc = calculator_pool.get_instance(Calculator)
+		is_valid_response = calc.request_with_retries('POST', self.is_valid_url, data=json_codec.dumps({'smiles': smiles}), headers={'Content-Type': 'application/json'}, timeout=5)
+		is_valid = json_codec.loads(is_valid_response.content).get('result')  # result should be "true" or "false"
 		if is_valid == "true":
 			return True
 		else:
@@ -51,7 +56,7 @@ class SMILESFilter(object):
 		"""
 
 		# Makes request to get chemical composition:
-		analysis_class = ElementalAnalysis()
+		analysis_class = calculator_pool.get_instance(ElementalAnalysis)
 		analysis_class.make_data_request(smiles, analysis_class)  # sets 'results' attr to json object of response
 		chemical_composition = analysis_class.get_elemental_analysis()  # returns list of chemical components
 
@@ -85,17 +90,33 @@ class SMILESFilter(object):
 		Calls single EFS Standardizer filter
 		for filtering SMILES
 		"""
-		smiles = request_obj.get('smiles')
-		action = request_obj.get('action')
+		calc = calculator_pool.get_instance(Calculator)
+		url = calc.efs_server_url + calc.efs_standardizer_endpoint
+		return calc.web_call(url, self.get_filter_post(request_obj))
+
+
+
+	async def singleFilter_async(self, request_obj):
+		"""
+		Async version of singleFilter.
+		"""
+		calc = calculator_pool.get_instance(Calculator)
+		url = calc.efs_server_url + calc.efs_standardizer_endpoint
+		return await calc.web_call_async(url, self.get_filter_post(request_obj))
+
+
+
+	def get_filter_post(self, request_obj):
+		"""
+		POST data for a single EFS Standardizer action.
+		"""
 		post_data = {
-			"structure": smiles,
+			"structure": request_obj.get('smiles'),
 			"actions": [
-				action
+				request_obj.get('action')
 			]
 		}
-		calc = Calculator()
-		url = calc.efs_server_url + calc.efs_standardizer_endpoint
-		return calc.web_call(url, post_data)
+		return post_data
 
 
 
@@ -105,7 +126,7 @@ class SMILESFilter(object):
 		smiles processing before being sent to
 		p-chem calculators
 		"""
-		calc_object = Calculator()
+		calc_object = calculator_pool.get_instance(Calculator)
 
 		# Performs carbon check (but not for transformation products):
 		if not is_node and not self.check_for_carbon(smiles):
@@ -115,10 +136,16 @@ class SMILESFilter(object):
 		if not self.check_smiles_against_exludestring(smiles):
 			return {'error': "Chemical cannot be a salt or mixture"}
 
-		# Calls CTSWS /isvalidchemical endpoint:
+		# Calls CTSWS /isvalidchemical endpoint, unless it rejected the chemical recently:
+		rejection = negative_cache.get('smilesfilter', smiles, calc_object.redis_conn)
+		if rejection is not None:
+			return rejection
+
 		if not self.is_valid_smiles(smiles):
 			logging.warning("User chemical contains metals, sending error to client..")
-			return {'error': "Chemical cannot contain metals"}
+			rejection = {'error': "Chemical cannot contain metals"}
+			negative_cache.set('smilesfilter', smiles, rejection, calc_object.redis_conn)
+			return rejection
 
 		# Updated approach (todo: more efficient to have CTSWS use major taut instead of canonical)
 		# 1. CTSWS actions "removeExplicitH" and "transform".
@@ -172,10 +199,31 @@ class SMILESFilter(object):
 		than 1500 g/mol
 		"""
 		try:
-			json_obj = Calculator().getMass({'chemical': chemical}) # get mass from jchem ws
+			json_obj = calculator_pool.get_instance(Calculator).getMass({'chemical': chemical}) # get mass from jchem ws
 		except Exception as e:
 			logging.warning("!!! Error in checkMass() {} !!!".format(e))
 			raise e
+		return self.is_valid_mass(json_obj)
+
+
+
+	async def checkMass_async(self, chemical):
+		"""
+		Async version of checkMass.
+		"""
+		try:
+			json_obj = await calculator_pool.get_instance(Calculator).getMass_async({'chemical': chemical})
+		except Exception as e:
+			logging.warning("!!! Error in checkMass_async() {} !!!".format(e))
+			raise e
+		return self.is_valid_mass(json_obj)
+
+
+
+	def is_valid_mass(self, json_obj):
+		"""
+		Checks mass from jchem ws getMass response.
+		"""
 		struct_mass = json_obj['data'][0]['mass']
 
 		if struct_mass < 1500  and struct_mass > 0:
@@ -199,6 +247,20 @@ class SMILESFilter(object):
 
 
 
+	async def clearStereos_async(self, smiles):
+		"""
+		Async version of clearStereos.
+		"""
+		try:
+			response = await self.singleFilter_async({'smiles':smiles, 'action': "clearStereo"})
+			filtered_smiles = response['results']
+		except Exception as e:
+			logging.warning("!!! Error in clearStereos_async() {} !!!".format(e))
+			raise e
+		return filtered_smiles
+
+
+
 	def transformSMILES(self, smiles):
 		"""
 		N(=O)=O >> [N+](=O)[O-]
@@ -227,6 +289,20 @@ class SMILESFilter(object):
 
 
 
+	async def untransformSMILES_async(self, smiles):
+		"""
+		Async version of untransformSMILES.
+		"""
+		try:
+			response = await self.singleFilter_async({'smiles':smiles, 'action': "untransform"})
+			filtered_smiles = response['results']
+		except Exception as e:
+			logging.warning("!!! Error in untransformSMILES_async() {} !!!".format(e))
+			raise e
+		return filtered_smiles
+
+
+
 	def parseSmilesByCalculator(self, structure, calculator):
 		"""
 		Calculator-dependent SMILES filtering!
@@ -259,4 +335,30 @@ class SMILESFilter(object):
 				# raise Exception("{} cannot process metals..".format(calculator))
 				raise Exception({'data': "cannot process metals or charges"})
 
-		return filtered_smiles
\ No newline at end of file
+		return filtered_smiles
+
+
+	async def parseSmilesByCalculator_async(self, structure, calculator):
+		"""
+		Async version of parseSmilesByCalculator.
+		"""
+		filtered_smiles = structure
+
+		if calculator != 'chemaxon':
+			if not await self.checkMass_async(structure):
+				raise Exception({'data': "structure too large"})
+
+		if calculator == 'epi' or calculator == 'sparc' or calculator == 'measured':
+			try:
+				filtered_smiles = await self.clearStereos_async(structure)
+				filtered_smiles = str(filtered_smiles[-1])
+				filtered_smiles = str((await self.untransformSMILES_async(filtered_smiles))[-1])
+			except Exception as e:
+				logging.warning("!!! Error in parseSmilesByCalculator_async() {} !!!".format(e))
+				raise Exception({'data': "error filtering chemical"})
+
+		if calculator == 'epi' or calculator == 'measured':
+			if '[' in filtered_smiles or ']' in filtered_smiles:
+				raise Exception({'data': "cannot process metals or charges"})
+
+		return filtered_smiles
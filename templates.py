@@ -0,0 +1,58 @@
+"""
+Class-level defaults for calculators' dict/list attributes.
+
+Calculators, SMILES filters and jchem prop objects are created for
+every chemical and transformation product, and used to rebuild their
+request/response objects, prop maps and POST data defaults each time.
+Those are now Templates: the class keeps one frozen copy, and an
+instance gets its own copy the first time it uses the attribute, so
+constructing objects is cheap and changes stay with the instance.
+"""
+
+from types import MappingProxyType
+
+
+
+def freeze(value):
+	"""
+	Returns a read-only version of nested dicts (MappingProxyType) and lists (tuple).
+	"""
+	if isinstance(value, dict):
+		return MappingProxyType({key: freeze(val) for key, val in value.items()})
+	if isinstance(value, (list, tuple)):
+		return tuple(freeze(val) for val in value)
+	return value
+
+
+def thaw(value):
+	"""
+	Returns a mutable copy of a frozen value.
+	"""
+	if isinstance(value, MappingProxyType):
+		return {key: thaw(val) for key, val in value.items()}
+	if isinstance(value, tuple):
+		return [thaw(val) for val in value]
+	return value
+
+
+
+class Template(object):
+	"""
+	Descriptor for a class-level default dict/list. Getting it from the
+	class returns the frozen template, getting it from an instance copies
+	the template into the instance the first time (later gets and any
+	assignments use the instance's own attribute).
+	"""
+	def __init__(self, value):
+		self.value = freeze(value)
+		self.name = None
+
+	def __set_name__(self, owner, name):
+		self.name = name
+
+	def __get__(self, instance, owner=None):
+		if instance is None:
+			return self.value
+		value = thaw(self.value)
+		instance.__dict__[self.name] = value
+		return value
@@ -0,0 +1,131 @@
+"""
+Startup-time benchmark for CTS workers.
+
+Checks that importing calculator doesn't load any of the heavy
+dependencies (exits with an error if it does, so a regression is
+caught), then measures, each in a fresh interpreter (like a newly
+started celery worker), how long it takes to import the calculator
+modules and which heavy dependencies the import loaded, and the latency of a calculator's
+first request vs. a warm one (against a local stub server, so it's the
+client-side setup cost: sessions, policies, deferred imports, etc.).
+
+Usage: python benchmark_startup.py [runs]
+"""
+
+import os
+import sys
+import json
+import subprocess
+from tabulate import tabulate
+
+_path = os.path.dirname(os.path.abspath(__file__))
+_root = os.path.abspath(os.path.join(_path, "..", "..", "..", ".."))  # qed project's parent
+
+if 'cts_celery' in _path:
+	package = "qed.cts_celery.cts_calcs"
+else:
+	package = "qed.cts_app.cts_calcs"
+
+modules = ["calculator", "chemical_information", "calculator_epi", "calculator_test",
+	"calculator_opera", "calculator_chemaxon", "calculator_metabolizer", "mongodb_handler"]
+heavy_dependencies = ["requests", "redis", "pymongo", "bs4", "pytz", "aiohttp", "ijson", "orjson"]
+
+
+
+import_script = """
+import sys, time, json
+sys.path.insert(1, {root!r})
+start = time.perf_counter()
+import {package}.{module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+request_script = """
+import os, sys, time, json, threading, logging
+logging.disable(logging.WARNING)
+from http.server import HTTPServer, BaseHTTPRequestHandler
+sys.path.insert(1, {root!r})
+
+class Handler(BaseHTTPRequestHandler):
+	def do_POST(self):
+		self.rfile.read(int(self.headers.get('Content-Length', 0)))
+		body = b'{{"data": []}}'
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+	def log_message(self, *args):
+		pass
+
+server = HTTPServer(('127.0.0.1', 0), Handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+url = "http://127.0.0.1:{{}}/rest/data".format(server.server_port)
+os.environ.setdefault('CTS_EPI_SERVER', url)
+
+start = time.perf_counter()
+from {package}.calculator_epi import EpiCalc
+imported = time.perf_counter()
+calc = EpiCalc()
+calc.request_with_retries('POST', url, json={{"smiles": "CCC"}}, coalesce=False)
+first = time.perf_counter()
+calc.request_with_retries('POST', url, json={{"smiles": "CCCC"}}, coalesce=False)
+warm = time.perf_counter()
+server.shutdown()
+print(json.dumps({{"import": imported - start, "first": first - imported, "warm": warm - first}}))
+"""
+
+
+
+def run_script(script):
+	"""
+	Runs script in a new interpreter, returns its results (or None if it failed).
+	"""
+	process = subprocess.run([sys.executable, "-c", script], stdout=subprocess.PIPE,
+		env=dict(os.environ, CTS_RATE_LIMIT="false"))
+	if process.returncode != 0:
+		return None
+	return json.loads(process.stdout.decode('utf-8').strip().splitlines()[-1])
+
+
+def median(values):
+	values = sorted(values)
+	return values[len(values) // 2]
+
+
+def check_imports():
+	"""
+	Raises AssertionError if importing calculator loads a heavy dependency.
+	"""
+	results = run_script(import_script.format(root=_root, package=package, module="calculator", heavy=heavy_dependencies))
+	assert results is not None, "importing calculator failed"
+	assert not results['loaded'], "importing calculator loaded {}".format(", ".join(results['loaded']))
+
+
+def benchmark_imports(runs):
+	rows = []
+	for module in modules:
+		results = [run_script(import_script.format(root=_root, package=package, module=module, heavy=heavy_dependencies)) for _ in range(runs)]
+		if None in results:
+			rows.append([module, None, "import failed"])
+			continue
+		rows.append([module, round(median([r['seconds'] for r in results]) * 1000, 1), ", ".join(results[-1]['loaded'])])
+	return rows
+
+
+def benchmark_first_request(runs):
+	results = [run_script(request_script.format(root=_root, package=package)) for _ in range(runs)]
+	if None in results:
+		return [["request failed", None]]
+	return [[key, round(median([r[key] for r in results]) * 1000, 1)] for key in ["import", "first", "warm"]]
+
+
+
+if __name__ == '__main__':
+	runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+	check_imports()
+	print("Import time (median of {} fresh interpreters):".format(runs))
+	print(tabulate(benchmark_imports(runs), headers=["module", "ms", "dependencies loaded"], tablefmt='rst'))
+	print("\nEpiCalc first vs. warm request (median of {}):".format(runs))
+	print(tabulate(benchmark_first_request(runs), headers=["step", "ms"], tablefmt='rst'))
@@ -0,0 +1,70 @@
+"""
+Stand-ins for redis shared by the unit tests.
+"""
+
+
+
+class FakePipeline(object):
+	"""
+	Stand-in for redis pipelines, queues FakeRedis commands until
+	execute(), which counts as a round trip.
+	"""
+	def __init__(self, redis_conn):
+		self.redis_conn = redis_conn
+		self.commands = []
+
+	def __getattr__(self, name):
+		command = getattr(self.redis_conn, name)
+		return lambda *args, **kwargs: self.commands.append(lambda: command(*args, **kwargs))
+
+	def execute(self):
+		self.redis_conn.round_trips += 1
+		results = [command() for command in self.commands]
+		self.commands = []
+		return results
+
+
+
+class FakeRedis(object):
+	"""
+	Dict-backed stand-in for redis. Values are stored as bytes,
+	like redis returns them, and expirations are ignored.
+	"""
+	def __init__(self):
+		self.data = {}
+		self.sets = {}
+		self.round_trips = 0
+
+	def pipeline(self, transaction=True):
+		return FakePipeline(self)
+
+	def get(self, key):
+		return self.data.get(key)
+
+	def set(self, key, value, ex=None, nx=False):
+		if nx and key in self.data:
+			return None
+		self.data[key] = value if isinstance(value, bytes) else str(value).encode('utf-8')
+		return True
+
+	def exists(self, key):
+		return int(key in self.data)
+
+	def incr(self, key):
+		value = int(self.data.get(key, 0)) + 1
+		self.data[key] = str(value).encode('utf-8')
+		return value
+
+	def expire(self, key, seconds):
+		return True
+
+	def delete(self, *keys):
+		for key in keys:
+			self.data.pop(key, None)
+			self.sets.pop(key, None)
+
+	def sadd(self, key, value):
+		self.sets.setdefault(key, set()).add(value)
+
+	def sismember(self, key, value):
+		return value in self.sets.get(key, set())
@@ -93,7 +93,7 @@ class TestACTORWS(unittest.TestCase):
 		}
 		""")
 
-		with patch('qed.cts_app.cts_calcs.actorws.requests.get') as service_mock:
+		with patch('qed.cts_app.cts_calcs.actorws.http_sessions.get') as service_mock:
 
 			service_mock.return_value.content = json.dumps(expected_json)  # sets expected result from actorws GET request
 			service_mock.return_value.status_code = 200  # test function expects 200 status code
@@ -0,0 +1,220 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import tempfile
+from tabulate import tabulate
+from unittest.mock import patch
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.bloom_filter import BloomFilter, MembershipIndex
+	from qed.cts_celery.cts_calcs.tests.fakes import FakeRedis
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.bloom_filter import BloomFilter, MembershipIndex
+	from qed.cts_app.cts_calcs.tests.fakes import FakeRedis
+
+
+
+class FakeCursor(list):
+	def batch_size(self, size):
+		return self
+
+
+
+class FakeCollection(object):
+	"""
+	Stand-in for a pymongo collection's find and document count.
+	"""
+	def __init__(self, documents):
+		self.documents = documents
+
+	def estimated_document_count(self):
+		return len(self.documents)
+
+	def find(self, query_obj, projection=None):
+		return FakeCursor({key: val for key, val in document.items() if projection.get(key)} for document in self.documents)
+
+
+
+class ConcurrentWriteCollection(FakeCollection):
+	"""
+	FakeCollection where on_scan() runs (e.g., stores a document) once
+	the scan's cursor is past every document.
+	"""
+	def __init__(self, documents, on_scan):
+		FakeCollection.__init__(self, documents)
+		self.on_scan = on_scan
+
+	def find(self, query_obj, projection=None):
+		cursor = FakeCollection.find(self, query_obj, projection)
+		self.on_scan()
+		return cursor
+
+
+
+class TestBloomFilter(unittest.TestCase):
+	"""
+	Unit test class for bloom_filter module.
+	"""
+
+	print("cts bloom_filter unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for bloom_filter unit tests.
+		:return:
+		"""
+		self.collection = FakeCollection([
+			{'DTXCID': "DTXCID{}".format(i), 'DTXSID': "DTXSID{}".format(i), 'CASRN': "{}-00-0".format(i)} for i in range(5000)
+		])
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for bloom_filter unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_bloom_filter(self):
+		"""
+		Testing added items are always found, and others rarely are.
+		"""
+
+		print(">>> Running bloom_filter false positive rate unit test..")
+
+		bloom = BloomFilter.for_capacity(10000, 0.01)
+		for i in range(10000):
+			bloom.add("DTXSID{}".format(i))
+
+		missing = sum(1 for i in range(10000) if "DTXSID{}".format(i) not in bloom)
+		false_positives = sum(1 for i in range(10000, 20000) if "DTXSID{}".format(i) in bloom)
+
+		results = [missing, false_positives < 200, len(bloom)]
+		expected_results = [0, True, 10000]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_membership_index(self):
+		"""
+		Testing queries for values that aren't stored are definite misses,
+		and a built index is loaded by other workers from redis or disk.
+		"""
+
+		print(">>> Running bloom_filter membership index unit test..")
+
+		redis_conn = FakeRedis()
+		with tempfile.TemporaryDirectory() as bloom_dir:
+			path = os.path.join(bloom_dir, "dtxcid.bloom")
+			index = MembershipIndex('dtxcid', ["DTXCID", "DTXSID"], enabled=True, path=path, redis_conn=redis_conn)
+			before_build = index.might_contain({'DTXCID': "DTXCID999999"})
+			index.build(self.collection)
+			index.add({'DTXCID': "DTXCID999999"})
+
+			from_redis = MembershipIndex('dtxcid', ["DTXCID", "DTXSID"], enabled=True, redis_conn=redis_conn)
+			from_disk = MembershipIndex('dtxcid', ["DTXCID", "DTXSID"], enabled=True, path=path, redis_conn=FakeRedis())
+			loaded = [from_redis.load(), from_disk.load()]
+
+			results = [
+				before_build,
+				index.might_contain({'DTXCID': "DTXCID42"}),
+				index.might_contain({'DTXCID': "DTXCID42", 'DTXSID': "DTXSID_not_stored"}),
+				index.might_contain({'CASRN': "50-78-2"}),  # not indexed
+				index.might_contain({'DTXCID': "DTXCID999999"}),
+				loaded,
+				[from_redis.might_contain({'DTXSID': "DTXSID4999"}), from_disk.might_contain({'DTXSID': "DTXSID4999"})],
+				from_redis.built_at == index.built_at
+			]
+		expected_results = [True, True, False, True, True, [True, True], [True, True], True]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_writes_during_and_after_build(self):
+		"""
+		Testing documents stored while a build scans, and documents other
+		workers store after it, are never ruled out.
+		"""
+
+		print(">>> Running bloom_filter concurrent writes unit test..")
+
+		redis_conn = FakeRedis()
+		index = MembershipIndex('pchem', ["dsstoxSubstanceId"], enabled=True, redis_conn=redis_conn)
+		other_worker = MembershipIndex('pchem', ["dsstoxSubstanceId"], enabled=True, redis_conn=redis_conn)
+		collection = ConcurrentWriteCollection([{'dsstoxSubstanceId': "DTXSID{}".format(i)} for i in range(5000)],
+			lambda: index.add({'dsstoxSubstanceId': "DTXSID_during_build"}))
+
+		index.build(collection)
+		other_worker.load()
+		index.add({'dsstoxSubstanceId': "DTXSID_after_build"})
+
+		results = [
+			index.might_contain({'dsstoxSubstanceId': "DTXSID_during_build"}),
+			other_worker.might_contain({'dsstoxSubstanceId': "DTXSID_during_build"}),
+			other_worker.might_contain({'dsstoxSubstanceId': "DTXSID_after_build"}),
+			other_worker.might_contain({'dsstoxSubstanceId': "DTXSID_not_stored"}),
+			index.pending
+		]
+		expected_results = [True, True, True, False, None]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_enabled(self):
+		"""
+		Testing indexes of collections other code writes to are off
+		unless turned on, and CTS_BLOOM_INDEX=false turns all of them off.
+		"""
+
+		print(">>> Running bloom_filter enabled unit test..")
+
+		results = []
+		for env in [{}, {'CTS_BLOOM_DTXCID_INDEX': "true"}, {'CTS_BLOOM_INDEX': "false"}]:
+			with patch.dict(os.environ, env):
+				results.append([MembershipIndex('pchem', ["dsstoxSubstanceId"]).enabled,
+					MembershipIndex('dtxcid', ["DTXCID"], default_enabled=False).enabled])
+		expected_results = [[True, False], [True, True], [False, False]]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
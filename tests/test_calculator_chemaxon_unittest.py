@@ -83,7 +83,7 @@ class TestChemaxonCalculator(unittest.TestCase):
 
 
 
-	@patch('qed.cts_app.cts_calcs.calculator_chemaxon.requests.post')
+	@patch('qed.cts_app.cts_calcs.calculator.http_sessions.post')
 	@patch('qed.cts_app.cts_calcs.calculator_chemaxon.JchemProperty.getJchemPropData')
 	@patch('qed.cts_app.cts_calcs.calculator_chemaxon.SMILESFilter.parseSmilesByCalculator')
 	def test_data_request_handler(self, smiles_filter_mock, pchem_mock, speciation_mock):
@@ -162,7 +162,7 @@ class TestEpiCalculator(unittest.TestCase):
 
 
 	@patch('qed.cts_app.cts_calcs.calculator_epi.EpiCalc.validate_response')
-	@patch('qed.cts_app.cts_calcs.calculator_epi.requests.post')	
+	@patch('qed.cts_app.cts_calcs.calculator.http_sessions.post')	
 	def test_request_logic(self, request_mock, validate_mock):
 		"""
 		Testing EPI Suite's request_logic function.
@@ -116,7 +116,7 @@ class TestMeasuredCalculator(unittest.TestCase):
 
 		expected_result = {'test': True} # expected function result
 
-		with patch('qed.cts_app.cts_calcs.calculator_measured.requests.post') as service_mock:
+		with patch('qed.cts_app.cts_calcs.calculator.http_sessions.post') as service_mock:
 			service_mock.return_value = expected_result
 			response = self.calc_obj.makeDataRequest(self.test_smiles)
 
@@ -134,7 +134,7 @@ class TestMeasuredCalculator(unittest.TestCase):
 
 
 	@patch('qed.cts_app.cts_calcs.calculator_measured.MeasuredCalc.validate_response')
-	@patch('qed.cts_app.cts_calcs.calculator_measured.requests.post')	
+	@patch('qed.cts_app.cts_calcs.calculator.http_sessions.post')	
 	def test_request_logic(self, request_mock, validate_mock):
 		"""
 		Testing Measured's request_logic function.
@@ -350,10 +350,10 @@ class TestCalculators(unittest.TestCase):
 		expected_json = self.get_example_result_json("get_chemical_type")  # gets expected response json for mock requests.post
 		expected_response = {'type': "smiles"}  # expected response from test function
 
-		# Testing function with a mock of requests.post, which is used by test function:
-		with patch('qed.cts_app.cts_calcs.calculator.requests.post') as service_mock:
+		# Testing function with a mock of http_sessions.post, which is used by test function:
+		with patch('qed.cts_app.cts_calcs.calculator.http_sessions.post') as service_mock:
 
-			# Sets requests.post mock to return expected response content when test function calls it:
+			# Sets http_sessions.post mock to return expected response content when test function calls it:
 			service_mock.return_value.content = json.dumps(expected_json)
 
 			# Calls test function, which will use the mock web_call for unit testing:
@@ -460,13 +460,13 @@ class TestCalculators(unittest.TestCase):
 		mock_object = {'test': True}  # mock response from requests.post in test function
 		expected_response = {'test': True}  # expected response from test function
 
-		# Testing function with a mock of requests.post, which is used by test function:
-		with patch('qed.cts_app.cts_calcs.calculator.requests.post') as service_mock:
+		# Testing function with a mock of http_sessions.post, which is used by test function:
+		with patch('qed.cts_app.cts_calcs.calculator.http_sessions.post') as service_mock:
 
-			# Sets requests.post mock to return expected response content when test function calls it:
+			# Sets http_sessions.post mock to return expected response content when test function calls it:
 			service_mock.return_value.content = json.dumps(mock_object)
 
-			# Calls test function, which will use the mock requests.post for unit testing:
+			# Calls test function, which will use the mock http_sessions.post for unit testing:
 			response = self.calc_obj.web_call("/fake/url", mock_object)
 
 		try:
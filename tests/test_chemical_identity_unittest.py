@@ -0,0 +1,112 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.chemical_identity import IdentityIndex
+	from qed.cts_celery.cts_calcs.tests.fakes import FakeRedis
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.chemical_identity import IdentityIndex
+	from qed.cts_app.cts_calcs.tests.fakes import FakeRedis
+
+
+
+class TestChemicalIdentity(unittest.TestCase):
+	"""
+	Unit test class for chemical_identity module.
+	"""
+
+	print("cts chemical_identity unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for chemical_identity unit tests.
+		:return:
+		"""
+		self.redis_conn = FakeRedis()
+		self.aspirin = {
+			'dtxsid': "DTXSID5020108",
+			'smiles': "CC(=O)OC1=CC=CC=C1C(O)=O",
+			'orig_smiles': "CC(=O)Oc1ccccc1C(=O)O",
+			'casrn': "50-78-2",
+			'preferredName': "Aspirin",
+			'cheminfo': {'formula': "C9H8O4"}
+		}
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for chemical_identity unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_register_and_resolve(self):
+		"""
+		Testing every registered form of a chemical resolves to its
+		canonical key, including from redis in another process.
+		"""
+
+		print(">>> Running chemical_identity register and resolve unit test..")
+
+		index = IdentityIndex(enabled=True, use_mongo=False)
+		index.register(self.aspirin, ["aspirin"], self.redis_conn)
+
+		other_index = IdentityIndex(enabled=True, use_mongo=False)  # e.g., another worker, empty local cache
+
+		results = [
+			index.get_key(" aspirin ", self.redis_conn),
+			index.get_key("50-78-2", self.redis_conn),
+			index.get_key("CC(=O)Oc1ccccc1C(=O)O", self.redis_conn),
+			other_index.get_key("Aspirin", self.redis_conn),
+			other_index.resolve("aspirin", self.redis_conn)['cheminfo'],
+			index.get_key("CCO", self.redis_conn)
+		]
+		expected_results = ["DTXSID5020108", "DTXSID5020108", "DTXSID5020108", "DTXSID5020108", {'formula': "C9H8O4"}, "CCO"]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_no_dtxsid(self):
+		"""
+		Testing chemicals without a DTXSID are keyed by filtered SMILES.
+		"""
+
+		print(">>> Running chemical_identity no dtxsid unit test..")
+
+		index = IdentityIndex(enabled=True, use_mongo=False)
+		record = index.register({'dtxsid': "N/A", 'smiles': "CCCCO", 'orig_smiles': "OCCCC"}, ["OCCCC"], self.redis_conn)
+
+		results = [record['key'], index.get_key("OCCCC", self.redis_conn), index.get_key("N/A", self.redis_conn)]
+		expected_results = ["CCCCO", "CCCCO", "N/A"]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import requests
+from tabulate import tabulate
+from unittest.mock import Mock
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import circuit_breaker, deadline
+	from qed.cts_celery.cts_calcs.circuit_breaker import CircuitBreaker
+	from qed.cts_celery.cts_calcs.request_errors import CircuitOpenError
+	from qed.cts_celery.cts_calcs.tests.fakes import FakeRedis
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import circuit_breaker, deadline
+	from qed.cts_app.cts_calcs.circuit_breaker import CircuitBreaker
+	from qed.cts_app.cts_calcs.request_errors import CircuitOpenError
+	from qed.cts_app.cts_calcs.tests.fakes import FakeRedis
+
+
+
+class TestCircuitBreaker(unittest.TestCase):
+	"""
+	Unit test class for circuit_breaker module.
+	"""
+
+	print("cts circuit_breaker unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for circuit_breaker unit tests.
+		:return:
+		"""
+		circuit_breaker._closed_at.clear()
+		self.redis_conn = FakeRedis()
+		self.breaker = CircuitBreaker("http://sparc:8080", self.redis_conn, failure_threshold=2, state_ttl=60)
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for circuit_breaker unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_open_circuit_fails_fast(self):
+		"""
+		Testing CircuitBreaker call function doesn't send a request
+		while the circuit is open.
+		"""
+
+		print(">>> Running circuit_breaker open circuit unit test..")
+
+		self.redis_conn.set(self.breaker.open_key, 1)
+		self.redis_conn.set(self.breaker.tripped_key, 1)
+		send_mock = Mock()
+
+		with self.assertRaises(CircuitOpenError):
+			self.breaker.call(send_mock)
+
+		results = [self.breaker.get_state(), send_mock.call_count]
+		expected_results = ["open", 0]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_failures_trip_circuit(self):
+		"""
+		Testing CircuitBreaker opens after failure_threshold failures.
+		"""
+
+		print(">>> Running circuit_breaker trip unit test..")
+
+		for i in range(2):
+			with self.assertRaises(requests.exceptions.ConnectionError):
+				self.breaker.call(Mock(side_effect=requests.exceptions.ConnectionError()))
+
+		results = [self.breaker.get_state()]
+		expected_results = ["open"]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_redis_unavailable(self):
+		"""
+		Testing CircuitBreaker lets requests through if redis is down.
+		"""
+
+		print(">>> Running circuit_breaker redis unavailable unit test..")
+
+		self.redis_conn.pipeline = Mock(side_effect=Exception("redis connection error"))
+		self.redis_conn.exists = Mock(side_effect=Exception("redis connection error"))
+		response = self.breaker.call(Mock(return_value=Mock(status_code=200)))
+
+		results = [response.status_code, self.breaker.get_state()]
+		expected_results = [200, "closed"]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_closed_state_cached(self):
+		"""
+		Testing requests to a healthy backend don't each read the state
+		from redis, and timeouts the deadline shortened aren't failures.
+		"""
+
+		print(">>> Running circuit_breaker closed state cache unit test..")
+
+		for i in range(10):
+			self.breaker.call(Mock(return_value=Mock(status_code=200)))
+		round_trips = self.redis_conn.round_trips
+
+		for i in range(3):
+			with deadline.scope(0.01):
+				with self.assertRaises(requests.exceptions.Timeout):
+					self.breaker.call(Mock(side_effect=requests.exceptions.ReadTimeout()), 120)
+
+		results = [round_trips, self.redis_conn.data.get(self.breaker.failures_key), self.breaker.get_state()]
+		expected_results = [1, None, "closed"]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import requests
+from tabulate import tabulate
+from unittest.mock import Mock
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.concurrency_limiter import AdaptiveLimiter
+	from qed.cts_celery.cts_calcs.request_errors import CircuitOpenError, ConcurrencyLimitError
+	from qed.cts_celery.cts_calcs import deadline
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.concurrency_limiter import AdaptiveLimiter
+	from qed.cts_app.cts_calcs.request_errors import CircuitOpenError, ConcurrencyLimitError
+	from qed.cts_app.cts_calcs import deadline
+
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+	"""
+	Unit test class for concurrency_limiter module.
+	"""
+
+	print("cts concurrency_limiter unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for concurrency_limiter unit tests.
+		:return:
+		"""
+		self.limiter = AdaptiveLimiter("http://jchem:8080", initial_limit=4, min_limit=1, max_limit=10,
+			backoff_ratio=0.5, latency_tolerance=2.0, acquire_timeout=0.0)
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for concurrency_limiter unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_acquire_timeout(self):
+		"""
+		Testing AdaptiveLimiter acquire raises ConcurrencyLimitError
+		once the limit's reached.
+		"""
+
+		print(">>> Running concurrency_limiter acquire unit test..")
+
+		for i in range(4):
+			self.limiter.acquire()
+
+		try:
+			with self.assertRaises(ConcurrencyLimitError):
+				self.limiter.acquire()
+			self.assertEqual(self.limiter.in_flight, 4)
+		finally:
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+
+
+
+	def test_release_adjusts_limit(self):
+		"""
+		Testing AdaptiveLimiter release increases the limit on healthy
+		responses and cuts it on failures.
+		"""
+
+		print(">>> Running concurrency_limiter release unit test..")
+
+		self.limiter.acquire()
+		self.limiter.release(0.1)  # healthy, limit 4 -> 4.25
+		increased_limit = self.limiter.limit
+
+		self.limiter.acquire()
+		self.limiter.release(0.1, failed=True)  # failure, limit halved
+
+		results = [increased_limit, int(self.limiter.limit), self.limiter.in_flight]
+		expected_results = [4.25, 2, 0]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_call_ignores_open_circuit(self):
+		"""
+		Testing AdaptiveLimiter call doesn't lower the limit for
+		CircuitOpenError, but does for connection errors.
+		"""
+
+		print(">>> Running concurrency_limiter call unit test..")
+
+		with self.assertRaises(CircuitOpenError):
+			self.limiter.call(Mock(side_effect=CircuitOpenError()))
+		limit_after_open_circuit = int(self.limiter.limit)
+
+		with self.assertRaises(requests.exceptions.ConnectionError):
+			self.limiter.call(Mock(side_effect=requests.exceptions.ConnectionError()))
+
+		results = [limit_after_open_circuit, int(self.limiter.limit), self.limiter.in_flight]
+		expected_results = [4, 2, 0]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_endpoint_baselines(self):
+		"""
+		Testing slow endpoints aren't compared to a fast endpoint's
+		baseline, and timeouts the deadline shortened don't lower the limit.
+		"""
+
+		print(">>> Running concurrency_limiter endpoint baselines unit test..")
+
+		standardizer, metabolizer = "http://ctsws:8080/ctsws/rest/standardizer", "http://ctsws:8080/ctsws/rest/metabolizer"
+		for i in range(20):
+			self.limiter.acquire()
+			self.limiter.release(0.02, endpoint=standardizer)
+			self.limiter.acquire()
+			self.limiter.release(2.0, endpoint=metabolizer)
+		limit_after_mixed = int(self.limiter.limit)
+
+		with deadline.scope(0.01):
+			with self.assertRaises(requests.exceptions.Timeout):
+				self.limiter.call(Mock(side_effect=requests.exceptions.ReadTimeout()), metabolizer, 120)
+		limit_after_deadline = int(self.limiter.limit)
+
+		with self.assertRaises(requests.exceptions.Timeout):
+			self.limiter.call(Mock(side_effect=requests.exceptions.ReadTimeout()), metabolizer, 120)
+
+		results = [limit_after_mixed, limit_after_deadline, int(self.limiter.limit), self.limiter.in_flight]
+		expected_results = [9, 9, 4, 0]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
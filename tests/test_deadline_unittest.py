@@ -0,0 +1,115 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import time
+from tabulate import tabulate
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import deadline
+	from qed.cts_celery.cts_calcs.request_errors import DeadlineExceeded
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import deadline
+	from qed.cts_app.cts_calcs.request_errors import DeadlineExceeded
+
+
+
+class TestDeadline(unittest.TestCase):
+	"""
+	Unit test class for deadline module.
+	"""
+
+	print("cts deadline unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for deadline unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for deadline unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_get_timeout(self):
+		"""
+		Testing get_timeout caps timeouts at the remaining budget,
+		and leaves them alone without a deadline.
+		"""
+
+		print(">>> Running deadline get_timeout unit test..")
+
+		no_deadline_timeout = deadline.get_timeout(20)
+
+		with deadline.scope(5):
+			capped_timeout = deadline.get_timeout(20)
+			short_timeout = deadline.get_timeout(2)
+
+		results = [no_deadline_timeout, capped_timeout <= 5, short_timeout]
+		expected_results = [20, True, 2]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_nested_scope(self):
+		"""
+		Testing nested scopes (e.g., melting point requests) share
+		the outer request's deadline.
+		"""
+
+		print(">>> Running deadline nested scope unit test..")
+
+		with deadline.scope(5) as outer:
+			with deadline.scope(100) as inner:
+				pass
+
+		try:
+			self.assertIs(outer, inner)
+			self.assertIsNone(deadline.current())
+		finally:
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+
+
+
+	def test_check_expired(self):
+		"""
+		Testing check raises DeadlineExceeded once the budget's spent.
+		"""
+
+		print(">>> Running deadline check unit test..")
+
+		with deadline.scope(0.01):
+			time.sleep(0.02)
+			try:
+				with self.assertRaises(DeadlineExceeded):
+					deadline.check()
+			finally:
+				print("\n")
+				print(inspect.currentframe().f_code.co_name)
+
+
+
+if __name__ == '__main__':
+	unittest.main()
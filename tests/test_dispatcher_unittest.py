@@ -0,0 +1,147 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+from unittest.mock import patch
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import dispatcher
+	from qed.cts_celery.cts_calcs.dispatcher import Dispatcher, INTERACTIVE, BATCH
+	from qed.cts_celery.cts_calcs.request_errors import DispatchTimeout
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import dispatcher
+	from qed.cts_app.cts_calcs.dispatcher import Dispatcher, INTERACTIVE, BATCH
+	from qed.cts_app.cts_calcs.request_errors import DispatchTimeout
+
+
+
+class TestDispatcher(unittest.TestCase):
+	"""
+	Unit test class for dispatcher module.
+	"""
+
+	print("cts dispatcher unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for dispatcher unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for dispatcher unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_get_priority(self):
+		"""
+		Testing requests are classed as interactive or batch.
+		"""
+
+		print(">>> Running dispatcher get_priority unit test..")
+
+		results = [
+			dispatcher.get_priority({'calc': "epi", 'run_type': "single", 'sessionid': "abc"}),
+			dispatcher.get_priority({'calc': "epi", 'run_type': "batch", 'sessionid': "abc"}),
+			dispatcher.get_priority({'calc': "epi", 'workflow': "gentrans", 'node': {'id': 2}}),
+			dispatcher.get_priority({'calc': "epi", 'run_type': "batch", 'priority': "interactive"}),
+		]
+		expected_results = [INTERACTIVE, BATCH, BATCH, INTERACTIVE]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_reserved_and_fair(self):
+		"""
+		Testing batch requests leave the reserved slots to interactive
+		requests, and waiting batch requests take turns by sessionid.
+		"""
+
+		print(">>> Running dispatcher reserved slots and fairness unit test..")
+
+		slots = Dispatcher(max_concurrent=3, reserved_interactive=1, acquire_timeout=0.05)
+		slots.acquire(BATCH, "big_batch")
+		slots.acquire(BATCH, "big_batch")
+		with self.assertRaises(DispatchTimeout):
+			slots.acquire(BATCH, "other_batch")  # only the reserved slot is left
+		slots.acquire(INTERACTIVE, "user")  # takes the reserved slot
+
+		with slots.condition:
+			first, second = slots.enqueue(BATCH, "big_batch"), slots.enqueue(BATCH, "big_batch")
+			other = slots.enqueue(BATCH, "other_batch")
+		slots.release(INTERACTIVE)
+		slots.release(BATCH)
+
+		with slots.condition:
+			turns = [slots.try_start(BATCH, second), slots.try_start(BATCH, first)]
+		slots.release(BATCH)
+		with slots.condition:
+			turns += [slots.try_start(BATCH, second), slots.try_start(BATCH, other)]
+
+		results = [turns, slots.get_state()['running'], slots.get_state()['batch_waiting']]
+		expected_results = [[False, True, False, True], {INTERACTIVE: 0, BATCH: 2}, {"big_batch": 1}]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_dispatched_nested(self):
+		"""
+		Testing nested handler calls run in the outer call's slot.
+		"""
+
+		print(">>> Running dispatcher dispatched nested calls unit test..")
+
+		class Example(object):
+			@dispatcher.dispatched
+			def data_request_handler(self, request_dict):
+				if request_dict.get('nested'):
+					return [dispatcher.current_priority()] + self.data_request_handler({'run_type': "single"})
+				return [dispatcher.current_priority()]
+
+		with patch.object(dispatcher, 'dispatcher', Dispatcher(max_concurrent=1, acquire_timeout=0.05)) as slots:
+			priorities = Example().data_request_handler({'run_type': "batch", 'sessionid': "abc", 'nested': True})
+			state = slots.get_state()
+
+		results = [priorities, state['running'], dispatcher.current_priority()]
+		expected_results = [[BATCH, BATCH], {INTERACTIVE: 0, BATCH: 0}, None]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import time
+from tabulate import tabulate
+from unittest.mock import Mock
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.hedged_requests import Hedger, LatencyTracker
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.hedged_requests import Hedger, LatencyTracker
+
+
+
+class TestHedgedRequests(unittest.TestCase):
+	"""
+	Unit test class for hedged_requests module.
+	"""
+
+	print("cts hedged_requests unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for hedged_requests unit tests.
+		:return:
+		"""
+		self.hedger = Hedger(enabled=True, percentile=50, min_samples=3, min_delay=0.0, max_workers=4)
+		for latency in [0.01, 0.01, 0.01]:
+			self.hedger.get_tracker("http://jchem:8080").record(latency)
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for hedged_requests unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_percentile(self):
+		"""
+		Testing LatencyTracker percentile function.
+		"""
+
+		print(">>> Running hedged_requests percentile unit test..")
+
+		tracker = LatencyTracker(sample_size=5)
+		for latency in [5.0, 1.0, 2.0, 3.0, 4.0, 6.0]:
+			tracker.record(latency)  # first value pushed out of window
+
+		results = [tracker.percentile(0), tracker.percentile(50), tracker.percentile(100)]
+		expected_results = [1.0, 3.0, 6.0]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_run_sends_hedge_for_slow_call(self):
+		"""
+		Testing Hedger run function sends a hedge request when the
+		first call is slow, and returns the first response.
+		"""
+
+		print(">>> Running hedged_requests run unit test..")
+
+		calls = []
+
+		def send():
+			calls.append(1)
+			if len(calls) == 1:
+				time.sleep(0.5)  # straggler
+				return "slow response"
+			return "hedged response"
+
+		result = self.hedger.run(send, "http://jchem:8080")
+
+		results = [result, len(calls)]
+		expected_results = ["hedged response", 2]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_run_disabled(self):
+		"""
+		Testing Hedger run function only makes one call when
+		hedging is off, but still tracks latency.
+		"""
+
+		print(">>> Running hedged_requests disabled unit test..")
+
+		hedger = Hedger(enabled=False)
+		send_mock = Mock(return_value="response")
+
+		result = hedger.run(send_mock, "http://jchem:8080")
+
+		results = [result, send_mock.call_count, len(hedger.get_tracker("http://jchem:8080"))]
+		expected_results = ["response", 1, 1]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
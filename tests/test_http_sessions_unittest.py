@@ -0,0 +1,174 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import gzip
+from tabulate import tabulate
+from unittest.mock import Mock, patch
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.http_sessions import SessionRegistry, TransferStats
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.http_sessions import SessionRegistry, TransferStats
+
+
+
+class TestHTTPSessions(unittest.TestCase):
+	"""
+	Unit test class for http_sessions module.
+	"""
+
+	print("cts http_sessions unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for http_sessions unit tests.
+		:return:
+		"""
+		self.registry = SessionRegistry(pool_connections=2, pool_maxsize=4)
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for http_sessions unit tests.
+		:return:
+		"""
+		self.registry.close()
+
+
+
+	def test_get_host_key(self):
+		"""
+		Testing SessionRegistry get_host_key function.
+		"""
+
+		print(">>> Running http_sessions get_host_key unit test..")
+
+		expected_results = ["http://jchem:8080", "https://comptox.epa.gov", "://localhost:8080"]
+
+		results = [
+			self.registry.get_host_key("http://JCHEM:8080/webservices/rest-v0/util/detail"),
+			self.registry.get_host_key("https://comptox.epa.gov/dashboard/web-test/MP?smiles=CCCC"),
+			self.registry.get_host_key("localhost:8080/ctsws/rest/standardizer")
+		]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_get_session(self):
+		"""
+		Testing SessionRegistry get_session function, which should
+		return the same pooled session for urls on the same host.
+		"""
+
+		print(">>> Running http_sessions get_session unit test..")
+
+		session_1 = self.registry.get_session("http://jchem:8080/webservices/rest-v0/util/detail")
+		session_2 = self.registry.get_session("http://jchem:8080/webservices/rest-v0/util/analyze")
+		session_3 = self.registry.get_session("http://ctsws:8080/ctsws/rest/standardizer")
+
+		results = [session_1 is session_2, session_1 is session_3, len(self.registry.sessions)]
+		expected_results = [True, False, 2]
+
+		try:
+			self.assertListEqual(results, expected_results)
+			self.assertEqual(session_1.get_adapter("http://jchem:8080")._pool_maxsize, 4)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_get_session_after_fork(self):
+		"""
+		Testing that a forked worker doesn't reuse the parent's sessions.
+		"""
+
+		print(">>> Running http_sessions get_session after fork unit test..")
+
+		parent_session = self.registry.get_session("http://jchem:8080/webservices")
+
+		with patch('os.getpid') as pid_mock:
+			pid_mock.return_value = self.registry.pid + 1
+			child_session = self.registry.get_session("http://jchem:8080/webservices")
+
+		try:
+			self.assertIsNot(parent_session, child_session)
+		finally:
+			tab = [[parent_session], [child_session]]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_compress_body(self):
+		"""
+		Testing compress_body gzips large POST bodies only for
+		backends that accept compressed requests.
+		"""
+
+		print(">>> Running http_sessions compress_body unit test..")
+
+		registry = SessionRegistry(compress_hosts=["http://opera:8080"], compress_min_bytes=100)
+		body = '{"smiles": ["' + '", "'.join(["CCCC"] * 50) + '"]}'
+
+		data, headers = registry.compress_body("http://opera:8080/opera/rest/run", body, {'Content-Type': "application/json"})
+		small_data, small_headers = registry.compress_body("http://opera:8080/opera/rest/run", '{"smiles": ["CCC"]}', None)
+		other_data, other_headers = registry.compress_body("http://jchem:8080/webservices", body, None)
+
+		results = [gzip.decompress(data).decode('utf-8') == body, headers, small_headers, other_data == body]
+		expected_results = [True, {'Content-Type': "application/json", 'Content-Encoding': "gzip"}, None, True]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_transfer_stats(self):
+		"""
+		Testing TransferStats counts wire vs. decoded bytes per backend.
+		"""
+
+		print(">>> Running http_sessions transfer stats unit test..")
+
+		stats = TransferStats()
+		stats.record("http://opera:8080", 'request', 120, 1000)
+		stats.record_response("http://opera:8080", Mock(content=b"x" * 2000, raw=Mock(tell=lambda: 300)))
+
+		results = [stats.get("http://opera:8080")]
+		expected_results = [{'request_bytes': 1000, 'request_wire_bytes': 120, 'response_bytes': 2000, 'response_wire_bytes': 300}]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
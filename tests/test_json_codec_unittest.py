@@ -0,0 +1,99 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+from unittest.mock import Mock, patch
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import json_codec
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import json_codec
+
+
+
+class TestJsonCodec(unittest.TestCase):
+	"""
+	Unit test class for json_codec module.
+	"""
+
+	print("cts json_codec unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for json_codec unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for json_codec unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_loads_dumps(self):
+		"""
+		Testing loads/dumps, including NaN bodies and sorted keys.
+		"""
+
+		print(">>> Running json_codec loads/dumps unit test..")
+
+		nan_value = json_codec.loads(b'{"value": NaN}')['value']
+
+		results = [
+			json_codec.loads(b'{"data": [{"mass": 44.1}]}'),
+			nan_value != nan_value,
+			json_codec.dumps({'b': 1, 'a': [1, 2]}, sort_keys=True)
+		]
+		expected_results = [{'data': [{'mass': 44.1}]}, True, '{"a":[1,2],"b":1}']
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_response_json(self):
+		"""
+		Testing response_json decodes a response body only once.
+		"""
+
+		print(">>> Running json_codec response_json unit test..")
+
+		response = Mock(content=b'{"status": true}')
+
+		with patch.object(json_codec, 'loads', wraps=json_codec.loads) as loads:
+			first = json_codec.response_json(response)
+			second = json_codec.response_json(response)
+
+		results = [first, second is first, loads.call_count]
+		expected_results = [{'status': True}, True, 1]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import io
+from tabulate import tabulate
+from unittest.mock import Mock
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.json_stream import NonFiniteReader, build_pruned
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.json_stream import NonFiniteReader, build_pruned
+
+
+
+class TestJsonStream(unittest.TestCase):
+	"""
+	Unit test class for json_stream module.
+	"""
+
+	print("cts json_stream unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for json_stream unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for json_stream unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_non_finite_reader(self):
+		"""
+		Testing NonFiniteReader quotes NaN/Infinity outside of strings,
+		including literals and strings cut off between chunks.
+		"""
+
+		print(">>> Running json_stream NonFiniteReader unit test..")
+
+		body = b'{"data": [{"pKa_a_pred": NaN, "note": "NaN \\"x\\" Infinity", "LogP_pred": -Infinity}]}'
+		raw = io.BytesIO(body)
+		reader = NonFiniteReader(Mock(read=lambda size=-1: raw.read(3)))
+
+		chunks = []
+		chunk = reader.read(3)
+		while chunk:
+			chunks.append(chunk)
+			chunk = reader.read(3)
+
+		results = [b''.join(chunks)]
+		expected_results = [b'{"data": [{"pKa_a_pred": "NaN", "note": "NaN \\"x\\" Infinity", "LogP_pred": "-Infinity"}]}']
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_build_pruned(self):
+		"""
+		Testing build_pruned leaves out objects nested too deep under key.
+		"""
+
+		print(">>> Running json_stream build_pruned unit test..")
+
+		events = [
+			('', 'start_map', None),
+			('', 'map_key', 'results'),
+			('results', 'start_map', None),
+			('results', 'map_key', 'A'),
+			('results.A', 'start_map', None),
+			('results.A', 'map_key', 'generation'),
+			('results.A.generation', 'number', 1),
+			('results.A', 'map_key', 'metabolites'),
+			('results.A.metabolites', 'start_map', None),
+			('results.A.metabolites', 'map_key', 'B'),
+			('results.A.metabolites.B', 'start_map', None),
+			('results.A.metabolites.B', 'map_key', 'routes'),
+			('results.A.metabolites.B.routes', 'start_array', None),
+			('results.A.metabolites.B.routes.item', 'string', "hydrolysis"),
+			('results.A.metabolites.B.routes', 'end_array', None),
+			('results.A.metabolites.B', 'map_key', 'metabolites'),
+			('results.A.metabolites.B.metabolites', 'start_map', None),
+			('results.A.metabolites.B.metabolites', 'map_key', 'C'),
+			('results.A.metabolites.B.metabolites.C', 'start_map', None),
+			('results.A.metabolites.B.metabolites.C', 'end_map', None),
+			('results.A.metabolites.B.metabolites', 'end_map', None),
+			('results.A.metabolites.B', 'end_map', None),
+			('results.A.metabolites', 'end_map', None),
+			('results.A', 'end_map', None),
+			('results', 'end_map', None),
+			('', 'end_map', None)
+		]
+
+		results = [build_pruned(events, 'metabolites', 1)]
+		expected_results = [{'results': {'A': {'generation': 1, 'metabolites': {'B': {'routes': ["hydrolysis"], 'metabolites': {}}}}}}]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import subprocess
+from tabulate import tabulate
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import lazy_imports
+	package = "qed.cts_celery.cts_calcs"
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import lazy_imports
+	package = "qed.cts_app.cts_calcs"
+
+
+
+class TestLazyImports(unittest.TestCase):
+	"""
+	Unit test class for lazy_imports module.
+	"""
+
+	print("cts lazy_imports unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for lazy_imports unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for lazy_imports unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_lazy_module(self):
+		"""
+		Testing LazyModule imports on first attribute use, and
+		optional() returns None for modules that aren't installed.
+		"""
+
+		print(">>> Running lazy_imports lazy module unit test..")
+
+		lazy = lazy_imports.module('.templates', package)
+		loaded_before_use = lazy_imports.is_loaded(lazy)
+		template_class = lazy.Template
+
+		results = [loaded_before_use, lazy_imports.is_loaded(lazy), template_class.__name__,
+			lazy_imports.optional('cts_module_that_does_not_exist')]
+		expected_results = [False, True, "Template", None]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_calculator_import(self):
+		"""
+		Testing importing calculator or a calculator (in a new interpreter)
+		doesn't import the deferred dependencies, or calculator's request
+		handling modules.
+		"""
+
+		print(">>> Running lazy_imports calculator import unit test..")
+
+		script = "import sys; import {}.{}; print(','.join(name for name in {!r} if name in sys.modules))"
+		request_modules = [package + "." + name for name in ["http_sessions", "single_flight", "response_cache", "negative_cache",
+			"circuit_breaker", "concurrency_limiter", "rate_limiter", "redis_pool", "request_errors"]]
+		outputs = []
+		for module, names in [
+			("calculator", ["requests", "redis", "pymongo", "bs4", "pytz", "aiohttp", "ijson", "orjson"] + request_modules),
+			("calculator_epi", ["requests", "redis", "pymongo", "bs4", "pytz", "aiohttp", "ijson", package + ".calculator_metabolizer"])
+		]:
+			outputs.append(subprocess.run([sys.executable, "-c", script.format(package, module, names)], stdout=subprocess.PIPE, check=True,
+				env=dict(os.environ, PYTHONPATH=os.path.join(_path, "..", "..", "..", ".."))).stdout)
+
+		results = [output.decode('utf-8').strip() for output in outputs]
+		expected_results = ["", ""]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
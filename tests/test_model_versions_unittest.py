@@ -0,0 +1,131 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+from unittest.mock import Mock, patch
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import model_versions
+	from qed.cts_celery.cts_calcs.model_versions import ModelVersions
+	from qed.cts_celery.cts_calcs.pchem_cache import PchemCache
+	from qed.cts_celery.cts_calcs.calculator import Calculator
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import model_versions
+	from qed.cts_app.cts_calcs.model_versions import ModelVersions
+	from qed.cts_app.cts_calcs.pchem_cache import PchemCache
+	from qed.cts_app.cts_calcs.calculator import Calculator
+
+
+
+class ExampleCalc(Calculator):
+	"""
+	Calculator with a declared model version and a mock version probe.
+	"""
+	def __init__(self):
+		self.name = "example"
+		self.meta_info = {'metaInfo': {'model': "example", 'modelVersion': "2.3"}}
+		self.probe_model_version = Mock(side_effect=["abc", ConnectionError("connection refused"), "def"])
+
+
+
+class TestModelVersions(unittest.TestCase):
+	"""
+	Unit test class for model_versions module.
+	"""
+
+	print("cts model_versions unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for model_versions unit tests.
+		:return:
+		"""
+		self.redis_mock = Mock()
+		self.redis_mock.pipeline.return_value.execute.return_value = [None]  # nothing shared in redis
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for model_versions unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_declared(self):
+		"""
+		Testing versions come from meta_info, unless set by env var.
+		"""
+
+		print(">>> Running model_versions declared version unit test..")
+
+		calc = ExampleCalc()
+		versions = ModelVersions(probe=False)
+
+		with patch.dict(os.environ, {'CTS_EXAMPLE_VERSION_URL': "http://example/version"}):
+			os.environ.pop('CTS_EXAMPLE_MODEL_VERSION', None)
+			declared = versions.get(calc, "example", self.redis_mock)
+			os.environ['CTS_EXAMPLE_MODEL_VERSION'] = "2.4"
+			overridden = versions.get(calc, "example", self.redis_mock)
+
+		results = [declared, overridden, calc.probe_model_version.call_count]
+		expected_results = ["2.3", "2.4", 0]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_probed(self):
+		"""
+		Testing probed versions are rechecked after the probe interval,
+		a failed probe keeps the last version, and a new version changes
+		p-chem cache keys.
+		"""
+
+		print(">>> Running model_versions probed version unit test..")
+
+		calc = ExampleCalc()
+		versions = ModelVersions(probe=True, probe_interval=60)
+		cache = PchemCache(enabled=True, use_redis=False, use_mongo=False)
+		request = {'chemical': "CCO", 'prop': "water_sol"}
+
+		with patch.dict(os.environ, {'CTS_EXAMPLE_VERSION_URL': "http://example/version"}), patch.object(model_versions, 'model_versions', versions):
+			os.environ.pop('CTS_EXAMPLE_MODEL_VERSION', None)
+			first = versions.get(calc, "example", self.redis_mock)
+			first_key = cache.get_query(calc, request, self.redis_mock)['key']
+			with patch.object(model_versions.time, 'time', return_value=model_versions.time.time() + 120):
+				after_failure = versions.get(calc, "example", self.redis_mock)
+			with patch.object(model_versions.time, 'time', return_value=model_versions.time.time() + 240):
+				upgraded = versions.get(calc, "example", self.redis_mock)
+				upgraded_key = cache.get_query(calc, request, self.redis_mock)['key']
+
+		results = [first, after_failure, upgraded, first_key.split(":")[2], first_key == upgraded_key, calc.probe_model_version.call_count]
+		expected_results = ["2.3+abc", "2.3+abc", "2.3+def", "2.3+abc", False, 3]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,143 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+from unittest.mock import Mock, patch
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import calculator
+	from qed.cts_celery.cts_calcs.negative_cache import NegativeCache, get_request_key
+	from qed.cts_celery.cts_calcs.calculator import Calculator
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import calculator
+	from qed.cts_app.cts_calcs.negative_cache import NegativeCache, get_request_key
+	from qed.cts_app.cts_calcs.calculator import Calculator
+
+
+
+class TestNegativeCache(unittest.TestCase):
+	"""
+	Unit test class for negative_cache module.
+	"""
+
+	print("cts negative_cache unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for negative_cache unit tests.
+		:return:
+		"""
+		self.cache = NegativeCache(enabled=True, ttl=60, use_redis=False)
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for negative_cache unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_get_set(self):
+		"""
+		Testing NegativeCache get/set, entries are per namespace.
+		"""
+
+		print(">>> Running negative_cache get/set unit test..")
+
+		rejection = {'error': "Chemical cannot contain metals"}
+		self.cache.set('smilesfilter', "C[Hg]C", rejection)
+
+		results = [
+			self.cache.get('smilesfilter', "C[Hg]C"),
+			self.cache.get('http://jchem:8080', "C[Hg]C"),
+			self.cache.get('smilesfilter', "CCC")
+		]
+		expected_results = [rejection, None, None]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_get_request_key(self):
+		"""
+		Testing request keys are per endpoint and payload, not key order.
+		"""
+
+		print(">>> Running negative_cache get_request_key unit test..")
+
+		url = "http://jchem:8080/webservices/rest-v0/util/calculate/molExport"
+		results = [
+			get_request_key(url, {'structure': "CCC", 'parameters': "smiles"}) == get_request_key(url, {'parameters': "smiles", 'structure': "CCC"}),
+			get_request_key(url, {'structure': "CCC", 'parameters': "smiles"}) == get_request_key(url, {'structure': "CCC", 'inputFormat': "name", 'parameters': "smiles"}),
+			get_request_key(url, {'structure': "CCC"}) == get_request_key("http://jchem:8080/webservices/rest-v0/util/detail", {'structure': "CCC"})
+		]
+		expected_results = [True, False, False]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_name_lookup_then_convert(self):
+		"""
+		Testing a SMILES failing the name lookup doesn't negative cache
+		the SMILES for converting it, and only jchem errorCode 3 responses
+		(not throttling, etc.) are cached.
+		"""
+
+		print(">>> Running negative_cache name lookup then convert unit test..")
+
+		calc = Calculator()
+		calc.redis_conn = None
+		smiles = "CC(=O)OC1=C(C=CC=C1)C(O)=O"
+		not_a_name = Mock(status_code=400, content=b'{"errorCode":3,"errorMessage":"Cannot read name"}')
+		converted = Mock(status_code=200, content=b'{"structure":"CC(=O)OC1=CC=CC=C1C(O)=O","format":"smiles"}')
+		throttled = Mock(status_code=429, content=b'{"error":"Too many requests"}')
+		not_readable = Mock(status_code=400, content=b'{"errorCode":3,"errorMessage":"Cannot read structure"}')
+
+		with patch.object(calculator, 'negative_cache', self.cache), patch.object(Calculator, 'request_with_retries') as request_mock:
+			request_mock.side_effect = [not_a_name, converted]
+			name_results = calc.get_smiles_from_name(smiles)
+			convert_results = calc.convertToSMILES({'chemical': smiles})
+			request_mock.side_effect = [throttled, not_readable]
+			calc.convertToSMILES({'chemical': "C1CC"})
+			calc.convertToSMILES({'chemical': "C1CC"})  # throttling wasn't cached
+			calc.convertToSMILES({'chemical': "C1CC"})  # unreadable chemical was
+			calls = request_mock.call_count
+
+		results = [name_results.get('error'), convert_results.get('structure'), calls]
+		expected_results = ["Not a valid name", "CC(=O)OC1=CC=CC=C1C(O)=O", 4]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
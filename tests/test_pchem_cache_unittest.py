@@ -0,0 +1,215 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+from unittest.mock import patch
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import pchem_cache
+	from qed.cts_celery.cts_calcs import chemical_identity
+	from qed.cts_celery.cts_calcs.calculator import Calculator
+	from qed.cts_celery.cts_calcs.calculator_test import TestWSCalc
+	from qed.cts_celery.cts_calcs.calculator_sparc import SparcCalc
+	from qed.cts_celery.cts_calcs.calculator_chemaxon import JchemCalc
+	from qed.cts_celery.cts_calcs.tests.fakes import FakeRedis
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import pchem_cache
+	from qed.cts_app.cts_calcs import chemical_identity
+	from qed.cts_app.cts_calcs.calculator import Calculator
+	from qed.cts_app.cts_calcs.calculator_test import TestWSCalc
+	from qed.cts_app.cts_calcs.calculator_sparc import SparcCalc
+	from qed.cts_app.cts_calcs.calculator_chemaxon import JchemCalc
+	from qed.cts_app.cts_calcs.tests.fakes import FakeRedis
+
+
+
+class ExampleCalc(Calculator):
+	"""
+	Calculator whose handler counts backend calls.
+	"""
+	def __init__(self, redis_conn):
+		self.name = "example"
+		self.redis_conn = redis_conn
+		self.calls = 0
+
+	@pchem_cache.cached
+	def data_request_handler(self, request_dict):
+		self.calls += 1
+		_response_dict = {key: val for key, val in request_dict.items() if key != 'nodes'}
+		_response_dict.update({'request_post': request_dict, 'method': None})
+		if request_dict['chemical'] == "C":
+			_response_dict.update({'data': "Cannot reach example calculator", 'valid': False})
+			return _response_dict
+		if request_dict['chemical'] == "CCO":
+			_response_dict.update({'data': [float('nan'), float('inf')], 'valid': True})  # e.g., OPERA's NaN results
+			return _response_dict
+		_response_dict.update({'data': 1.23 if request_dict.get('ph') != 5.0 else 4.56, 'valid': True})
+		return _response_dict
+
+
+
+class TestPchemCache(unittest.TestCase):
+	"""
+	Unit test class for pchem_cache module.
+	"""
+
+	print("cts pchem_cache unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for pchem_cache unit tests.
+		:return:
+		"""
+		self.redis_conn = FakeRedis()
+		self.index = chemical_identity.IdentityIndex(enabled=True, use_mongo=False)
+		self.index.register({'dtxsid': "DTXSID5020108", 'smiles': "CC(=O)OC1=CC=CC=C1C(O)=O"}, ["aspirin"], self.redis_conn)
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for pchem_cache unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_cached(self):
+		"""
+		Testing repeat requests, by any name of a chemical, are
+		answered from the cache with the current request's keys.
+		"""
+
+		print(">>> Running pchem_cache cached handler unit test..")
+
+		calc = ExampleCalc(self.redis_conn)
+		cache = pchem_cache.PchemCache(enabled=True, use_redis=True, use_mongo=False)
+
+		with patch.object(pchem_cache, 'pchem_cache', cache), patch.object(chemical_identity, 'identity_index', self.index):
+			first = calc.data_request_handler({'chemical': "aspirin", 'calc': "example", 'prop': "kow_wph", 'ph': 7.0, 'sessionid': "a"})
+			request = {'chemical': "DTXSID5020108", 'calc': "example", 'prop': "kow_wph", 'ph': 7.0, 'sessionid': "b"}
+			second = calc.data_request_handler(request)
+			other_ph = calc.data_request_handler({'chemical': "aspirin", 'calc': "example", 'prop': "kow_wph", 'ph': 5.0})
+			cache.local.clear()  # e.g., another worker, from redis
+			from_redis = calc.data_request_handler({'chemical': "aspirin", 'calc': "example", 'prop': "kow_wph", 'ph': 7.0})
+			invalid = [calc.data_request_handler({'chemical': "C", 'calc': "example", 'prop': "kow_wph"}) for i in range(2)]
+
+		results = [first['data'], second['data'], second['chemical'], second['sessionid'], second['request_post'] is request,
+			other_ph['data'], from_redis['data'], invalid[1]['valid'], calc.calls, cache.hits]
+		expected_results = [1.23, 1.23, "DTXSID5020108", "b", True,
+			4.56, 1.23, False, 4, 2]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_non_finite_values(self):
+		"""
+		Testing cached NaN and Infinity results come back as they were,
+		not as null.
+		"""
+
+		print(">>> Running pchem_cache non-finite values unit test..")
+
+		calc = ExampleCalc(self.redis_conn)
+		cache = pchem_cache.PchemCache(enabled=True, use_redis=True, use_mongo=False)
+
+		with patch.object(pchem_cache, 'pchem_cache', cache), patch.object(chemical_identity, 'identity_index', self.index):
+			calc.data_request_handler({'chemical': "CCO", 'calc': "example", 'prop': "kow_no_ph"})
+			from_local = calc.data_request_handler({'chemical': "CCO", 'calc': "example", 'prop': "kow_no_ph"})
+			cache.local.clear()
+			from_redis = calc.data_request_handler({'chemical': "CCO", 'calc': "example", 'prop': "kow_no_ph"})
+
+		results = [[repr(value) for value in from_local['data']], [repr(value) for value in from_redis['data']], calc.calls]
+		expected_results = [["nan", "inf"], ["nan", "inf"], 1]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_get_query(self):
+		"""
+		Testing pH is only part of the key for pH dependent props,
+		and speciation and multi-chemical requests aren't cached.
+		"""
+
+		print(">>> Running pchem_cache get_query unit test..")
+
+		calc = ExampleCalc(self.redis_conn)
+		cache = pchem_cache.PchemCache(enabled=True, use_redis=False, use_mongo=False)
+
+		with patch.object(chemical_identity, 'identity_index', self.index):
+			query = cache.get_query(calc, {'chemical': ["aspirin"], 'props': ["water_sol", "kow_no_ph"], 'ph': 5.0}, self.redis_conn)
+			results = [
+				{key: query[key] for key in ['chemical', 'calc', 'prop', 'ph']},
+				cache.get_query(calc, {'chemical': "CCO", 'prop': "water_sol", 'ph': 5.0})['key'] == cache.get_query(calc, {'chemical': "CCO", 'prop': "water_sol", 'ph': 7.4})['key'],
+				cache.get_query(calc, {'chemical': "CCO", 'service': "getSpeciationData"}),
+				cache.get_query(calc, {'chemical': ["CCO", "CCC"], 'prop': "water_sol"})
+			]
+		expected_results = [
+			{'chemical': "DTXSID5020108", 'calc': "example", 'prop': ["kow_no_ph", "water_sol"], 'ph': None},
+			True, None, None
+		]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_is_cacheable_response(self):
+		"""
+		Testing results are only cached if a value came back, not "N/A"
+		or an error message.
+		"""
+
+		print(">>> Running pchem_cache is_cacheable_response unit test..")
+
+		with patch.dict(os.environ, {'CTS_SPARC_SERVER': "http://sparc", 'CTS_JCHEM_SERVER': "http://jchem"}):
+			test_calc, sparc_calc, jchem_calc = TestWSCalc(), SparcCalc(), JchemCalc()
+
+		results = [
+			[test_calc.is_cacheable_response({'prop': "vapor_press", 'data': value}) for value in ["3.14e-15", 1.23, "N/A", "Cannot reach TESTWS"]],
+			[sparc_calc.is_cacheable_response({'prop': "ion_con", 'data': value}) for value in [{'pKa': [4.2], 'pKb': []}, None, "request timed out"]],
+			[sparc_calc.is_cacheable_response({'prop': "kow_wph", 'data': value}) for value in [1.5, None]],
+			[jchem_calc.is_cacheable_response({'prop': "ion_con", 'data': value}) for value in [{'pKa': [], 'pKb': [9.1]}, None]],
+			[jchem_calc.is_cacheable_response({'prop': "water_sol", 'data': value}) for value in [250.0, "Cannot reach ChemAxon calculator"]]
+		]
+		expected_results = [[True, True, False, False], [True, False, False], [True, False], [True, False], [True, False]]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
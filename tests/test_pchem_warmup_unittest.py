@@ -0,0 +1,142 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+from unittest.mock import Mock, patch
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import pchem_cache
+	from qed.cts_celery.cts_calcs import pchem_warmup
+	from qed.cts_celery.cts_calcs.pchem_cache import PchemCache, PopularityCounter
+	from qed.cts_celery.cts_calcs.pchem_warmup import PchemWarmUp
+	from qed.cts_celery.cts_calcs.tests.fakes import FakeRedis
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import pchem_cache
+	from qed.cts_app.cts_calcs import pchem_warmup
+	from qed.cts_app.cts_calcs.pchem_cache import PchemCache, PopularityCounter
+	from qed.cts_app.cts_calcs.pchem_warmup import PchemWarmUp
+	from qed.cts_app.cts_calcs.tests.fakes import FakeRedis
+
+
+
+class FakeDb(object):
+	"""
+	Stand-in for MongoDBHandler's popularity and p-chem cache queries.
+	"""
+	def __init__(self, documents, fail_on=None):
+		self.documents = documents
+		self.fail_on = fail_on
+		self.requested = []
+
+	def find_popular_chemicals(self, limit):
+		return ["DTXSID1", "DTXSID2", "DTXSID3"][:limit]
+
+	def iter_pchem_cache_documents(self, dtxsids, batch_size=100):
+		self.requested.append(list(dtxsids))
+		if self.fail_on in dtxsids:
+			self.fail_on = None
+			raise ConnectionError("db connection lost")
+		return iter([document for document in self.documents if document['dtxsid'] in dtxsids])
+
+
+
+class TestPchemWarmUp(unittest.TestCase):
+	"""
+	Unit test class for pchem_warmup module.
+	"""
+
+	print("cts pchem_warmup unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for pchem_warmup unit tests.
+		:return:
+		"""
+		self.redis_conn = FakeRedis()
+		self.documents = [
+			{'dtxsid': "DTXSID1", 'cache_key': "cts_pchem:epi::1", 'calc': "epi", 'model_version': "", 'response': {'fields': {'data': 1}}},
+			{'dtxsid': "DTXSID2", 'cache_key': "cts_pchem:opera:2.3:2", 'calc': "opera", 'model_version': "2.3", 'response': {'fields': {'data': 2}}},
+			{'dtxsid': "DTXSID2", 'cache_key': "cts_pchem:opera:2.2:2", 'calc': "opera", 'model_version': "2.2", 'response': {'fields': {'data': 2}}},
+			{'dtxsid': "DTXSID3", 'cache_key': "cts_pchem:test::3", 'calc': "test", 'model_version': "", 'response': {'fields': {'data': 3}}},
+		]
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for pchem_warmup unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_run_resumes(self):
+		"""
+		Testing an interrupted warm-up resumes after its last batch, and
+		results from old model versions aren't loaded.
+		"""
+
+		print(">>> Running pchem_warmup interrupted run unit test..")
+
+		cache = PchemCache(enabled=True, use_redis=True, use_mongo=False)
+		db = FakeDb(self.documents, fail_on="DTXSID3")
+		get_version = lambda self, calc_name, redis_conn: "2.3" if calc_name == "opera" else None
+
+		with patch.object(pchem_warmup, 'pchem_cache', cache), patch.object(PchemWarmUp, 'get_version', get_version):
+			with self.assertRaises(ConnectionError):
+				PchemWarmUp(batch_size=2, redis_conn=self.redis_conn).run(db)
+			stats = PchemWarmUp(batch_size=2, redis_conn=self.redis_conn).run(db)
+
+		results = [db.requested, stats, sorted(key for key in self.redis_conn.data if key.startswith("cts_pchem:")),
+			cache.local.get("cts_pchem:test::3"), [key for key in self.redis_conn.data if key.startswith("cts_pchem_warmup")]]
+		expected_results = [[["DTXSID1", "DTXSID2"], ["DTXSID3"], ["DTXSID3"]], {'chemicals': 3, 'loaded': 3, 'skipped': 1},
+			["cts_pchem:epi::1", "cts_pchem:opera:2.3:2", "cts_pchem:test::3"], '{"fields":{"data":3}}', []]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_popularity(self):
+		"""
+		Testing only DTXSID lookups are counted, and counts are added
+		to the db in one write once enough chemicals are pending.
+		"""
+
+		print(">>> Running pchem_cache popularity counter unit test..")
+
+		db_handler = Mock()
+		counter = PopularityCounter(enabled=True, flush_interval=3600, max_pending=2)
+
+		with patch.object(pchem_cache.mongodb_handler, 'get_shared_handler', return_value=db_handler):
+			for chemical in ["DTXSID1", "CCO", "DTXSID1", "DTXSID2", "DTXSID3"]:
+				counter.record(chemical)
+
+		results = [[dict(call[0][0]) for call in db_handler.increment_pchem_popularity.call_args_list], dict(counter.counts)]
+		expected_results = [[{"DTXSID1": 2, "DTXSID2": 1}], {"DTXSID3": 1}]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
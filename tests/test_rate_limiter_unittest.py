@@ -0,0 +1,143 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+from unittest.mock import Mock, patch
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.rate_limiter import TokenBucket, parse_limits
+	from qed.cts_celery.cts_calcs.request_errors import RateLimitExceeded
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.rate_limiter import TokenBucket, parse_limits
+	from qed.cts_app.cts_calcs.request_errors import RateLimitExceeded
+
+
+
+class TestRateLimiter(unittest.TestCase):
+	"""
+	Unit test class for rate_limiter module.
+	"""
+
+	print("cts rate_limiter unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for rate_limiter unit tests.
+		:return:
+		"""
+		self.bucket = TokenBucket("https://actorws.epa.gov", rate=2, burst=2, max_wait=1, redis_conn=None)
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for rate_limiter unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_reserve(self):
+		"""
+		Testing TokenBucket reserves tokens past the burst with a
+		bounded wait, and refills at its rate.
+		"""
+
+		print(">>> Running rate_limiter reserve unit test..")
+
+		with patch('time.time') as time_mock:
+			time_mock.return_value = self.bucket.updated
+			waits = [self.bucket.reserve(1) for i in range(4)]
+			time_mock.return_value = self.bucket.updated + 2.0
+			refilled_wait = self.bucket.reserve(1)
+
+		results = [waits, refilled_wait]
+		expected_results = [[0, 0, 0.5, 1.0], 0]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_reserve_redis(self):
+		"""
+		Testing TokenBucket reserves tokens with the redis script,
+		which uses redis's clock rather than the worker's.
+		"""
+
+		print(">>> Running rate_limiter reserve redis unit test..")
+
+		redis_conn = Mock()
+		redis_conn.register_script.return_value.side_effect = ["0", "0.5", None]
+		bucket = TokenBucket("https://actorws.epa.gov", rate=2, burst=1, max_wait=1, redis_conn=redis_conn)
+
+		results = [
+			[bucket.reserve(1) for i in range(3)],
+			redis_conn.register_script.return_value.call_args.kwargs,
+			"redis.call('TIME')" in redis_conn.register_script.call_args.args[0]
+		]
+		expected_results = [[0.0, 0.5, None], {'keys': ["cts_ratelimit:https://actorws.epa.gov"], 'args': [2.0, 1.0, 1]}, True]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_acquire_over_max_wait(self):
+		"""
+		Testing acquire raises RateLimitExceeded instead of waiting over max_wait,
+		and that the bucket falls back to a local bucket without redis.
+		"""
+
+		print(">>> Running rate_limiter acquire over max wait unit test..")
+
+		redis_conn = Mock()
+		redis_conn.register_script.side_effect = Exception("redis unavailable")
+		bucket = TokenBucket("https://cactus.nci.nih.gov", rate=1, burst=1, max_wait=0.5, redis_conn=redis_conn)
+		bucket.acquire()
+
+		with self.assertRaises(RateLimitExceeded):
+			bucket.acquire()
+
+
+
+	def test_parse_limits(self):
+		"""
+		Testing parse_limits parses "host=rate:burst" entries.
+		"""
+
+		print(">>> Running rate_limiter parse_limits unit test..")
+
+		results = [parse_limits("https://comptox.epa.gov/dashboard=5:10, https://cactus.nci.nih.gov=2")]
+		expected_results = [{'https://comptox.epa.gov': (5.0, 10.0), 'https://cactus.nci.nih.gov': (2.0, 2.0)}]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
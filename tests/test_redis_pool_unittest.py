@@ -0,0 +1,100 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+from unittest.mock import Mock
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.redis_pool import RedisPool, get_many, set_many
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.redis_pool import RedisPool, get_many, set_many
+
+
+
+class TestRedisPool(unittest.TestCase):
+	"""
+	Unit test class for redis_pool module.
+	"""
+
+	print("cts redis_pool unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for redis_pool unit tests.
+		:return:
+		"""
+		self.redis_mock = Mock()
+		self.pipe_mock = self.redis_mock.pipeline.return_value
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for redis_pool unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_get_client(self):
+		"""
+		Testing RedisPool creates one shared client lazily.
+		"""
+
+		print(">>> Running redis_pool get_client unit test..")
+
+		pool = RedisPool(host="redis", port=6379, max_connections=5)
+		created_before_use = pool.client is not None
+		client = pool.get_client()
+
+		results = [created_before_use, client is pool.get_client(), client.connection_pool.max_connections]
+		expected_results = [False, True, 5]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_get_set_many(self):
+		"""
+		Testing get_many/set_many pipeline their commands, and
+		fail open if redis is unavailable.
+		"""
+
+		print(">>> Running redis_pool get_many/set_many unit test..")
+
+		self.pipe_mock.execute.return_value = [b"1", None]
+		values = get_many(["a", "b"], self.redis_mock)
+		was_set = set_many({'a': 1, 'b': 2}, ex=60, redis_conn=self.redis_mock)
+
+		self.redis_mock.pipeline.side_effect = Exception("redis connection error")
+		unavailable_values = get_many(["a", "b"], self.redis_mock)
+
+		results = [values, was_set, self.pipe_mock.set.call_count, unavailable_values]
+		expected_results = [[b"1", None], True, 2, [None, None]]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import threading
+from tabulate import tabulate
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import request_context
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import request_context
+
+
+
+class Example(object):
+	method = request_context.RequestAttribute()
+	products = request_context.RequestAttribute([])
+
+	def __init__(self):
+		self.method = "hc"
+
+	@request_context.bound
+	def handler(self, method, barrier):
+		self.method = method
+		self.products.append(method)
+		barrier.wait()  # both threads have set their values
+		return self.method, list(self.products)
+
+
+
+class TestRequestContext(unittest.TestCase):
+	"""
+	Unit test class for request_context module.
+	"""
+
+	print("cts request_context unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for request_context unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for request_context unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_bound_threads(self):
+		"""
+		Testing threads sharing an instance keep separate request state,
+		and the instance's own values are left as they were.
+		"""
+
+		print(">>> Running request_context bound threads unit test..")
+
+		instance = Example()
+		barrier = threading.Barrier(2)
+		thread_results = {}
+
+		def run(method):
+			thread_results[method] = instance.handler(method, barrier)
+
+		threads = [threading.Thread(target=run, args=(method,)) for method in ["nn", "gc"]]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		results = [thread_results["nn"], thread_results["gc"], instance.method, instance.products]
+		expected_results = [("nn", ["nn"]), ("gc", ["gc"]), "hc", []]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_no_context(self):
+		"""
+		Testing RequestAttributes are instance attributes outside a context.
+		"""
+
+		print(">>> Running request_context no context unit test..")
+
+		instance = Example()
+		instance.method = "nn"
+
+		with request_context.scope():
+			instance.method = "gc"
+			scoped_method = instance.method
+
+		results = [request_context.current(), instance.method, scoped_method]
+		expected_results = [None, "nn", "gc"]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
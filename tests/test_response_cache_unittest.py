@@ -0,0 +1,130 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.response_cache import ResponseCache, LRUCache
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.response_cache import ResponseCache, LRUCache
+
+
+
+class TestResponseCache(unittest.TestCase):
+	"""
+	Unit test class for response_cache module.
+	"""
+
+	print("cts response_cache unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for response_cache unit tests.
+		:return:
+		"""
+		self.cache = ResponseCache(enabled=True, use_redis=False, default_ttl=60, ttls={'/ctsws/rest/random': 0})
+		self.url = "http://jchem:8080/webservices/rest-v0/util/detail"
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for response_cache unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_get_set(self):
+		"""
+		Testing ResponseCache get/set, with equivalent payloads
+		sharing an entry and opted-out endpoints not cached.
+		"""
+
+		print(">>> Running response_cache get/set unit test..")
+
+		self.cache.set(self.url, {'structures': [{'structure': "CCC"}], 'display': "smiles"}, {'data': [{'mass': 44.1}]})
+		self.cache.set("http://ctsws:8080/ctsws/rest/random", {'structure': "CCC"}, {'results': ["CCC"]})
+
+		results = [
+			self.cache.get(self.url, {'display': "smiles", 'structures': [{'structure': "CCC"}]}),
+			self.cache.get(self.url, {'structures': [{'structure': "CCCC"}]}),
+			self.cache.get("http://ctsws:8080/ctsws/rest/random", {'structure': "CCC"})
+		]
+		expected_results = [{'data': [{'mass': 44.1}]}, None, None]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_max_item_bytes(self):
+		"""
+		Testing responses over max_item_bytes aren't cached,
+		with non-ASCII responses measured in bytes.
+		"""
+
+		print(">>> Running response_cache max item bytes unit test..")
+
+		cache = ResponseCache(enabled=True, use_redis=False, default_ttl=60, max_item_bytes=40)
+		cache.set(self.url, {'structure': "CCC"}, {'data': "C" * 20})  # 31 bytes
+		cache.set(self.url, {'structure': "CCCC"}, {'data': "\u00e9" * 20})  # 31 characters, 51 bytes
+
+		results = [
+			cache.get(self.url, {'structure': "CCC"}),
+			cache.get(self.url, {'structure': "CCCC"})
+		]
+		expected_results = [{'data': "C" * 20}, None]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_lru_eviction(self):
+		"""
+		Testing LRUCache evicts least recently used entries
+		once over its byte limit.
+		"""
+
+		print(">>> Running response_cache lru eviction unit test..")
+
+		lru = LRUCache(max_bytes=30)
+		lru.set("a", "x" * 9, 60)  # 10 bytes
+		lru.set("b", "x" * 9, 60)
+		lru.get("a")  # "b" is now least recently used
+		lru.set("c", "x" * 14, 60)  # 15 bytes, over limit
+
+		results = [lru.get("a") is not None, lru.get("b"), lru.get("c") is not None, lru.size]
+		expected_results = [True, None, True, 25]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,182 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import asyncio
+import requests
+from tabulate import tabulate
+from unittest.mock import Mock
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.retry_policy import RetryPolicy, RetryBudget, RetryError
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.retry_policy import RetryPolicy, RetryBudget, RetryError
+
+
+
+class TestRetryPolicy(unittest.TestCase):
+	"""
+	Unit test class for retry_policy module.
+	"""
+
+	print("cts retry_policy unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for retry_policy unit tests.
+		:return:
+		"""
+		self.policy = RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for retry_policy unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_run_retries_until_valid(self):
+		"""
+		Testing RetryPolicy run function retries a failed request.
+		"""
+
+		print(">>> Running retry_policy run unit test..")
+
+		valid_response = Mock(status_code=200)
+		send_mock = Mock(side_effect=[requests.exceptions.ConnectionError(), Mock(status_code=503), valid_response])
+
+		response = self.policy.run(send_mock)
+
+		results = [response is valid_response, send_mock.call_count]
+		expected_results = [True, 3]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_run_raises_retry_error(self):
+		"""
+		Testing RetryPolicy run function raises RetryError with the
+		last response after max attempts.
+		"""
+
+		print(">>> Running retry_policy run max attempts unit test..")
+
+		error_response = Mock(status_code=500)
+		send_mock = Mock(return_value=error_response)
+
+		with self.assertRaises(RetryError) as context:
+			self.policy.run(send_mock)
+
+		results = [context.exception.response is error_response, send_mock.call_count]
+		expected_results = [True, 3]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_retry_budget(self):
+		"""
+		Testing RetryBudget stops retries once they exceed the
+		allowed fraction of requests.
+		"""
+
+		print(">>> Running retry_policy budget unit test..")
+
+		budget = RetryBudget(ratio=0.5, min_retries=0, window=60.0)
+		for i in range(4):
+			budget.record_request()
+
+		results = [budget.try_retry(), budget.try_retry(), budget.try_retry()]
+		expected_results = [True, True, False]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_get_delay(self):
+		"""
+		Testing RetryPolicy get_delay function stays within the
+		backoff cap.
+		"""
+
+		print(">>> Running retry_policy get_delay unit test..")
+
+		policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+		delays = [policy.get_delay(n) for n in range(6)]
+		caps = [1.0, 2.0, 4.0, 5.0, 5.0, 5.0]
+
+		try:
+			for delay, cap in zip(delays, caps):
+				self.assertTrue(0 <= delay <= cap)
+		finally:
+			tab = [delays, caps]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_run_async_retries_until_valid(self):
+		"""
+		Testing RetryPolicy run_async function retries a failed request.
+		"""
+
+		print(">>> Running retry_policy run_async unit test..")
+
+		valid_response = Mock(status_code=200)
+		responses = [requests.exceptions.Timeout(), Mock(status_code=502), valid_response]
+		calls = []
+
+		async def send():
+			calls.append(1)
+			response = responses.pop(0)
+			if isinstance(response, Exception):
+				raise response
+			return response
+
+		response = asyncio.run(self.policy.run_async(send))
+
+		results = [response is valid_response, len(calls)]
+		expected_results = [True, 3]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,178 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import time
+import threading
+from tabulate import tabulate
+from unittest.mock import Mock
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.single_flight import SingleFlight, make_key
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.single_flight import SingleFlight, make_key
+
+
+
+class TestSingleFlight(unittest.TestCase):
+	"""
+	Unit test class for single_flight module.
+	"""
+
+	print("cts single_flight unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for single_flight unit tests.
+		:return:
+		"""
+		self.single_flight = SingleFlight(enabled=True, use_redis=False)
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for single_flight unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_make_key(self):
+		"""
+		Testing make_key gives equivalent payloads the same key.
+		"""
+
+		print(">>> Running single_flight make_key unit test..")
+
+		url = "http://jchem:8080/webservices/rest-v0/util/detail"
+		key_1 = make_key('POST', url, {'structure': "CCC", 'parameters': {'a': 1, 'b': 2}})
+		key_2 = make_key('POST', url, '{"parameters": {"b": 2, "a": 1}, "structure": "CCC"}')
+		key_3 = make_key('POST', url, {'structure': "CCCC"})
+
+		results = [key_1 == key_2, key_1 == key_3]
+		expected_results = [True, False]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_do_coalesces_calls(self):
+		"""
+		Testing SingleFlight do makes one call for concurrent
+		duplicates, and each caller gets its own copy of the result.
+		"""
+
+		print(">>> Running single_flight do unit test..")
+
+		calls = []
+
+		def func():
+			calls.append(1)
+			time.sleep(0.2)
+			return {'data': "CCC"}
+
+		results_list = []
+		threads = [threading.Thread(target=lambda: results_list.append(self.single_flight.do("key", func))) for i in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		results = [len(calls), len(results_list), results_list[0] == {'data': "CCC"}, results_list[0] is results_list[1]]
+		expected_results = [1, 4, True, False]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_leader_mutates_result(self):
+		"""
+		Testing followers get the result as the leader returned it, even
+		when the leader's caller updates it right away.
+		"""
+
+		print(">>> Running single_flight leader mutation unit test..")
+
+		def func():
+			time.sleep(0.2)
+			return {'data': "CCC", 'nodes': list(range(1000))}
+
+		def leader():
+			result = self.single_flight.do("key", func)
+			for i in range(10000):
+				result[i] = i  # e.g., calculators adding to their response dicts
+			result['nodes'].clear()
+
+		followers_results = []
+		threads = [threading.Thread(target=leader)]
+		threads += [threading.Thread(target=lambda: followers_results.append(self.single_flight.do("key", func))) for i in range(4)]
+		for thread in threads:
+			thread.start()
+			time.sleep(0.01)  # first thread leads
+		for thread in threads:
+			thread.join()
+
+		results = [len(followers_results), [sorted(result.keys()) for result in followers_results], [len(result['nodes']) for result in followers_results]]
+		expected_results = [4, [['data', 'nodes']] * 4, [1000] * 4]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_do_redis_follower(self):
+		"""
+		Testing a worker that doesn't get the redis lock uses
+		the leader's shared result.
+		"""
+
+		print(">>> Running single_flight redis follower unit test..")
+
+		single_flight = SingleFlight(enabled=True, use_redis=True)
+		redis_mock = Mock()
+		redis_mock.get.side_effect = [None, '{"data": "CCC"}']
+		redis_mock.set.return_value = False  # another worker has the lock
+		func = Mock(return_value={'data': "leader not used"})
+
+		result = single_flight.do_distributed("key", func, redis_mock)
+
+		results = [result, func.call_count]
+		expected_results = [{'data': "CCC"}, 0]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -16,8 +16,10 @@ sys.path.insert(
 # local requirements (running pytest at qed level):
 if 'cts_celery' in _path:
 	from qed.cts_celery.cts_calcs.smilesfilter import SMILESFilter
+	from qed.cts_celery.cts_calcs.negative_cache import NegativeCache
 elif 'cts_app' in _path:
 	from qed.cts_app.cts_calcs.smilesfilter import SMILESFilter
+	from qed.cts_app.cts_calcs.negative_cache import NegativeCache
 
 from qed.temp_config.set_environment import DeployEnv
 
@@ -93,8 +95,9 @@ class TestSmilesFilter(unittest.TestCase):
 
 		expected_result = True  # expected result from smilesfilter test function
 
-		with patch('qed.cts_app.cts_calcs.smilesfilter.requests.post') as service_mock:
+		with patch('qed.cts_app.cts_calcs.calculator.http_sessions.post') as service_mock:
 
+			service_mock.return_value.status_code = 200
 			service_mock.return_value.content = json.dumps(mock_json)  # sets expected result from ctsws request
 
 			response = self.smilesfilter_obj.is_valid_smiles(self.test_smiles)
@@ -216,6 +219,52 @@ class TestSmilesFilter(unittest.TestCase):
 
 
 
+	@patch('qed.cts_app.cts_calcs.smilesfilter.SMILESFilter.check_for_carbon')
+	@patch('qed.cts_app.cts_calcs.smilesfilter.SMILESFilter.is_valid_smiles')
+	def test_filterSMILES_rejections(self, validity_check_mock, carbon_check_mock):
+		"""
+		Testing smilesfilter module filterSMILES() rejections, only
+		CTSWS's metal check is negative-cached, and it doesn't
+		hide the carbon check's rejection.
+		"""
+
+		print(">>> Running smilesfilter filterSMILES rejections unit test..")
+
+		validity_check_mock.return_value = False
+		carbon_check_mock.return_value = True
+
+		with patch('qed.cts_app.cts_calcs.smilesfilter.negative_cache', NegativeCache(enabled=True, ttl=60, use_redis=False)):
+			results = [
+				self.smilesfilter_obj.filterSMILES("CC.CC"),
+				self.smilesfilter_obj.filterSMILES("CC.CC"),
+				self.smilesfilter_obj.filterSMILES("C[Hg]C"),
+				self.smilesfilter_obj.filterSMILES("C[Hg]C")
+			]
+			carbon_check_mock.return_value = False
+			results.append(self.smilesfilter_obj.filterSMILES("C[Hg]C"))
+			results.append(validity_check_mock.call_count)
+
+		expected_results = [
+			{'error': "Chemical cannot be a salt or mixture"},
+			{'error': "Chemical cannot be a salt or mixture"},
+			{'error': "Chemical cannot contain metals"},
+			{'error': "Chemical cannot contain metals"},  # cached, not checked again
+			{'error': "CTS only accepts organic chemicals"},
+			1
+		]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+		return
+
+
+
 	def test_checkMass(self):
 		"""
 		Testing smilesfilter module checkMass() function.
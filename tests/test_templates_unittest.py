@@ -0,0 +1,107 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+import threading
+from tabulate import tabulate
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs.templates import Template
+	from qed.cts_celery.cts_calcs import calculator_pool
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs.templates import Template
+	from qed.cts_app.cts_calcs import calculator_pool
+
+
+
+class Example(object):
+	prop_map = Template({'water_sol': {'methods': ["WSKOW", "WATERNT"]}})
+
+
+
+class TestTemplates(unittest.TestCase):
+	"""
+	Unit test class for templates and calculator_pool modules.
+	"""
+
+	print("cts templates unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for templates unit tests.
+		:return:
+		"""
+		calculator_pool.clear()
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for templates unit tests.
+		:return:
+		"""
+		calculator_pool.clear()
+
+
+
+	def test_copy_on_use(self):
+		"""
+		Testing instances get their own copy of a Template,
+		and the class's template can't be changed.
+		"""
+
+		print(">>> Running templates copy on use unit test..")
+
+		first, second = Example(), Example()
+		first.prop_map['water_sol']['methods'].append("EXTRA")
+
+		with self.assertRaises(TypeError):
+			Example.prop_map['koc'] = {}
+
+		results = [first.prop_map['water_sol']['methods'], second.prop_map, first.prop_map is first.prop_map]
+		expected_results = [["WSKOW", "WATERNT", "EXTRA"], {'water_sol': {'methods': ["WSKOW", "WATERNT"]}}, True]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_calculator_pool(self):
+		"""
+		Testing calculator_pool shares an instance within a thread only.
+		"""
+
+		print(">>> Running calculator_pool get_instance unit test..")
+
+		instance = calculator_pool.get_instance(Example)
+		other_thread_instances = []
+		thread = threading.Thread(target=lambda: other_thread_instances.append(calculator_pool.get_instance(Example)))
+		thread.start()
+		thread.join()
+
+		results = [calculator_pool.get_instance(Example) is instance, other_thread_instances[0] is instance]
+		expected_results = [True, False]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import os
+import inspect
+import datetime
+import sys
+from tabulate import tabulate
+from unittest.mock import Mock, patch
+
+_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    1, os.path.join(_path, "..", "..", "..", "..")
+)  # adds qed project to sys.path
+
+if 'cts_celery' in _path:
+	from qed.cts_celery.cts_calcs import warmup
+elif 'cts_app' in _path:
+	from qed.cts_app.cts_calcs import warmup
+
+
+
+class TestWarmUp(unittest.TestCase):
+	"""
+	Unit test class for warmup module.
+	"""
+
+	print("cts warmup unittests conducted at " + str(datetime.datetime.today()))
+
+	def setUp(self):
+		"""
+		Setup routine for warmup unit tests.
+		:return:
+		"""
+		self.redis_mock = Mock()
+		self.pipe_mock = self.redis_mock.pipeline.return_value
+
+
+
+	def tearDown(self):
+		"""
+		Teardown routine for warmup unit tests.
+		:return:
+		"""
+		pass
+
+
+
+	def test_run(self):
+		"""
+		Testing warm-up probes configured backends, records their
+		health in redis and marks the worker ready.
+		"""
+
+		print(">>> Running warmup run unit test..")
+
+		def failing_probe(timeout):
+			raise ConnectionError("connection refused")
+
+		probes = {
+			'jchem': ('CTS_JCHEM_SERVER', lambda timeout: True),
+			'epi': ('CTS_EPI_SERVER', failing_probe),
+			'sparc': ('CTS_SPARC_SERVER', lambda timeout: True),
+		}
+		env = {'CTS_JCHEM_SERVER': "http://jchem", 'CTS_EPI_SERVER': "http://epi"}  # sparc isn't configured
+
+		with patch.object(warmup, 'probes', probes), patch.dict(os.environ, env):
+			os.environ.pop('CTS_SPARC_SERVER', None)
+			warmer = warmup.WarmUp(backends=["jchem", "epi", "sparc"], timeout=1, redis_conn=self.redis_mock)
+			ready_before = warmer.ready.is_set()
+			health = warmer.run()
+
+		saved_keys = sorted(call[0][0] for call in self.pipe_mock.set.call_args_list)
+
+		results = [ready_before, warmer.ready.is_set(), sorted(health.keys()), health['jchem'].healthy,
+			health['jchem'].latency is not None, health['epi'].healthy, health['epi'].error, saved_keys]
+		expected_results = [False, True, ["epi", "jchem"], True,
+			True, False, "connection refused", ["cts_health:epi", "cts_health:jchem"]]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+	def test_probes_and_signal(self):
+		"""
+		Testing p-chem backends are probed with a calculation for methane
+		(not retried), and a worker process's tasks wait for warm-up.
+		"""
+
+		print(">>> Running warmup probes and worker signal unit test..")
+
+		celery_mock = Mock()
+		env = {'CTS_EPI_SERVER': "http://epi:8080/episuiteapi/rest/episuite/estimated", 'CTS_OPERA_SERVER': "http://opera:8080"}
+
+		with patch.object(warmup.http_sessions, 'post', return_value=Mock(status_code=200)) as post_mock, patch.dict(os.environ, env):
+			healthy = [warmup.probe_epi(1), warmup.probe_opera(1)]
+		with patch.dict(sys.modules, {'celery': celery_mock, 'celery.signals': celery_mock.signals}):
+			warmup.connect_worker_signal()
+
+		warmer = warmup.WarmUp(backends=["epi"], timeout=1, redis_conn=Mock())
+		with patch.object(warmup, 'warmer', warmer):
+			waited = [warmer.ready.is_set(), warmup.wait_until_ready(0.01)]
+			warmer.ready.set()
+			warmup.on_task_prerun()
+
+		results = [healthy, [(call[0][0], call[1]['data']) for call in post_mock.call_args_list], waited,
+			celery_mock.signals.worker_process_init.connect.call_args[0][0] == warmup.on_worker_process_init,
+			celery_mock.signals.task_prerun.connect.call_args[0][0] == warmup.on_task_prerun]
+		expected_results = [[True, True], [("http://epi:8080/episuiteapi/rest/episuite/estimated", '{"structure":"C"}'), ("http://opera:8080/opera/rest/run", '{"smiles":"C"}')],
+			[False, False], True, True]
+
+		try:
+			self.assertListEqual(results, expected_results)
+		finally:
+			tab = [results, expected_results]
+			print("\n")
+			print(inspect.currentframe().f_code.co_name)
+			print(tabulate(tab, headers='keys', tablefmt='rst'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,270 @@
+"""
+Backend warm-up and health probing for worker start.
+
+A worker's first request to jchem, CTSWS, EPI, OPERA or SPARC used
+to pay for DNS lookups, new connections and the backend's own warm-up.
+warm_up() sends a cheap probe to each configured backend in parallel
+before the worker takes requests: a cold probe that opens the backend's
+pooled connection, then a warm one for its baseline latency. Probes go
+straight through the pooled sessions (no retries) and each is the
+backend's smallest real request for methane ("C"): jchem's structure
+analysis, CTSWS's structure check, an EPI and an OPERA run, and SPARC's
+vapor pressure alone, so the backends' models are loaded too. Each
+backend's health is kept in redis (cts_health:<backend>) so other
+processes can check it.
+
+Celery workers call connect_worker_signal() from their worker module,
+then warm_up() runs in each worker process as it starts
+(worker_process_init). Process start waits for it up to
+CTS_WARMUP_INIT_TIMEOUT seconds (celery stops pool processes that take
+more than a few seconds to start), and the process's tasks wait for the
+rest of it, up to CTS_WARMUP_READY_TIMEOUT seconds (task_prerun), so a
+worker takes no requests until it's warm. CTS_WARMUP=false skips the probes. With CTS_PCHEM_WARMUP=true, the
+p-chem cache is also loaded with the most requested chemicals' results
+in the background (see pchem_warmup).
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from . import http_sessions
+from . import deadline
+from . import redis_pool
+from . import json_codec
+from . import lazy_imports
+
+pchem_warmup = lazy_imports.module('.pchem_warmup', __package__)
+
+
+DEFAULT_BACKENDS = "jchem,ctsws,epi,opera,sparc"
+PROBE_SMILES = "C"
+
+
+
+def probe_jchem(timeout):
+	url = os.environ['CTS_JCHEM_SERVER'] + '/webservices/rest-v0/util/analyze'
+	response = http_sessions.post(url, data=PROBE_SMILES, headers={'Content-Type': "*/*"}, timeout=timeout)
+	return response.status_code == 200
+
+
+def probe_ctsws(timeout):
+	url = os.environ['CTS_EFS_SERVER'] + '/ctsws/rest/isvalidchemical'
+	response = http_sessions.post(url, data=json_codec.dumps({'smiles': PROBE_SMILES}), headers={'Content-Type': "application/json"}, timeout=timeout)
+	return response.status_code == 200
+
+
+def post_probe(url, post, timeout):
+	response = http_sessions.post(url, data=json_codec.dumps(post), headers={'Content-Type': "application/json"}, timeout=timeout)
+	return response.status_code == 200
+
+
+def probe_epi(timeout):
+	return post_probe(os.environ['CTS_EPI_SERVER'], {'structure': PROBE_SMILES}, timeout)
+
+
+def probe_opera(timeout):
+	return post_probe(os.environ['CTS_OPERA_SERVER'] + '/opera/rest/run', {'smiles': PROBE_SMILES}, timeout)
+
+
+def probe_sparc(timeout):
+	post = {
+		'pressure': 760.0,
+		'meltingPoint': 0.0,
+		'temperature': 25.0,
+		'calculations': [{'solvents': [], 'units': "Torr", 'pressure': 760.0, 'meltingPoint': 0.0, 'temperature': 25.0, 'type': "VAPOR_PRESSURE"}],
+		'smiles': PROBE_SMILES,
+		'userId': None,
+		'apiKey': None,
+		'type': 'MULTIPLE_PROPERTY',
+		'doSolventInit': False
+	}
+	return post_probe(os.environ['CTS_SPARC_SERVER'] + '/sparc-integration/rest/calc/multiProperty', post, timeout)
+
+
+# backend: (server env var, probe function)
+probes = {
+	'jchem': ('CTS_JCHEM_SERVER', probe_jchem),
+	'ctsws': ('CTS_EFS_SERVER', probe_ctsws),
+	'epi': ('CTS_EPI_SERVER', probe_epi),
+	'opera': ('CTS_OPERA_SERVER', probe_opera),
+	'sparc': ('CTS_SPARC_SERVER', probe_sparc),
+}
+
+
+
+class BackendHealth(object):
+	"""
+	Result of probing a backend.
+	"""
+	key_prefix = "cts_health"
+
+	def __init__(self, backend, healthy=False, cold_latency=None, latency=None, error=None, checked=None):
+		self.backend = backend
+		self.healthy = healthy
+		self.cold_latency = cold_latency  # first probe, incl. dns, connecting, etc.
+		self.latency = latency  # baseline (warm) latency
+		self.error = error
+		self.checked = checked or time.time()
+
+	def to_dict(self):
+		return {
+			'backend': self.backend,
+			'healthy': self.healthy,
+			'cold_latency': self.cold_latency,
+			'latency': self.latency,
+			'error': self.error,
+			'checked': self.checked
+		}
+
+	@classmethod
+	def get_key(cls, backend):
+		return "{}:{}".format(cls.key_prefix, backend)
+
+
+
+class WarmUp(object):
+	"""
+	Probes backends and keeps their latest health.
+	"""
+	def __init__(self, backends=None, timeout=None, health_ttl=None, redis_conn=None):
+		self.backends = backends or [name.strip() for name in os.environ.get('CTS_WARMUP_BACKENDS', DEFAULT_BACKENDS).split(',') if name.strip()]
+		self.timeout = timeout or float(os.environ.get('CTS_WARMUP_TIMEOUT', 10))  # seconds per probe
+		self.health_ttl = health_ttl or int(os.environ.get('CTS_WARMUP_HEALTH_TTL', 300))  # seconds health is kept in redis
+		self.init_timeout = float(os.environ.get('CTS_WARMUP_INIT_TIMEOUT', 3))  # seconds worker process start waits for it
+		self.ready_timeout = float(os.environ.get('CTS_WARMUP_READY_TIMEOUT', 2 * self.timeout + 5))  # seconds tasks wait for it
+		self.redis_conn = redis_conn
+		self.health = {}  # backend: BackendHealth
+		self.ready = threading.Event()
+
+	def get_configured(self):
+		"""
+		Returns the backends that have a probe and a server configured.
+		"""
+		configured = []
+		for backend in self.backends:
+			if not backend in probes:
+				logging.warning("No warm-up probe for backend {}".format(backend))
+			elif os.environ.get(probes[backend][0]):
+				configured.append(backend)
+		return configured
+
+	def timed_probe(self, probe):
+		with deadline.scope(self.timeout):
+			start = time.perf_counter()
+			healthy = probe(self.timeout)
+			return healthy, time.perf_counter() - start
+
+	def probe(self, backend):
+		"""
+		Probes a backend twice (cold, then warm), returns its BackendHealth.
+		"""
+		probe = probes[backend][1]
+		try:
+			healthy, cold_latency = self.timed_probe(probe)
+			if not healthy:
+				return BackendHealth(backend, False, cold_latency, error="invalid probe response")
+			healthy, latency = self.timed_probe(probe)
+			return BackendHealth(backend, healthy, cold_latency, latency)
+		except Exception as e:
+			logging.warning("Warm-up probe for {} failed: {}".format(backend, e))
+			return BackendHealth(backend, False, error=str(e))
+
+	def run(self):
+		"""
+		Probes the configured backends in parallel, records their health
+		and marks the worker ready. Returns {backend: BackendHealth}.
+		"""
+		backends = self.get_configured()
+		start = time.perf_counter()
+		try:
+			if backends:
+				with ThreadPoolExecutor(max_workers=len(backends)) as executor:
+					for health in executor.map(self.probe, backends):
+						self.health[health.backend] = health
+						logging.info("Warm-up {}: healthy={}, cold={}, baseline={}".format(health.backend, health.healthy, health.cold_latency, health.latency))
+				self.save()
+			logging.info("Warm-up finished in {}s ({} backends)".format(round(time.perf_counter() - start, 3), len(backends)))
+		finally:
+			self.ready.set()  # a failed warm-up doesn't keep the worker from taking requests
+		return self.health
+
+	def save(self):
+		"""
+		Stores each backend's health in redis, returns False if redis is unavailable.
+		"""
+		mapping = {BackendHealth.get_key(backend): json_codec.dumps(health.to_dict()) for backend, health in self.health.items()}
+		return redis_pool.set_many(mapping, ex=self.health_ttl, redis_conn=self.redis_conn)
+
+
+
+warmer = WarmUp()
+
+
+
+def warm_up():
+	"""
+	Warms up this worker's backend connections (unless CTS_WARMUP=false)
+	and marks it ready. Returns {backend: BackendHealth}.
+	"""
+	if os.environ.get('CTS_PCHEM_WARMUP', 'false').lower() == 'true':
+		threading.Thread(target=pchem_warmup.warm_cache, name="cts-pchem-warmup", daemon=True).start()
+	if os.environ.get('CTS_WARMUP', 'true').lower() != 'true':
+		warmer.ready.set()
+		return {}
+	return warmer.run()
+
+
+def on_worker_process_init(**kwargs):
+	"""
+	Starts warm-up and waits for it up to init_timeout, the rest
+	is waited for by the process's first tasks (see on_task_prerun).
+	"""
+	threading.Thread(target=warm_up, name="cts-warmup", daemon=True).start()
+	if not wait_until_ready(warmer.init_timeout):
+		logging.info("Warm-up still running after {}s, tasks will wait for it.".format(warmer.init_timeout))
+
+
+def on_task_prerun(**kwargs):
+	"""
+	Holds a task until warm-up has finished, up to ready_timeout.
+	"""
+	if not is_ready() and not wait_until_ready(warmer.ready_timeout):
+		logging.warning("Warm-up not finished after {}s, running task anyway.".format(warmer.ready_timeout))
+
+
+def connect_worker_signal():
+	"""
+	Runs warm_up() in each celery worker process as it starts, and holds
+	its tasks until it's finished. Called by the celery worker module.
+	"""
+	from celery import signals
+	signals.worker_process_init.connect(on_worker_process_init, weak=False)
+	signals.task_prerun.connect(on_task_prerun, weak=False)
+
+
+def is_ready():
+	"""
+	Returns True once warm-up has finished.
+	"""
+	return warmer.ready.is_set()
+
+
+def wait_until_ready(timeout=None):
+	"""
+	Blocks until warm-up has finished, returns False if it timed out.
+	"""
+	return warmer.ready.wait(timeout)
+
+
+def get_health(backend):
+	"""
+	Returns a backend's latest health (dict) from redis, or
+	from this process's last warm-up, or None.
+	"""
+	value = redis_pool.get_many([BackendHealth.get_key(backend)], warmer.redis_conn)[0]
+	if value is not None:
+		return json_codec.loads(value)
+	health = warmer.health.get(backend)
+	return health.to_dict() if health else None